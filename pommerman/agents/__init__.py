@@ -3,6 +3,7 @@ from .base_agent import BaseAgent
 from .docker_agent import DockerAgent
 from .http_agent import HttpAgent
 from .player_agent import PlayerAgent
+from .process_agent import ProcessAgent
 from .random_agent import RandomAgent
 from .simple_agent import SimpleAgent
 from .ignore_agent import IgnoreAgent
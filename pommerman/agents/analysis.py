@@ -0,0 +1,151 @@
+'''Analyses of the observations of a step, shared by the agents of a process.
+
+When the built-in agents play in one process, each of them used to derive the
+same structures from nearly the same observation: the list of bombs, the
+positions of the agents, the flame maps and times to explosion of the team
+agents, and the cells that the path search can pass. CACHE keeps these for
+the current step, so the first agent computes them and the others reuse them.
+
+An entry is keyed by the name of the analysis and the contents of the arrays
+it is derived from, e.g. the board and the bomb maps. With full observability
+all agents see the same arrays and share every entry. Partially observing
+agents only share where their views agree. Keying on the contents rather than
+on the arrays themselves keeps the entries right when the env updates its
+arrays in place or an agent copies them.
+
+The entries are dropped whenever the step count of the observations changes,
+or when there are more than max_entries of them, e.g. while a search agent
+simulates many states of one step.
+
+The cached values are shared, so they must not be modified.
+'''
+import threading
+
+import numpy as np
+
+from .. import blast
+from .. import constants
+
+
+class AnalysisCache(object):
+    '''Caches the analyses of the current step'''
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._step_count = None
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self):
+        '''The fraction of lookups that were hits, 0 if there were none'''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._step_count = None
+
+    def get(self, name, arrays, compute, step_count=None):
+        """Returns an analysis, computing it if it is not cached.
+
+        Args:
+          name: The name of the analysis, with anything besides the arrays
+            that it depends on, e.g. ('passable', enemies).
+          arrays: The arrays that the analysis is derived from.
+          compute: Called without arguments to compute the analysis.
+          step_count: The step count of the observation. Entries of other
+            steps are dropped. None to keep them.
+
+        Returns:
+          The analysis.
+        """
+        key = (name,) + tuple(
+            (array.dtype.str, array.shape, array.tobytes())
+            for array in map(np.asarray, arrays))
+        with self._lock:
+            if step_count is not None and step_count != self._step_count:
+                self._entries = {}
+                self._step_count = step_count
+            value = self._entries.get(key, self._entries)
+            if value is not self._entries:
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {}
+            self._entries[key] = value
+        return value
+
+
+CACHE = AnalysisCache()
+
+
+def convert_bombs(bomb_map):
+    '''Flatten outs the bomb array'''
+    ret = []
+    locations = np.where(bomb_map > 0)
+    for r, c in zip(locations[0], locations[1]):
+        ret.append({
+            'position': (r, c),
+            'blast_strength': int(bomb_map[(r, c)])
+        })
+    return ret
+
+
+def bombs(obs):
+    '''Returns the bombs of an observation as dicts of position and strength'''
+    bomb_map = obs['bomb_blast_strength']
+    return CACHE.get('bombs', [bomb_map],
+                     lambda: convert_bombs(np.array(bomb_map)),
+                     obs.get('step_count'))
+
+
+def _find_agents(board):
+    '''Returns the last position of every agent on the board by value'''
+    positions = {}
+    for row, col in zip(*np.nonzero(board >= constants.Item.Agent0.value)):
+        positions[int(board[row, col])] = (int(row), int(col))
+    return positions
+
+
+def agent_positions(obs):
+    """Returns where the agents of an observation are.
+
+    Returns:
+      A dict of the (row, col) of every agent that is on the board, by the
+      value of its Item.
+    """
+    board = obs['board']
+    return CACHE.get('agent_positions', [board],
+                     lambda: _find_agents(np.array(board)),
+                     obs.get('step_count'))
+
+
+def danger(obs):
+    """Returns the danger map of an observation.
+
+    Returns:
+      A read only array like the board of in how many steps flames first
+      reach every cell, from blast.danger_map.
+    """
+    board = obs['board']
+    bomb_life = obs['bomb_life']
+    bomb_blast_strength = obs['bomb_blast_strength']
+
+    def compute():
+        ret = blast.danger_map(board, bomb_life, bomb_blast_strength)
+        ret.flags.writeable = False
+        return ret
+
+    return CACHE.get('danger', [board, bomb_life, bomb_blast_strength],
+                     compute, obs.get('step_count'))
@@ -1,59 +1,99 @@
 '''The Reward class is used to calculate the reward value for each action
 with three different state (Explore, Attack, Evade)
 '''
-from collections import defaultdict
-import queue
-import random
+import bisect
+import time
 
-import numpy as np
-
-from . import BaseAgent
 from . import SimpleAgent
-from ..helpers.mcts import MCTree, SimTree
+from ..helpers.mcts import CompactMCTree, MCTree, SimTree
 from ..helpers.reward import Reward
 from .. import constants
-import timeout_decorator
-from timeout_decorator.timeout_decorator import TimeoutError
 
 class HeuristicAgent(SimpleAgent):
-    """Heuristic agent"""
-    def __init__(self, standard=True, minmax=False):
+    """Heuristic agent
+
+    The tree searches are anytime searches: they check a deadline before
+    they make every node and return the best action so far once it has
+    passed. Unlike a timeout signal, this works in any thread and never
+    interrupts a search halfway through an update of its tree.
+
+    The agent keeps the tree of its last search. If the next observation is
+    one of the states that the tree reached with the action it took, that
+    node becomes the root, and the search goes on from what it found there.
+    """
+    def __init__(self, standard=True, minmax=False, time_budget=0.08,
+                 phase_budgets=None, compact=False, reuse_tree=True):
+        """
+        Args:
+          standard: Whether to use the standard MCTree, else SimTree.
+          minmax: Whether SimTree backs up the minimum reward of an action.
+          time_budget: Seconds that an act may take, from when it is called.
+            The searches check the time before they make every node, and
+            making one takes up to about 15 ms, so this leaves room for it
+            within the 100 ms of the competitions. A full garbage collection
+            of the process may still take some tens of ms more.
+          phase_budgets: Optionally, the time budgets of the phases of a game
+            as (step_count, seconds) pairs of the step that each phase starts
+            at, e.g. [(0, .05), (100, .1)]. They override time_budget from
+            their step on.
+          compact: Whether the standard search uses the CompactMCTree, which
+            is not reused.
+          reuse_tree: Whether to reuse the tree of the last search.
+        """
         super(HeuristicAgent, self).__init__()
         self.best_action = None
         self.minmax = minmax
         self.standard = standard        # to use standard MTC or not
+        self.compact = compact
+        self.time_budget = time_budget
+        self.phase_budgets = sorted(phase_budgets or [])
+        self.reuse_tree = reuse_tree and not (standard and compact)
+        self.num_searches = 0
+        self.num_reuses = 0
+        self._tree = None       # the last tree, with its action and step
 
-    def act(self, obs, action_space):
-        try:
-            # try to return the action by method if not time out
-            return self._act(obs, action_space)
-        except TimeoutError:
-            # if it is timeout return the current best action
-            # print('time out, best action:', self.best_action)
-            if self.best_action is None:
-                return action_space.sample()
-            else:
-                if isinstance(self.best_action, list):
-                    return random.sample(self.best_action)
-                else:
-                    return self.best_action
+    def budget(self, step_count):
+        '''Returns the time budget of an act at step_count'''
+        steps = [step for step, _ in self.phase_budgets]
+        phase = bisect.bisect_right(steps, step_count or 0) - 1
+        if phase < 0:
+            return self.time_budget
+        return self.phase_budgets[phase][1]
 
-                # reset the best action for the next run
-                self.best_action = None
+    def _reusedTree(self, obs, deadline):
+        '''Returns the last tree rooted at obs, if it reached obs'''
+        if self._tree is None:
+            return None
+        tree, action, step_count = self._tree
+        self._tree = None
+        if step_count is None or obs.get('step_count') != step_count + 1:
+            return None
+        if not tree.reuse(action, obs, deadline, minimax=self.minmax):
+            return None
+        self.num_reuses += 1
+        return tree
 
-    @timeout_decorator.timeout(0.1)       # the function will timeout after 100ms
-    def _act(self, obs, action_space):
+    def act(self, obs, action_space):
+        deadline = time.monotonic() + self.budget(obs.get('step_count'))
         # modify the obs
         mode = Reward().decideMode(obs, action_space)
         # check mode and return the acts
         if mode in {constants.Mode.Evade, constants.Mode.Attack}:
+            self.num_searches += 1
+            tree = self._reusedTree(obs, deadline)
             if self.standard:
-                mcts = MCTree(obs, agent=self)
+                tree_type = CompactMCTree if self.compact else MCTree
+                mcts = tree or tree_type(obs, agent=self, deadline=deadline)
                 action = mcts.bestAction()
             else:
-                sim_tree = SimTree(obs, agent=self)
-                action = sim_tree.bestAction(minimax=self.minmax)
-            # print("best_action", action)
+                mcts = tree or SimTree(obs, agent=self, deadline=deadline)
+                action = mcts.bestAction(minimax=self.minmax)
+            if self.reuse_tree:
+                self._tree = (mcts, action, obs.get('step_count'))
             return action
         else :
+            self._tree = None
             return super().act(obs, action_space)
+
+    def episode_end(self, reward):
+        self._tree = None
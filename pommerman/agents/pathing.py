@@ -0,0 +1,306 @@
+'''Breadth first search over the board, shared by the heuristic agents.
+
+The search runs on flat arrays of the cells of the board:
+- The distances are an int16 array, with OUT_OF_RANGE for the cells that the
+  search does not consider and UNREACHABLE for those it did not reach.
+- The parents are an int16 array of the flat index of the previous cell.
+- Whether a cell can be passed or is excluded is a table lookup of its value.
+- The queue, the neighbours of every cell and the cells in range of every
+  position are allocated once per board size and reused.
+
+The dist and prev of Paths read like the dicts of positions that the agents
+used to build, so their helpers work on either. Ties between equally short
+paths are broken as they always were: every later parent that is found
+replaces the first one if random.random() < .5. So the agents draw the same
+random numbers in the same order and play the same games.
+'''
+import array
+from collections import defaultdict
+import random
+import threading
+
+import numpy as np
+
+from . import analysis
+from .. import constants
+
+OUT_OF_RANGE = -1
+UNREACHABLE = np.iinfo(np.int16).max
+
+DEFAULT_EXCLUDE = (constants.Item.Fog, constants.Item.Rigid,
+                   constants.Item.Flames)
+
+# The items by value.
+_ITEMS = list(constants.Item)
+_AGENTS = (constants.Item.Agent0, constants.Item.Agent1, constants.Item.Agent2,
+           constants.Item.Agent3)
+_POWERUPS = (constants.Item.ExtraBomb, constants.Item.IncrRange,
+             constants.Item.Kick)
+
+
+def item_table(items):
+    '''Returns a bool array by board value of whether it is one of items'''
+    table = np.zeros(len(_ITEMS), dtype=bool)
+    table[[item.value for item in items]] = True
+    return table
+
+
+def passable_table(enemies):
+    """Returns a bool array by board value of whether it can be passed.
+
+    These are the cells of utility.position_is_passable: agents, powerups and
+    passages, but not enemies.
+    """
+    table = item_table((constants.Item.Passage,) + _AGENTS + _POWERUPS)
+    table[[enemy.value for enemy in enemies]] = False
+    return table
+
+
+class _Distances(object):
+    '''The distances of Paths, as a read only dict of positions'''
+
+    def __init__(self, paths):
+        self._paths = paths
+
+    def __contains__(self, position):
+        return self._paths.index(position) is not None
+
+    def __getitem__(self, position):
+        index = self._paths.index(position)
+        if index is None:
+            raise KeyError(position)
+        return self._paths.distance_at(index)
+
+    def get(self, position, default=None):
+        index = self._paths.index(position)
+        return default if index is None else self._paths.distance_at(index)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._paths.cells)
+
+    def keys(self):
+        positions = self._paths.finder.positions
+        return [positions[index] for index in self._paths.cells]
+
+    def values(self):
+        return [self._paths.distance_at(index) for index in self._paths.cells]
+
+    def items(self):
+        return list(zip(self.keys(), self.values()))
+
+
+class _Parents(_Distances):
+    '''The parents of Paths, as a read only dict of positions'''
+
+    def __getitem__(self, position):
+        index = self._paths.index(position)
+        if index is None:
+            raise KeyError(position)
+        return self._paths.parent_at(index)
+
+    def get(self, position, default=None):
+        index = self._paths.index(position)
+        return default if index is None else self._paths.parent_at(index)
+
+    def values(self):
+        return [self._paths.parent_at(index) for index in self._paths.cells]
+
+
+class Paths(object):
+    """The result of a search.
+
+    Attributes:
+      items: A dict of the positions in range by item, in row major order.
+      dist: The distances of the positions in range, np.inf if unreachable.
+      prev: The previous position on the path to the positions in range, None
+        for the start and unreachable positions.
+      distances: The flat int16 distances.
+      parents: The flat int16 parents, -1 for none.
+      cells: The flat indices of the cells in range, in row major order.
+    """
+
+    def __init__(self, finder, distances, parents, cells, items):
+        self.finder = finder
+        self.distances = distances
+        self.parents = parents
+        self.cells = cells
+        self.items = items
+        self.dist = _Distances(self)
+        self.prev = _Parents(self)
+
+    def index(self, position):
+        '''Returns the flat index of a position in range, else None'''
+        row, col = position
+        size = self.finder.board_size
+        if not (0 <= row < size and 0 <= col < size):
+            return None
+        index = int(row) * size + int(col)
+        if self.distances[index] == OUT_OF_RANGE:
+            return None
+        return index
+
+    def distance_at(self, index):
+        distance = self.distances[index]
+        return np.inf if distance == UNREACHABLE else distance
+
+    def parent_at(self, index):
+        parent = self.parents[index]
+        return None if parent < 0 else self.finder.positions[parent]
+
+
+class PathFinder(object):
+    '''Searches boards of one size, reusing its buffers between searches'''
+
+    def __init__(self, board_size=constants.BOARD_SIZE):
+        self.board_size = board_size
+        num_cells = board_size * board_size
+        self.positions = [divmod(index, board_size)
+                          for index in range(num_cells)]
+        # The neighbours on the board, up, down, left and right, which is the
+        # order in which the search has always visited them.
+        self._neighbors = []
+        for row, col in self.positions:
+            self._neighbors.append(tuple(
+                (row + d_row) * board_size + col + d_col
+                for d_row, d_col in [(-1, 0), (1, 0), (0, -1), (0, 1)]
+                if 0 <= row + d_row < board_size and
+                0 <= col + d_col < board_size))
+        rows, cols = np.divmod(np.arange(num_cells), board_size)
+        self._rows = rows
+        self._cols = cols
+        self._windows = {}
+        self._queue = array.array('h', bytes(2 * num_cells))
+        self._out_of_range = array.array('h', [OUT_OF_RANGE]) * num_cells
+        self._no_parents = array.array('h', [-1]) * num_cells
+
+    def _window(self, position, depth):
+        """Returns a bool array of the cells in range of a position.
+
+        As the agents always had it, these are the cells within depth steps
+        whose row and column are in [x - depth, x + depth), so the cells
+        exactly depth below and right of the position are out of range.
+        """
+        key = (position, depth)
+        if key not in self._windows:
+            x, y = position
+            rows, cols = self._rows, self._cols
+            self._windows[key] = \
+                (np.abs(rows - x) + np.abs(cols - y) <= depth) & \
+                (rows >= x - depth) & (rows < x + depth) & \
+                (cols >= y - depth) & (cols < y + depth)
+        return self._windows[key]
+
+    def search(self, board, position, depth, passable, exclude=DEFAULT_EXCLUDE,
+               random_ties=True, can_pass=None):
+        """Runs a breadth first search from a position.
+
+        Args:
+          board: The board.
+          position: Where to start.
+          depth: How many steps away the cells in range may be.
+          passable: A bool array by board value of the items that the search
+            goes through, e.g. from passable_table. It still finds the
+            distance to the cells next to them that it cannot pass.
+          exclude: Items whose cells are out of range.
+          random_ties: Whether a later parent on an equally short path
+            replaces the first one if random.random() < .5.
+          can_pass: Optionally, the flat list of whether every cell can be
+            passed, i.e. passable looked up on board, e.g. from the
+            analysis cache.
+
+        Returns:
+          Paths.
+        """
+        flat_board = np.asarray(board).ravel()
+        position = (int(position[0]), int(position[1]))
+        in_range = self._window(position, depth)
+        if exclude:
+            in_range = in_range & ~item_table(exclude)[flat_board]
+        cells = np.flatnonzero(in_range)
+
+        distances = array.array('h', self._out_of_range)
+        np.frombuffer(distances, dtype=np.int16)[cells] = UNREACHABLE
+        parents = array.array('h', self._no_parents)
+        if can_pass is None:
+            can_pass = passable[flat_board].tolist()
+        neighbors = self._neighbors
+        queue = self._queue
+
+        start = position[0] * self.board_size + position[1]
+        head = tail = 0
+        if distances[start] != OUT_OF_RANGE:
+            distances[start] = 0
+            queue[0] = start
+            tail = 1
+        while head < tail:
+            index = queue[head]
+            head += 1
+            if not can_pass[index]:
+                continue
+            value = distances[index] + 1
+            for neighbor in neighbors[index]:
+                distance = distances[neighbor]
+                if distance == OUT_OF_RANGE:
+                    continue
+                if value < distance:
+                    distances[neighbor] = value
+                    parents[neighbor] = index
+                    queue[tail] = neighbor
+                    tail += 1
+                elif value == distance and random_ties and \
+                     random.random() < .5:
+                    parents[neighbor] = index
+
+        cells = cells.tolist()
+        items = defaultdict(list)
+        positions = self.positions
+        for index, value in zip(cells, flat_board[cells].tolist()):
+            items[_ITEMS[value]].append(positions[index])
+        return Paths(self, distances, parents, cells, items)
+
+
+_LOCAL = threading.local()
+
+
+def get_finder(board_size):
+    '''Returns the PathFinder of a board size of this thread'''
+    finders = getattr(_LOCAL, 'finders', None)
+    if finders is None:
+        finders = _LOCAL.finders = {}
+    if board_size not in finders:
+        finders[board_size] = PathFinder(board_size)
+    return finders[board_size]
+
+
+def djikstra(board, my_position, bombs, enemies, depth=None, exclude=None):
+    """The search of the simple agents.
+
+    Args:
+      board: The board of the observation.
+      my_position: Where the agent is.
+      bombs: The bombs, as dicts with a position.
+      enemies: The Items of the enemies, which cannot be passed.
+      depth: How many steps away to search.
+      exclude: Items whose cells are out of range. Fog, rigid walls and
+        flames if None.
+
+    Returns:
+      items, dist, prev like the agents' dicts of positions. A bomb under the
+      agent is added to the bombs of items.
+    """
+    assert (depth is not None)
+    if exclude is None:
+        exclude = DEFAULT_EXCLUDE
+    passable = passable_table(enemies)
+    can_pass = analysis.CACHE.get(
+        ('passable', tuple(enemy.value for enemy in enemies)), [board],
+        lambda: passable[np.asarray(board).ravel()].tolist())
+    paths = get_finder(len(board)).search(
+        board, my_position, depth, passable, exclude, can_pass=can_pass)
+    for bomb in bombs:
+        if bomb['position'] == my_position:
+            paths.items[constants.Item.Bomb].append(my_position)
+    return paths.items, paths.dist, paths.prev
@@ -0,0 +1,100 @@
+'''An agent that runs another agent in a process of its own.
+
+A step waits for the act of a CPU-bound agent, e.g. a search, while it holds
+the GIL of the game. Wrapped in a ProcessAgent, it acts in its own process,
+so an ActDispatcher can overlap it with the other agents like the remote
+DockerAgent and HttpAgent.
+
+The wrapped agent keeps its state in the process from step to step. The
+process seeds the random module and np.random, so a game with the same seeds
+plays the same every time.
+'''
+import multiprocessing
+import random
+import threading
+import traceback
+
+import numpy as np
+
+from . import BaseAgent
+
+
+def _worker(remote, parent_remote, agent, seed):
+    '''Calls the methods of agent that are sent to remote'''
+    parent_remote.close()
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        while True:
+            command, args = remote.recv()
+            if command == 'close':
+                remote.close()
+                break
+            try:
+                remote.send((True, getattr(agent, command)(*args)))
+            except Exception:
+                remote.send((False, traceback.format_exc()))
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+
+class ProcessAgent(BaseAgent):
+    """Runs an agent in a worker process.
+
+    The game reads the character of the ProcessAgent as for any agent.
+    init_agent, act, episode_end and shutdown are passed on to the agent.
+    """
+
+    def __init__(self, agent, seed=None, start_method=None):
+        """Starts the process.
+
+        Args:
+          agent: The agent, before init_agent. It has to be picklable with
+            the spawn start method.
+          seed: The seed of the random module and np.random of the process.
+            If None, one is taken from the random module.
+          start_method: The multiprocessing start method of the process.
+        """
+        super(ProcessAgent, self).__init__(agent._character)
+        if seed is None:
+            seed = random.getrandbits(32)
+        context = multiprocessing.get_context(start_method)
+        self._remote, worker_remote = context.Pipe()
+        self._process = context.Process(
+            target=_worker, args=(worker_remote, self._remote, agent, seed))
+        self._process.daemon = True
+        self._process.start()
+        worker_remote.close()
+        # A late act may still wait for its answer in a thread of the
+        # dispatcher. Every call takes its turn on the pipe.
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _call(self, command, *args):
+        '''Calls a method of the agent and returns what it returns'''
+        with self._lock:
+            self._remote.send((command, args))
+            ok, result = self._remote.recv()
+        if not ok:
+            raise RuntimeError('%s failed in the agent process:\n%s' %
+                               (command, result))
+        return result
+
+    def init_agent(self, id, game_type):
+        super(ProcessAgent, self).init_agent(id, game_type)
+        self._call('init_agent', id, game_type)
+
+    def act(self, obs, action_space):
+        return self._call('act', obs, action_space)
+
+    def episode_end(self, reward):
+        self._call('episode_end', reward)
+
+    def shutdown(self):
+        if self._closed:
+            return
+        self._call('shutdown')
+        with self._lock:
+            self._remote.send(('close', ()))
+        self._process.join()
+        self._closed = True
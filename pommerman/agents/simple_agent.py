@@ -8,6 +8,8 @@ import random
 import numpy as np
 
 from . import BaseAgent
+from . import analysis
+from . import pathing
 from .. import constants
 from .. import utility
 
@@ -28,20 +30,9 @@ class SimpleAgent(BaseAgent):
         self._prev_direction = None
 
     def act(self, obs, action_space):
-        def convert_bombs(bomb_map):
-            '''Flatten outs the bomb array'''
-            ret = []
-            locations = np.where(bomb_map > 0)
-            for r, c in zip(locations[0], locations[1]):
-                ret.append({
-                    'position': (r, c),
-                    'blast_strength': int(bomb_map[(r, c)])
-                })
-            return ret
-
         my_position = tuple(obs['position'])
         board = np.array(obs['board'])
-        bombs = convert_bombs(np.array(obs['bomb_blast_strength']))
+        bombs = analysis.bombs(obs)
         enemies = [constants.Item(e) for e in obs['enemies']]
         ammo = int(obs['ammo'])
         blast_strength = int(obs['blast_strength'])
@@ -49,11 +40,12 @@ class SimpleAgent(BaseAgent):
             board, my_position, bombs, enemies, depth=10)
 
         # Move if we are in an unsafe place.
+        danger = analysis.danger(obs)
         unsafe_directions = self._directions_in_range_of_bomb(
-            board, my_position, bombs, dist)
+            board, my_position, bombs, dist, danger)
         if unsafe_directions:
             directions = self._find_safe_directions(
-                board, my_position, unsafe_directions, bombs, enemies)
+                board, my_position, unsafe_directions, bombs, enemies, danger)
             return random.choice(directions).value
 
         # Lay pomme if we are adjacent to an enemy.
@@ -113,74 +105,17 @@ class SimpleAgent(BaseAgent):
 
     @staticmethod
     def _djikstra(board, my_position, bombs, enemies, depth=None, exclude=None):
-        assert (depth is not None)
-
-        if exclude is None:
-            exclude = [
-                constants.Item.Fog, constants.Item.Rigid, constants.Item.Flames
-            ]
-
-        def out_of_range(p_1, p_2):
-            '''Determines if two points are out of rang of each other'''
-            x_1, y_1 = p_1
-            x_2, y_2 = p_2
-            return abs(y_2 - y_1) + abs(x_2 - x_1) > depth
-
-        items = defaultdict(list)
-        dist = {}
-        prev = {}
-        Q = queue.Queue()
-
-        my_x, my_y = my_position
-        for r in range(max(0, my_x - depth), min(len(board), my_x + depth)):
-            for c in range(max(0, my_y - depth), min(len(board), my_y + depth)):
-                position = (r, c)
-                if any([
-                        out_of_range(my_position, position),
-                        utility.position_in_items(board, position, exclude),
-                ]):
-                    continue
-
-                prev[position] = None
-                item = constants.Item(board[position])
-                items[item].append(position)
-                
-                if position == my_position:
-                    Q.put(position)
-                    dist[position] = 0
-                else:
-                    dist[position] = np.inf
-
+        return pathing.djikstra(board, my_position, bombs, enemies, depth,
+                                exclude)
 
-        for bomb in bombs:
-            if bomb['position'] == my_position:
-                items[constants.Item.Bomb].append(my_position)
-
-        while not Q.empty():
-            position = Q.get()
-
-            if utility.position_is_passable(board, position, enemies):
-                x, y = position
-                val = dist[(x, y)] + 1
-                for row, col in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    new_position = (row + x, col + y)
-                    if new_position not in dist:
-                        continue
-
-                    if val < dist[new_position]:
-                        dist[new_position] = val
-                        prev[new_position] = position
-                        Q.put(new_position)
-                    elif (val == dist[new_position] and random.random() < .5):
-                        dist[new_position] = val
-                        prev[new_position] = position   
-
-
-        return items, dist, prev
-
-    def _directions_in_range_of_bomb(self, board, my_position, bombs, dist):
+    def _directions_in_range_of_bomb(self, board, my_position, bombs, dist,
+                                     danger):
         ret = defaultdict(int)
 
+        # No bomb is a threat if its flames never reach us, e.g. past a wall.
+        if danger[my_position] == np.inf:
+            return ret
+
         x, y = my_position
         for bomb in bombs:
             position = bomb['position']
@@ -222,7 +157,7 @@ class SimpleAgent(BaseAgent):
         return ret
 
     def _find_safe_directions(self, board, my_position, unsafe_directions,
-                              bombs, enemies):
+                              bombs, enemies, danger):
 
         def is_stuck_direction(next_position, bomb_range, next_board, enemies):
             '''Helper function to do determine if the agents next move is possible.'''
@@ -276,6 +211,10 @@ class SimpleAgent(BaseAgent):
                    not utility.position_is_passable(next_board, next_position, enemies):
                     continue
 
+                # Don't walk into flames that reach there on the next step.
+                if danger[next_position] <= 1:
+                    continue
+
                 if not is_stuck_direction(next_position, bomb_range, next_board,
                                           enemies):
                     # We found a direction that works. The .items provided
@@ -301,6 +240,10 @@ class SimpleAgent(BaseAgent):
             if direction in unsafe_directions:
                 continue
 
+            # Nor one into flames that reach there on the next step.
+            if danger[position] <= 1:
+                continue
+
             if utility.position_is_passable(board, position,
                                             enemies) or utility.position_is_fog(
                                                 board, position):
@@ -8,6 +8,8 @@ import random
 import numpy as np
 
 from . import BaseAgent
+from . import analysis
+from . import pathing
 from .. import constants
 from .. import utility
 
@@ -28,151 +30,30 @@ class SimpleTeamAgent2(BaseAgent):
         self._prev_direction = None
 
     def act(self, obs, action_space):
-        def convert_bombs(bomb_map):
-            '''Flatten outs the bomb array'''
-            ret = []
-            locations = np.where(bomb_map > 0)
-            for r, c in zip(locations[0], locations[1]):
-                ret.append({
-                    'position': (r, c),
-                    'blast_strength': int(bomb_map[(r, c)])
-                })
-            return ret
-
-        # 20181218
-        def convert_flames(_board, bomb_map):
-            locations = np.where(bomb_map > 0)
-            ret = []  # np.array([[0 for j in range(11)] for i in range(11)])
-            is_flame = []
-            for r, c in zip(locations[0], locations[1]):
-                blast_str = bomb_map[(r, c)]
-                if not (r, c) in is_flame:
-                    ret.append({
-                        'position': (r, c),
-                        'blast_strength': 1  # is_flame
-                    })
-                    is_flame.append((r, c))
-                for _dir in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    for _i in range(1, int(blast_str)):
-                        _pos = (r + _dir[0] * _i, c + _dir[1] * _i)
-                        if _pos in is_flame:
-                            continue
-                        if utility.position_on_board(_board, _pos):
-                            if board[_pos] != constants.Item.Rigid and board[_pos] != constants.Item.Wood:
-                                ret.append({
-                                    'position': _pos,
-                                    'blast_strength': 1
-                                })
-                                is_flame.append(_pos)
-                            else:
-                                break
-                        else:
-                            break
-            return ret
-
-        # 20181218
-        # more aggressive flame map
-        def convert_flames2(_board, bomb_map, bomb_life):
-            locations = np.where(bomb_map > 0)
-            tmp_ret = {}
-            is_flame = []
-            for r, c in zip(locations[0], locations[1]):
-                blast_str = bomb_map[(r, c)]
-                if not (r, c) in is_flame:
-                    tmp_ret[(r, c)] = {
-                        'position': (r, c),
-                        'flame_time': bomb_life[(r, c)]  # is_flame
-                    }
-                    is_flame.append((r, c))
-                else:
-                    if bomb_life[(r, c)] < tmp_ret[(r, c)]['flame_time']:
-                        tmp_ret[(r, c)]['flame_time'] = bomb_life[(r, c)]
-                for _dir in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    for _i in range(1, int(blast_str)):
-                        _pos = (r + _dir[0] * _i, c + _dir[1] * _i)
-                        if _pos in is_flame:
-                            if bomb_life[_pos] < tmp_ret[_pos]['flame_time']:
-                                tmp_ret[_pos]['flame_time'] = bomb_life[_pos]
-                            continue
-                        if utility.position_on_board(_board, _pos):
-                            if board[_pos] != constants.Item.Rigid and board[_pos] != constants.Item.Wood:
-                                tmp_ret[_pos] = {
-                                    'position': _pos,
-                                    'flame_time': bomb_life[_pos]
-                                }
-                                is_flame.append(_pos)
-                            else:
-                                break
-                        else:
-                            break
-            # tmp_ret to ret
-            #ret = []
-            #for tm in tmp_ret:
-            #    ret.append(tmp_ret[tm])
-            return tmp_ret
-
         my_position = tuple(obs['position'])
         board = np.array(obs['board'])
-        bombs = convert_bombs(np.array(obs['bomb_blast_strength']))
+        bombs = analysis.bombs(obs)
         enemies = [constants.Item(e) for e in obs['enemies']]
         # 20181208
         teammate = constants.Item(obs['teammate'])  # fix it
         tm_value = teammate.value
         # tm_position = np.where(board == teammate.value)
-        tm_position = False
-        tm_coordinates = (-1, -1)
-        for i in range(len(board)):
-            for j in range(len(board[0])):
-                if board[(i, j)] == tm_value:
-                    tm_position = True
-                    tm_coordinates = (i, j)
+        tm_coordinates = analysis.agent_positions(obs).get(tm_value)
+        tm_position = tm_coordinates is not None
+        tm_coordinates = tm_coordinates or (-1, -1)
         # clean discarded code //20181218
         enemies2 = enemies.copy()
         enemies2.append(teammate)
 
         # 20181218
-        flames = convert_flames(board, np.array(obs['bomb_blast_strength']))
-        # modified bomb_life, consider chain reaction
-
-        bomb_life_board = np.array(obs['bomb_life'])
-        bl_locations = np.where(bomb_life_board > 0)
-        to_sort = []
-        for b0, b1 in zip(bl_locations[0], bl_locations[1]):
-            to_sort.append([bomb_life_board[(b0, b1)], (b0, b1)])
-        to_sort.sort()
-        to_sort.reverse()
-        _bomb_str_map = np.array(obs['bomb_blast_strength'])
-        while len(to_sort) > 0:
-        # for _b in to_sort:
-            _b = to_sort.pop(-1)
-            _pos = _b[1]
-            r1, c1 = _pos
-            b_life = _b[0]
-            for _dir in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                for _i in range(1, int(_bomb_str_map[_pos])):
-                    _pos2 = (r1 + _dir[0] * _i, c1 + _dir[1] * _i)
-                    if utility.position_on_board(board, _pos2):
-                        if _bomb_str_map[_pos2] > 0 \
-                                and bomb_life_board[_pos2] < bomb_life_board[_pos]:
-                            bomb_life_board[_pos2] = bomb_life_board[_pos2]
-                            to_sort.append([b_life, _pos2])
-                        elif board[_pos2] == constants.Item.Rigid \
-                                or board[_pos2] == constants.Item.Wood:
-                            break
-                    else:
-                        break
-
-        # flames2 = convert_flames2(board, np.array(obs['bomb_blast_strength']),
-        #                          np.array(obs['bomb_life']))  # bomb_life_board)
-        flames2 = convert_flames2(board, np.array(obs['bomb_blast_strength']),
-                                  bomb_life_board)
+        # when the flames reach every cell, considering chain reactions
+        danger = analysis.danger(obs)
         dang_move = []
         for _m in [constants.Action.Up, constants.Action.Down,
                    constants.Action.Left, constants.Action.Right]:
-            _d = (int(_m.value < 3)*(_m.value-1.5)*2, int(_m.value > 2)*(_m.value-3.5)*2)
-            new_pos = (my_position[0]+_d[0], my_position[1]+_d[1])
-            if {'position': new_pos, 'blast_strength': 1} in flames:
-                if flames2[new_pos]['flame_time'] < 5:  # value can be adjusted
+            new_pos = utility.get_next_position(my_position, _m)
+            if utility.position_on_board(board, new_pos):
+                if danger[new_pos] < np.inf:  # the flames will reach it
                     dang_move.append(_m)
 
         ammo = int(obs['ammo'])
@@ -208,9 +89,7 @@ class SimpleTeamAgent2(BaseAgent):
         # Move if we are in an unsafe place.
         unsafe_directions = self._directions_in_range_of_bomb(
             board, my_position, bombs, dist)
-        real_dang = False
-        if my_position in flames2:
-            real_dang = flames2[my_position]['flame_time'] < 7
+        real_dang = danger[my_position] < np.inf
         if unsafe_directions and real_dang:  # consider when will the bomb explode
             # 20181208
             directions = self._find_safe_directions(
@@ -324,68 +203,8 @@ class SimpleTeamAgent2(BaseAgent):
 
     @staticmethod
     def _djikstra(board, my_position, bombs, enemies, depth=None, exclude=None):
-        assert (depth is not None)
-
-        if exclude is None:
-            exclude = [
-                constants.Item.Fog, constants.Item.Rigid, constants.Item.Flames
-            ]
-
-        def out_of_range(p_1, p_2):
-            '''Determines if two points are out of rang of each other'''
-            x_1, y_1 = p_1
-            x_2, y_2 = p_2
-            return abs(y_2 - y_1) + abs(x_2 - x_1) > depth
-
-        items = defaultdict(list)
-        dist = {}
-        prev = {}
-        Q = queue.Queue()
-
-        my_x, my_y = my_position
-        for r in range(max(0, my_x - depth), min(len(board), my_x + depth)):
-            for c in range(max(0, my_y - depth), min(len(board), my_y + depth)):
-                position = (r, c)
-                if any([
-                        out_of_range(my_position, position),
-                        utility.position_in_items(board, position, exclude),
-                ]):
-                    continue
-
-                prev[position] = None
-                item = constants.Item(board[position])
-                items[item].append(position)
-                
-                if position == my_position:
-                    Q.put(position)
-                    dist[position] = 0
-                else:
-                    dist[position] = np.inf
-
-        for bomb in bombs:
-            if bomb['position'] == my_position:
-                items[constants.Item.Bomb].append(my_position)
-
-        while not Q.empty():
-            position = Q.get()
-
-            if utility.position_is_passable(board, position, enemies):
-                x, y = position
-                val = dist[(x, y)] + 1
-                for row, col in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    new_position = (row + x, col + y)
-                    if new_position not in dist:
-                        continue
-
-                    if val < dist[new_position]:
-                        dist[new_position] = val
-                        prev[new_position] = position
-                        Q.put(new_position)
-                    elif (val == dist[new_position] and random.random() < .5):
-                        dist[new_position] = val
-                        prev[new_position] = position   
-
-        return items, dist, prev
+        return pathing.djikstra(board, my_position, bombs, enemies, depth,
+                                exclude)
 
     def _directions_in_range_of_bomb(self, board, my_position, bombs, dist):
         ret = defaultdict(int)
@@ -0,0 +1,486 @@
+'''Module to advance many game states at once with vectorized numpy ops.
+
+The BatchedForwardModel holds N games as a GameState with batch shape [N] and
+steps all of them with the same rules as ForwardModel.step. See game_state.py
+for the layout of the bomb table and the flames bitmask.
+'''
+import numpy as np
+
+from . import constants
+from . import game_state
+
+PASSAGE = constants.Item.Passage.value
+RIGID = constants.Item.Rigid.value
+WOOD = constants.Item.Wood.value
+BOMB = constants.Item.Bomb.value
+FLAMES = constants.Item.Flames.value
+EXTRA_BOMB = constants.Item.ExtraBomb.value
+INCR_RANGE = constants.Item.IncrRange.value
+KICK = constants.Item.Kick.value
+AGENT0 = constants.Item.Agent0.value
+
+MAX_AMMO = game_state.MAX_AMMO
+FLAME_LIFE = 2
+
+# Row/col deltas indexed by constants.Action value. Stop and Bomb don't move.
+DELTAS = np.array([[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1], [0, 0]])
+
+
+def is_powerup(values):
+    '''Elementwise check for powerup item values'''
+    return (values >= EXTRA_BOMB) & (values <= KICK)
+
+
+def is_wall(values):
+    '''Elementwise check for rigid and wood walls'''
+    return (values == RIGID) | (values == WOOD)
+
+
+class BatchedForwardModel(object):
+    """Steps a batch of games at once.
+
+    Every game in the batch has the same board size and the same number of
+    agents. Agents are indexed by agent_id.
+    """
+
+    def __init__(self,
+                 num_games=None,
+                 board_size=constants.BOARD_SIZE,
+                 num_agents=4,
+                 max_bombs=None,
+                 max_blast_strength=10,
+                 state=None):
+        """Makes the batch.
+
+        Args:
+          num_games: How many games to hold. Ignored if state is given.
+          board_size: The board size of every game.
+          num_agents: The number of agents of every game.
+          max_bombs: The initial capacity of the bomb tables. They grow as
+            needed.
+          max_blast_strength: The cap for picked up IncrRange powerups.
+          state: Optional GameState with batch shape [num_games] to step in
+            place instead of a new one.
+        """
+        if state is None:
+            state = game_state.GameState(
+                board_size, num_agents, max_bombs, batch_shape=(num_games,))
+        self.state = state
+        self.num_games = state.batch_shape[0]
+        self.board_size = state.board_size
+        self.num_agents = state.num_agents
+        self.max_blast_strength = max_blast_strength
+
+    def set_game(self, index, board, agents, bombs, items, flames):
+        """Loads a game given in the scalar ForwardModel representation.
+
+        Args:
+          index: Which game of the batch to overwrite.
+          board: The board array.
+          agents: The agent characters, ordered by agent_id.
+          bombs: The list of characters.Bomb.
+          items: The dict of hidden items by position.
+          flames: The list of characters.Flame.
+        """
+        self.state.num_bombs[index] = 0
+        self.state.reserve_bombs(len(bombs))
+        self.state.game(index).set_objects(board, agents, bombs, items, flames)
+
+    def get_game(self, index, agents=None):
+        """Exports a game in the scalar ForwardModel representation.
+
+        Args:
+          index: Which game of the batch to export.
+          agents: Optional agent characters to update in place. If None, new
+            characters.Bomber are made.
+
+        Returns:
+          board, agents, bombs, items, flames as used by ForwardModel.step.
+        """
+        return self.state.game(index).to_objects(agents)
+
+    def set_state(self, index, state):
+        '''Copies a single game GameState into the batch'''
+        self.state.num_bombs[index] = 0
+        self.state.reserve_bombs(int(state.num_bombs))
+        game = self.state.game(index)
+        width = int(state.num_bombs)
+        for field in game_state.FIELDS:
+            if field in game_state.BOMB_FIELDS:
+                getattr(game, field)[:width] = getattr(state, field)[:width]
+            else:
+                getattr(game, field)[...] = getattr(state, field)
+
+    def get_state(self, index):
+        '''Returns a copy of one game of the batch as a GameState'''
+        return self.state.game(index).copy()
+
+    def step(self, actions):
+        """Advances every game in the batch by one step in place.
+
+        Args:
+          actions: An int array [num_games, num_agents] of constants.Action
+            values. Actions of dead agents are ignored.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        num_games, size = self.num_games, self.board_size
+        games = np.arange(num_games)
+        offsets = games * size * size
+        board = self.state.board.reshape(-1)
+
+        # Tick the flames. Cells whose oldest flame dies reveal their item.
+        dying = (self.state.flames & 1).astype(bool)
+        self.state.flames >>= 1
+        if dying.any():
+            revealed = np.where(self.state.items != 0, self.state.items, PASSAGE)
+            self.state.board[dying] = revealed[dying]
+            self.state.items[dying] = 0
+        self.state.board[self.state.flames != 0] = FLAMES
+
+        # Lay bombs and gather the desired next positions of alive agents.
+        alive = self.state.agent_alive.copy()
+        agent_cell = self._cells(self.state.agent_position, offsets)
+        board[agent_cell[alive]] = PASSAGE
+
+        active, bomb_cell = self._bomb_cells(offsets)
+        bomb_here = ((bomb_cell[:, None, :] == agent_cell[:, :, None]) &
+                     active[:, None, :]).any(2)
+        lay = alive & (actions == constants.Action.Bomb.value) & \
+            ~bomb_here & (self.state.agent_ammo > 0)
+        if lay.any():
+            self._lay_bombs(lay)
+            active, bomb_cell = self._bomb_cells(offsets)
+        width = active.shape[1]
+
+        moves = alive & (actions >= constants.Action.Up.value) & \
+            (actions <= constants.Action.Right.value)
+        agent_desired = self._next_cells(
+            agent_cell, np.where(moves, actions, 0), offsets, is_wall)
+
+        # Gather desired next positions for moving bombs.
+        board[bomb_cell[active]] = PASSAGE
+        bomb_direction = self.state.bomb_moving_direction[:, :width]
+        bomb_desired = self._next_cells(
+            bomb_cell, np.where(active, bomb_direction, 0), offsets,
+            lambda values: is_powerup(values) | is_wall(values))
+
+        agent_desired, bomb_desired, kicked_by = self._resolve_movement(
+            actions, alive, active, agent_cell, agent_desired, bomb_cell,
+            bomb_desired)
+
+        # Move bombs and stop the ones that did not get anywhere.
+        kicked = kicked_by >= 0
+        bomb_direction[kicked] = actions[np.nonzero(kicked)[0],
+                                         kicked_by[kicked]]
+        bomb_direction[active & (bomb_desired == bomb_cell) & ~kicked] = 0
+        self.state.bomb_position[:, :width] = self._positions(bomb_desired, offsets)
+
+        # Move agents and pick up powerups.
+        moved = alive & (agent_desired != agent_cell)
+        self.state.agent_position[...] = self._positions(agent_desired, offsets)
+        value = np.where(moved, board[agent_desired], PASSAGE)
+        extra_bomb = value == EXTRA_BOMB
+        self.state.agent_ammo[extra_bomb] = np.minimum(
+            self.state.agent_ammo[extra_bomb] + 1, MAX_AMMO)
+        incr_range = value == INCR_RANGE
+        self.state.agent_blast_strength[incr_range] = np.minimum(
+            self.state.agent_blast_strength[incr_range] + 1,
+            self.max_blast_strength)
+        self.state.agent_can_kick[value == KICK] = True
+
+        self._explode(active, bomb_desired, offsets)
+
+        # Kill agents on flames. Otherwise, update position on the board.
+        on_flames = alive & (board[agent_desired] == FLAMES)
+        self.state.agent_alive[on_flames] = False
+        survivors = alive & ~on_flames
+        agent_values = np.broadcast_to(
+            AGENT0 + np.arange(self.num_agents), alive.shape)
+        board[agent_desired[survivors]] = agent_values[survivors]
+
+    def _resolve_movement(self, actions, alive, active, agent_cell,
+                          agent_desired, bomb_cell, bomb_desired):
+        """Resolves crossings, collisions and kicks like ForwardModel.step.
+
+        Occupancy counts never decrease while resolving, so reverting every
+        colliding entity of a sweep at once reaches the same fixpoint as the
+        sequential loops of the scalar model.
+
+        Returns:
+          agent_desired, bomb_desired and, for every bomb, the agent that
+          kicked it or -1.
+        """
+        num_games = self.num_games
+        games = np.arange(num_games)
+
+        # Position switches revert movers crossing the same border.
+        # Agent <-> Agent => revert both to previous position.
+        # Bomb <-> Bomb => revert both to previous position.
+        # Agent <-> Bomb => revert Bomb to previous position.
+        agent_moving = alive & (agent_desired != agent_cell)
+        bomb_moving = active & (bomb_desired != bomb_cell)
+        agent_border = np.where(
+            agent_moving, self._border(agent_cell, agent_desired), -1)
+        bomb_border = np.where(
+            bomb_moving, self._border(bomb_cell, bomb_desired), -2)
+        agent_cross = (agent_border[:, :, None] == agent_border[:, None, :])
+        agent_cross = agent_cross.sum(2) > 1
+        bomb_cross = (bomb_border[:, :, None] == bomb_border[:, None, :])
+        bomb_cross = (bomb_cross.sum(2) > 1) | \
+            (bomb_border[:, :, None] == agent_border[:, None, :]).any(2)
+        agent_desired = np.where(agent_cross, agent_cell, agent_desired)
+        bomb_desired = np.where(bomb_cross, bomb_cell, bomb_desired)
+
+        # Resolve >=2 agents or >=2 bombs trying to occupy the same space.
+        total_cells = self.state.board.size
+        agent_occupancy = np.bincount(
+            agent_desired[alive], minlength=total_cells)
+        bomb_occupancy = np.bincount(
+            bomb_desired[active], minlength=total_cells)
+        while True:
+            agent_revert = alive & (agent_desired != agent_cell) & (
+                (agent_occupancy[agent_desired] > 1) |
+                (bomb_occupancy[agent_desired] > 1))
+            bomb_revert = active & (bomb_desired != bomb_cell) & (
+                (bomb_occupancy[bomb_desired] > 1) |
+                (agent_occupancy[bomb_desired] > 1))
+            if not (agent_revert.any() or bomb_revert.any()):
+                break
+            agent_desired[agent_revert] = agent_cell[agent_revert]
+            np.add.at(agent_occupancy, agent_cell[agent_revert], 1)
+            bomb_desired[bomb_revert] = bomb_cell[bomb_revert]
+            np.add.at(bomb_occupancy, bomb_cell[bomb_revert], 1)
+
+        # Handle kicks. After the sweep above, at most one alive agent wants
+        # any bomb's desired cell.
+        match = alive[:, None, :] & active[:, :, None] & \
+            (agent_desired[:, None, :] == bomb_desired[:, :, None])
+        has_agent = match.any(2)
+        kicker = match.argmax(2)
+        kicker_cell = agent_cell[games[:, None], kicker]
+        kicker_stays = agent_desired[games[:, None], kicker] == kicker_cell
+        revert_bomb = has_agent & kicker_stays & (bomb_desired != bomb_cell)
+        tries = has_agent & ~kicker_stays & \
+            self.state.agent_can_kick[games[:, None], kicker]
+        target = self._next_cells(
+            bomb_desired,
+            np.where(tries, actions[games[:, None], kicker], 0),
+            games * self.board_size ** 2,
+            lambda values: is_powerup(values) | is_wall(values))
+        kicked = tries & (target != bomb_desired) & \
+            (agent_occupancy[target] == 0) & (bomb_occupancy[target] == 0)
+        bounce = has_agent & ~kicker_stays & ~kicked
+        revert_bomb |= bounce
+        revert_agent = np.zeros_like(alive)
+        bounce_game, bounce_bomb = np.nonzero(bounce)
+        revert_agent[bounce_game, kicker[bounce_game, bounce_bomb]] = True
+
+        bomb_occupancy[bomb_desired[kicked]] = 0
+        bomb_desired[revert_bomb] = bomb_cell[revert_bomb]
+        bomb_desired[kicked] = target[kicked]
+        np.add.at(bomb_occupancy, bomb_desired[revert_bomb | kicked], 1)
+        agent_desired[revert_agent] = agent_cell[revert_agent]
+        np.add.at(agent_occupancy, agent_cell[revert_agent], 1)
+
+        # Late collisions resulting from kicks. This only runs for games that
+        # had delayed updates, exactly like the scalar second loop. A
+        # reverting kicker takes its bomb back with it and vice versa.
+        late = (revert_bomb | kicked).any(1) | revert_agent.any(1)
+        kicked_by = np.where(kicked, kicker, -1)
+        while late.any():
+            agent_revert = late[:, None] & alive & \
+                (agent_desired != agent_cell) & (
+                    (agent_occupancy[agent_desired] > 1) |
+                    (bomb_occupancy[agent_desired] != 0))
+            bomb_revert = late[:, None] & active & (
+                (bomb_desired != bomb_cell) | (kicked_by >= 0)) & (
+                    (bomb_occupancy[bomb_desired] > 1) |
+                    (agent_occupancy[bomb_desired] != 0))
+            if not (agent_revert.any() or bomb_revert.any()):
+                break
+            kick_game, kick_bomb = np.nonzero(kicked_by >= 0)
+            kick_agent = kicked_by[kick_game, kick_bomb]
+            bomb_revert[kick_game, kick_bomb] |= \
+                agent_revert[kick_game, kick_agent]
+            agent_revert[kick_game, kick_agent] |= \
+                bomb_revert[kick_game, kick_bomb]
+            kicked_by[bomb_revert] = -1
+
+            agent_desired[agent_revert] = agent_cell[agent_revert]
+            np.add.at(agent_occupancy, agent_cell[agent_revert], 1)
+            bomb_desired[bomb_revert] = bomb_cell[bomb_revert]
+            np.add.at(bomb_occupancy, bomb_cell[bomb_revert], 1)
+
+        return agent_desired, bomb_desired, kicked_by
+
+    def _cells(self, position, offsets):
+        '''Turns [num_games, K, 2] row/col positions into global cells.'''
+        return offsets[:, None] + \
+            position[..., 0] * self.board_size + position[..., 1]
+
+    def _positions(self, cells, offsets):
+        '''Turns [num_games, K] global cells into row/col positions.'''
+        return np.stack(
+            np.divmod(cells - offsets[:, None], self.board_size), axis=-1)
+
+    def _bomb_cells(self, offsets):
+        '''Gets the mask and cells of the used part of the bomb table.'''
+        width = int(self.state.num_bombs.max())
+        active = np.arange(width)[None, :] < self.state.num_bombs[:, None]
+        return active, self._cells(self.state.bomb_position[:, :width], offsets)
+
+    def _lay_bombs(self, lay):
+        '''Appends a bomb for each laying agent in agent order.'''
+        self.state.reserve_bombs(self.num_agents)
+        games, agents = np.nonzero(lay)
+        slots = self.state.num_bombs[games] + \
+            (np.cumsum(lay, axis=1) - 1)[games, agents]
+        self.state.agent_ammo[games, agents] -= 1
+        self.state.bomb_position[games, slots] = self.state.agent_position[games, agents]
+        self.state.bomb_life[games, slots] = constants.DEFAULT_BOMB_LIFE
+        self.state.bomb_blast_strength[games, slots] = \
+            self.state.agent_blast_strength[games, agents]
+        self.state.bomb_moving_direction[games, slots] = 0
+        self.state.bomb_bomber[games, slots] = agents
+        self.state.num_bombs += lay.sum(1)
+
+    def _next_cells(self, cells, directions, offsets, is_blocked):
+        """Global cell one step along directions, if on board and open.
+
+        Args:
+          cells: An int array [num_games, K] of global cells.
+          directions: An int array [num_games, K] of constants.Action values.
+          offsets: Start of every game in the flattened board.
+          is_blocked: Function of the board values at the next cells that
+            returns whether moving there is not allowed.
+
+        Returns:
+          An int array [num_games, K] of global cells. Entities that can't
+          move keep their current cell.
+        """
+        size = self.board_size
+        position = self._positions(cells, offsets) + DELTAS[directions]
+        on_board = ((position >= 0) & (position < size)).all(-1)
+        next_cells = cells + DELTAS[directions, 0] * size + \
+            DELTAS[directions, 1]
+        ok = (directions != 0) & on_board
+        ok[ok] = ~is_blocked(self.state.board.reshape(-1)[next_cells[ok]])
+        return np.where(ok, next_cells, cells)
+
+    @staticmethod
+    def _border(cell, desired):
+        '''Identifies the border crossed when moving from cell to desired.'''
+        horizontal = np.abs(desired - cell) == 1
+        return 2 * np.minimum(cell, desired) + horizontal
+
+    def _explode(self, active, bomb_cell, offsets):
+        '''Ticks the bombs, chains their explosions and lays the flames.'''
+        board = self.state.board.reshape(-1)
+        width = active.shape[1]
+        life = self.state.bomb_life[:, :width]
+        life[active] -= 1
+        exploded = active & (life == 0)
+        fired = active & ~exploded & (board[bomb_cell] == FLAMES)
+        life[fired] = 0
+        exploded |= fired
+
+        games = np.nonzero(exploded.any(1))[0]
+        if len(games):
+            exploded_map = self._chain(games, active[games], exploded[games],
+                                       bomb_cell[games] - offsets[games, None])
+            exploded[games] = exploded_map[1]
+
+        # Update the board's bombs and flames.
+        remaining = active & ~exploded
+        board[bomb_cell[remaining]] = BOMB
+        if len(games):
+            self._drop_bombs(games, remaining[games])
+            self.state.flames[games] |= (exploded_map[0] << FLAME_LIFE).astype(
+                np.uint8)
+        self.state.board[self.state.flames != 0] = FLAMES
+
+    def _chain(self, games, active, exploded, cells):
+        """Chains the explosions of the given games.
+
+        Returns:
+          The exploded map [len(games), board_size, board_size] and the mask
+          of all exploded bombs. Ammo is returned to the bombers.
+        """
+        size = self.board_size
+        width = active.shape[1]
+        blast = blast_masks(self.state.board[games],
+                            self.state.bomb_position[games, :width],
+                            np.where(active, self.state.bomb_blast_strength[
+                                games, :width], 0))
+        index = np.arange(len(games))[:, None, None]
+        hits = blast[index, np.arange(width)[None, :, None], cells[:, None, :]]
+        hits &= active[:, None, :]
+        while True:
+            chained = (hits & exploded[:, :, None]).any(1) & ~exploded
+            if not chained.any():
+                break
+            exploded |= chained
+
+        rows, bombs = np.nonzero(exploded)
+        bombers = self.state.bomb_bomber[games[rows], bombs]
+        has_bomber = bombers >= 0
+        np.add.at(self.state.agent_ammo,
+                  (games[rows[has_bomber]], bombers[has_bomber]), 1)
+        np.minimum(self.state.agent_ammo, MAX_AMMO, out=self.state.agent_ammo)
+        exploded_map = (blast & exploded[:, :, None]).any(1)
+        return exploded_map.reshape(len(games), size, size), exploded
+
+    def _drop_bombs(self, games, remaining):
+        '''Keeps the remaining bombs in order at the front of the table.'''
+        width = remaining.shape[1]
+        order = np.argsort(~remaining, axis=1, kind='stable')
+        for array in (self.state.bomb_position, self.state.bomb_life,
+                      self.state.bomb_blast_strength, self.state.bomb_moving_direction,
+                      self.state.bomb_bomber):
+            index = order.reshape(order.shape + (1,) * (array.ndim - 2))
+            array[games, :width] = np.take_along_axis(
+                array[games, :width], index, axis=1)
+        self.state.num_bombs[games] = remaining.sum(1)
+
+
+def blast_masks(board, position, strength):
+    """Cells reached by the blast of every bomb.
+
+    Rays stop before rigid walls and the board edge, and stop after the first
+    wooden wall, like characters.Bomb.explode in ForwardModel.step.
+
+    Args:
+      board: The boards [num_games, board_size, board_size].
+      position: The bomb positions [num_games, num_bombs, 2].
+      strength: The bomb blast strengths [num_games, num_bombs]. Use 0 for
+        unused slots.
+
+    Returns:
+      A bool array [num_games, num_bombs, board_size**2].
+    """
+    num_games, size = board.shape[:2]
+    num_bombs = position.shape[1]
+    blast = np.zeros((num_games, num_bombs, size * size), dtype=bool)
+    games = np.arange(num_games)[:, None]
+    bombs = np.arange(num_bombs)[None, :]
+    center = position[..., 0] * size + position[..., 1]
+    blast[games, bombs, center] = strength > 0
+    length = int(min(max(strength.max() - 1, 0), size - 1))
+    if not length:
+        return blast
+
+    distance = np.arange(1, length + 1)
+    for delta in DELTAS[1:5]:
+        rays = position[:, :, None, :] + distance[:, None] * delta
+        on_board = ((rays >= 0) & (rays < size)).all(-1)
+        rays = np.clip(rays, 0, size - 1)
+        values = board[games[..., None], rays[..., 0], rays[..., 1]]
+        open_ = on_board & (values != RIGID)
+        after_wood = np.zeros_like(open_)
+        after_wood[..., 1:] = np.cumsum(values == WOOD, axis=-1)[..., :-1] > 0
+        reached = np.cumprod(open_, axis=-1).astype(bool) & ~after_wood
+        reached &= distance < strength[..., None]
+        game, bomb, step = np.nonzero(reached)
+        blast[game, bomb, rays[game, bomb, step, 0] * size +
+              rays[game, bomb, step, 1]] = True
+    return blast
@@ -0,0 +1,114 @@
+"""Benchmark the BatchedForwardModel against the scalar ForwardModel.
+
+Both engines play the same freshly generated games with the same random
+actions. Pass --check to also compare every game after every step.
+
+python -m pommerman.benchmarks.batched --num_games=1000 --num_steps=50
+"""
+import argparse
+import copy
+import random
+import time
+
+import numpy as np
+
+from .. import characters
+from .. import constants
+from .. import utility
+from ..batched_forward_model import BatchedForwardModel
+from ..forward_model import ForwardModel
+
+
+def make_games(num_games, board_size=constants.BOARD_SIZE,
+               num_rigid=constants.NUM_RIGID, num_wood=constants.NUM_WOOD,
+               num_items=constants.NUM_ITEMS):
+    '''Makes fresh games in the ForwardModel representation'''
+    games = []
+    for _ in range(num_games):
+        board = utility.make_board(board_size, num_rigid, num_wood)
+        items = utility.make_items(board, num_items)
+        agents = []
+        for agent_id in range(4):
+            agent = characters.Bomber(agent_id, constants.GameType.FFA)
+            row, col = np.where(board == utility.agent_value(agent_id))
+            agent.set_start_position((row[0], col[0]))
+            agent.reset()
+            agents.append(agent)
+        games.append((board, agents, [], items, []))
+    return games
+
+
+def same_game(scalar, batched):
+    '''Checks that two games in the ForwardModel representation match'''
+    board, agents, bombs, items, flames = scalar
+    board_, agents_, bombs_, items_, flames_ = batched
+    if not np.array_equal(board, board_):
+        return False
+    for agent, agent_ in zip(agents, agents_):
+        if agent.to_json() != agent_.to_json():
+            return False
+    if [bomb.to_json() for bomb in bombs] != \
+       [bomb.to_json() for bomb in bombs_]:
+        return False
+    if sorted(items.items()) != sorted(items_.items()):
+        return False
+    def flame_key(flame):
+        return tuple(flame.position), flame.to_json()['life']
+
+    return sorted(map(flame_key, flames)) == sorted(map(flame_key, flames_))
+
+
+def run(num_games, num_steps, check=False, seed=0):
+    '''Times both engines and returns their env-steps per second'''
+    random.seed(seed)
+    np.random.seed(seed)
+    games = make_games(num_games)
+    actions = np.random.randint(
+        len(constants.Action), size=(num_steps, num_games, 4))
+
+    model = BatchedForwardModel(num_games)
+    for num, game in enumerate(games):
+        model.set_game(num, *copy.deepcopy(game))
+
+    scalar_time = batched_time = 0.0
+    for step in range(num_steps):
+        start = time.time()
+        for num, game in enumerate(games):
+            games[num] = ForwardModel.step(actions[step, num].tolist(), *game)
+        scalar_time += time.time() - start
+
+        start = time.time()
+        model.step(actions[step])
+        batched_time += time.time() - start
+
+        if check:
+            for num, game in enumerate(games):
+                assert same_game(game, model.get_game(num)), \
+                    "Game %d differs at step %d." % (num, step)
+
+    total = float(num_games * num_steps)
+    return {
+        'scalar_steps_per_sec': total / scalar_time,
+        'batched_steps_per_sec': total / batched_time,
+    }
+
+
+def main():
+    '''CLI entry point for the batched benchmark'''
+    parser = argparse.ArgumentParser(description='Batched engine benchmark.')
+    parser.add_argument('--num_games', type=int, default=1000)
+    parser.add_argument('--num_steps', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--check',
+        default=False,
+        action='store_true',
+        help='Compare both engines after every step.')
+    args = parser.parse_args()
+    result = run(args.num_games, args.num_steps, args.check, args.seed)
+    for key, value in sorted(result.items()):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
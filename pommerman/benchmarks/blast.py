@@ -0,0 +1,155 @@
+"""Check and benchmark blast.chain_explosions on a corpus of recorded games.
+
+The corpus is either the game states recorded with --record_json_dir, or
+games that are played here with SimpleAgents. For every state, the bombs are
+ticked as in ForwardModel.step and their explosions are chained both with
+blast.chain_explosions and with the wave by wave loop that step used before.
+The exploded maps and the fired bombs of both have to match.
+
+python -m pommerman.benchmarks.blast --num_games=20
+python -m pommerman.benchmarks.blast --corpus_dir=/path/to/record_json_dir
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from .. import agents
+from .. import blast
+from .. import constants
+from .. import make
+from ..game_state import GameState
+
+
+def chain_waves(board, bombs):
+    '''The previous chaining of ForwardModel.step, redone for every wave'''
+    board_size = len(board)
+    exploded_map = np.zeros_like(board)
+    has_new_explosions = any(bomb.exploded() for bomb in bombs)
+    while has_new_explosions:
+        next_bombs = []
+        has_new_explosions = False
+        for bomb in bombs:
+            if not bomb.exploded():
+                next_bombs.append(bomb)
+                continue
+
+            for _, indices in bomb.explode().items():
+                for r, c in indices:
+                    if not all(
+                        [r >= 0, c >= 0, r < board_size, c < board_size]):
+                        break
+                    if board[r][c] == constants.Item.Rigid.value:
+                        break
+                    exploded_map[r][c] = 1
+                    if board[r][c] == constants.Item.Wood.value:
+                        break
+
+        bombs = next_bombs
+        for bomb in bombs:
+            if bomb.in_range(exploded_map):
+                bomb.fire()
+                has_new_explosions = True
+    return exploded_map
+
+
+def record_games(config, num_games, seed=0):
+    '''Plays games with SimpleAgents and returns the states of every step'''
+    states = []
+    for game in range(num_games):
+        random.seed(seed + game)
+        np.random.seed(seed + game)
+        env = make(config, [agents.SimpleAgent() for _ in range(4)])
+        env.seed(seed + game)
+        obs = env.reset()
+        done = False
+        while not done:
+            states.append(env.get_game_state())
+            obs, _, done, _ = env.step(env.act(obs))
+    return states
+
+
+def load_games(corpus_dir):
+    '''Loads the states recorded by the env with record_json_dir'''
+    states = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, '**', '*.json'),
+                                 recursive=True)):
+        with open(path) as f:
+            states.append(GameState.from_json_info(json.load(f)))
+    return states
+
+
+def run(states):
+    '''Compares both ways of chaining explosions and times them'''
+    wave_time = chain_time = 0.0
+    num_explosions = 0
+    for num, state in enumerate(states):
+        board, _, bombs, _, flames = state.to_objects()
+        # Bombs and agents are cleared off the board before exploding, and
+        # the flames that are still burning are drawn on it.
+        board[board == constants.Item.Bomb.value] = \
+            constants.Item.Passage.value
+        board[board >= constants.Item.AgentDummy.value] = \
+            constants.Item.Passage.value
+        for flame in flames:
+            if not flame.is_dead():
+                board[flame.position] = constants.Item.Flames.value
+        for bomb in bombs:
+            bomb.tick()
+            if board[bomb.position] == constants.Item.Flames.value:
+                bomb.fire()
+        if not any(bomb.exploded() for bomb in bombs):
+            continue
+        num_explosions += 1
+
+        wave_bombs = copy.deepcopy(bombs)
+        start = time.time()
+        wave_map = chain_waves(board, wave_bombs)
+        wave_time += time.time() - start
+
+        start = time.time()
+        chain_map = blast.chain_explosions(board, bombs)
+        chain_time += time.time() - start
+
+        assert np.array_equal(wave_map, chain_map), \
+            "The exploded maps of state %d differ." % num
+        assert [bomb.life for bomb in wave_bombs] == \
+            [bomb.life for bomb in bombs], \
+            "The fired bombs of state %d differ." % num
+
+    return {
+        'num_states': len(states),
+        'num_explosions': num_explosions,
+        'wave_usec': 1e6 * wave_time / max(num_explosions, 1),
+        'chain_usec': 1e6 * chain_time / max(num_explosions, 1),
+    }
+
+
+def main():
+    '''CLI entry point for the blast benchmark'''
+    parser = argparse.ArgumentParser(description='Chained explosions check.')
+    parser.add_argument('--config', default='PommeFFACompetition-v0')
+    parser.add_argument('--num_games', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--corpus_dir',
+        default=None,
+        help='Directory of recorded game states. If not given, games are '
+        'played with SimpleAgents.')
+    args = parser.parse_args()
+    if args.corpus_dir:
+        states = load_games(args.corpus_dir)
+    else:
+        states = record_games(args.config, args.num_games, args.seed)
+    result = run(states)
+    for key, value in sorted(result.items()):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
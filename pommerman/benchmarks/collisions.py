@@ -0,0 +1,308 @@
+"""Check and benchmark collisions.resolve_collisions on dense scenes.
+
+Every scene packs the agents and the bombs into a small window of an open
+board, so that most of them swap, bounce, kick or collide. The scenes are
+resolved both with collisions.resolve_collisions and with the dict based
+fixpoint loops that ForwardModel.step used before, and the results have to
+match.
+
+python -m pommerman.benchmarks.collisions --num_scenes=10000 --window=4
+"""
+import argparse
+from collections import defaultdict
+import random
+import time
+
+import numpy as np
+
+from .. import collisions
+from .. import constants
+from .. import utility
+
+DIRECTIONS = [
+    constants.Action.Up, constants.Action.Down, constants.Action.Left,
+    constants.Action.Right
+]
+
+
+def resolve_dicts(board, agent_positions, desired_agent_positions,
+                  agent_can_kick, agent_actions, bomb_positions,
+                  desired_bomb_positions):
+    '''The previous resolution of ForwardModel.step, on (row, col) tuples'''
+    crossings = {}
+
+    def crossing(current, desired):
+        current_x, current_y = current
+        desired_x, desired_y = desired
+        if current_x != desired_x:
+            return ('X', min(current_x, desired_x), current_y)
+        return ('Y', current_x, min(current_y, desired_y))
+
+    for num_agent, position in enumerate(agent_positions):
+        if desired_agent_positions[num_agent] != position:
+            border = crossing(position, desired_agent_positions[num_agent])
+            if border in crossings:
+                desired_agent_positions[num_agent] = position
+                num_agent2, _ = crossings[border]
+                desired_agent_positions[num_agent2] = agent_positions[
+                    num_agent2]
+            else:
+                crossings[border] = (num_agent, True)
+
+    for num_bomb, position in enumerate(bomb_positions):
+        if desired_bomb_positions[num_bomb] != position:
+            border = crossing(position, desired_bomb_positions[num_bomb])
+            if border in crossings:
+                desired_bomb_positions[num_bomb] = position
+                num, is_agent = crossings[border]
+                if not is_agent:
+                    desired_bomb_positions[num] = bomb_positions[num]
+            else:
+                crossings[border] = (num_bomb, False)
+
+    agent_occupancy = defaultdict(int)
+    bomb_occupancy = defaultdict(int)
+    for desired_position in desired_agent_positions:
+        agent_occupancy[desired_position] += 1
+    for desired_position in desired_bomb_positions:
+        bomb_occupancy[desired_position] += 1
+
+    change = True
+    while change:
+        change = False
+        for num_agent, curr_position in enumerate(agent_positions):
+            desired_position = desired_agent_positions[num_agent]
+            if desired_position != curr_position and \
+                  (agent_occupancy[desired_position] > 1 or
+                   bomb_occupancy[desired_position] > 1):
+                desired_agent_positions[num_agent] = curr_position
+                agent_occupancy[curr_position] += 1
+                change = True
+
+        for num_bomb, curr_position in enumerate(bomb_positions):
+            desired_position = desired_bomb_positions[num_bomb]
+            if desired_position != curr_position and \
+                  (bomb_occupancy[desired_position] > 1 or
+                   agent_occupancy[desired_position] > 1):
+                desired_bomb_positions[num_bomb] = curr_position
+                bomb_occupancy[curr_position] += 1
+                change = True
+
+    agent_indexed_by_kicked_bomb = {}
+    kicked_bomb_indexed_by_agent = {}
+    delayed_bomb_updates = []
+    delayed_agent_updates = []
+    for num_bomb, bomb_position in enumerate(bomb_positions):
+        desired_position = desired_bomb_positions[num_bomb]
+        if agent_occupancy[desired_position] == 0:
+            continue
+
+        agent_list = [
+            num_agent for num_agent in range(len(agent_positions))
+            if desired_position == desired_agent_positions[num_agent]
+        ]
+        if not agent_list:
+            continue
+        assert len(agent_list) == 1
+        num_agent = agent_list[0]
+        agent_position = agent_positions[num_agent]
+
+        if desired_position == agent_position:
+            if desired_position != bomb_position:
+                delayed_bomb_updates.append((num_bomb, bomb_position))
+            continue
+
+        if not agent_can_kick[num_agent]:
+            delayed_bomb_updates.append((num_bomb, bomb_position))
+            delayed_agent_updates.append((num_agent, agent_position))
+            continue
+
+        direction = constants.Action(agent_actions[num_agent])
+        target_position = utility.get_next_position(desired_position,
+                                                    direction)
+        if utility.position_on_board(board, target_position) and \
+                   agent_occupancy[target_position] == 0 and \
+                   bomb_occupancy[target_position] == 0 and \
+                   not utility.position_is_powerup(board, target_position) and \
+                   not utility.position_is_wall(board, target_position):
+            bomb_occupancy[desired_position] = 0
+            delayed_bomb_updates.append((num_bomb, target_position))
+            agent_indexed_by_kicked_bomb[num_bomb] = num_agent
+            kicked_bomb_indexed_by_agent[num_agent] = num_bomb
+        else:
+            delayed_bomb_updates.append((num_bomb, bomb_position))
+            delayed_agent_updates.append((num_agent, agent_position))
+
+    for (num_bomb, bomb_position) in delayed_bomb_updates:
+        desired_bomb_positions[num_bomb] = bomb_position
+        bomb_occupancy[bomb_position] += 1
+        change = True
+
+    for (num_agent, agent_position) in delayed_agent_updates:
+        desired_agent_positions[num_agent] = agent_position
+        agent_occupancy[agent_position] += 1
+        change = True
+
+    while change:
+        change = False
+        for num_agent, curr_position in enumerate(agent_positions):
+            desired_position = desired_agent_positions[num_agent]
+            if desired_position != curr_position and \
+                  (agent_occupancy[desired_position] > 1 or
+                   bomb_occupancy[desired_position] != 0):
+                if num_agent in kicked_bomb_indexed_by_agent:
+                    num_bomb = kicked_bomb_indexed_by_agent[num_agent]
+                    bomb_position = bomb_positions[num_bomb]
+                    desired_bomb_positions[num_bomb] = bomb_position
+                    bomb_occupancy[bomb_position] += 1
+                    del agent_indexed_by_kicked_bomb[num_bomb]
+                    del kicked_bomb_indexed_by_agent[num_agent]
+                desired_agent_positions[num_agent] = curr_position
+                agent_occupancy[curr_position] += 1
+                change = True
+
+        for num_bomb, curr_position in enumerate(bomb_positions):
+            desired_position = desired_bomb_positions[num_bomb]
+            if desired_position == curr_position and \
+               num_bomb not in agent_indexed_by_kicked_bomb:
+                continue
+
+            if bomb_occupancy[desired_position] > 1 or \
+               agent_occupancy[desired_position] != 0:
+                desired_bomb_positions[num_bomb] = curr_position
+                bomb_occupancy[curr_position] += 1
+                num_agent = agent_indexed_by_kicked_bomb.get(num_bomb)
+                if num_agent is not None:
+                    agent_position = agent_positions[num_agent]
+                    desired_agent_positions[num_agent] = agent_position
+                    agent_occupancy[agent_position] += 1
+                    del kicked_bomb_indexed_by_agent[num_agent]
+                    del agent_indexed_by_kicked_bomb[num_bomb]
+                change = True
+
+    return agent_indexed_by_kicked_bomb
+
+
+def make_scene(board_size, window, num_agents, num_bombs):
+    '''Makes a board with agents and bombs crowded into a window of it'''
+    board = np.zeros((board_size, board_size), dtype=np.uint8)
+    corner = random.randrange(board_size - window + 1)
+    cells = [(corner + row, corner + col) for row in range(window)
+             for col in range(window)]
+    random.shuffle(cells)
+    # Sprinkle walls and powerups that block bombs around the window.
+    for _ in range(window):
+        row, col = random.randrange(board_size), random.randrange(board_size)
+        board[row, col] = random.choice([
+            constants.Item.Rigid.value, constants.Item.Wood.value,
+            constants.Item.Kick.value
+        ])
+
+    agent_positions = cells[:num_agents]
+    bomb_positions = cells[num_agents:num_agents + num_bombs]
+    for position in agent_positions + bomb_positions:
+        board[position] = constants.Item.Passage.value
+
+    agent_actions = []
+    desired_agent_positions = []
+    for position in agent_positions:
+        action = random.choice(DIRECTIONS + [constants.Action.Stop]).value
+        agent_actions.append(action)
+        if utility.is_valid_direction(board, position, action):
+            desired_agent_positions.append(
+                utility.get_next_position(position, constants.Action(action)))
+        else:
+            desired_agent_positions.append(position)
+
+    desired_bomb_positions = []
+    for position in bomb_positions:
+        desired = utility.get_next_position(position, random.choice(DIRECTIONS))
+        if random.random() < 0.75 and \
+           utility.position_on_board(board, desired) and \
+           not utility.position_is_powerup(board, desired) and \
+           not utility.position_is_wall(board, desired):
+            desired_bomb_positions.append(desired)
+        else:
+            desired_bomb_positions.append(position)
+
+    agent_can_kick = [random.random() < 0.5 for _ in agent_positions]
+    return (board, agent_positions, desired_agent_positions, agent_can_kick,
+            agent_actions, bomb_positions, desired_bomb_positions)
+
+
+def run(num_scenes, board_size=constants.BOARD_SIZE, window=4, num_agents=4,
+        num_bombs=8, seed=0):
+    '''Compares both resolutions on dense scenes and times them'''
+    random.seed(seed)
+    scenes = [
+        make_scene(board_size, window, num_agents, num_bombs)
+        for _ in range(num_scenes)
+    ]
+
+    dict_time = grid_time = 0.0
+    num_kicks = num_moves = 0
+    for num, scene in enumerate(scenes):
+        (board, agent_positions, desired_agent_positions, agent_can_kick,
+         agent_actions, bomb_positions, desired_bomb_positions) = scene
+
+        agent_desired = list(desired_agent_positions)
+        bomb_desired = list(desired_bomb_positions)
+        start = time.time()
+        kicked_dicts = resolve_dicts(board, agent_positions, agent_desired,
+                                     agent_can_kick, agent_actions,
+                                     bomb_positions, bomb_desired)
+        dict_time += time.time() - start
+
+        agent_cells = collisions.flat_cells(agent_positions, board_size)
+        bomb_cells = collisions.flat_cells(bomb_positions, board_size)
+        agent_desired_cells = collisions.flat_cells(desired_agent_positions,
+                                                    board_size)
+        bomb_desired_cells = collisions.flat_cells(desired_bomb_positions,
+                                                   board_size)
+        start = time.time()
+        kicked = collisions.resolve_collisions(
+            board, agent_cells, agent_desired_cells, agent_can_kick,
+            agent_actions, bomb_cells, bomb_desired_cells)
+        grid_time += time.time() - start
+
+        assert kicked == kicked_dicts, "The kicks of scene %d differ." % num
+        assert agent_desired_cells == collisions.flat_cells(
+            agent_desired, board_size), \
+            "The agents of scene %d differ." % num
+        assert bomb_desired_cells == collisions.flat_cells(
+            bomb_desired, board_size), \
+            "The bombs of scene %d differ." % num
+        num_kicks += len(kicked)
+        num_moves += sum(cell != desired for cell, desired in zip(
+            agent_cells + bomb_cells, agent_desired_cells + bomb_desired_cells))
+
+    return {
+        'num_kicks': num_kicks,
+        'num_moves': num_moves,
+        'dicts_usec': 1e6 * dict_time / num_scenes,
+        'grid_usec': 1e6 * grid_time / num_scenes,
+    }
+
+
+def main():
+    '''CLI entry point for the collisions benchmark'''
+    parser = argparse.ArgumentParser(description='Collisions benchmark.')
+    parser.add_argument('--num_scenes', type=int, default=10000)
+    parser.add_argument('--board_size', type=int, default=constants.BOARD_SIZE)
+    parser.add_argument(
+        '--window',
+        type=int,
+        default=4,
+        help='Side of the square that all agents and bombs are put in.')
+    parser.add_argument('--num_agents', type=int, default=4)
+    parser.add_argument('--num_bombs', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    result = run(args.num_scenes, args.board_size, args.window,
+                 args.num_agents, args.num_bombs, args.seed)
+    for key, value in sorted(result.items()):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
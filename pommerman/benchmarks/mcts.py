@@ -0,0 +1,98 @@
+"""Benchmark the CompactMCTree against the MCTree of Nodes.
+
+Both trees search the same Evade and Attack states of games of SimpleAgents.
+First every search gets a time budget, and the nodes it made and the states
+it simulated are counted. Then every search runs a fixed number of turns
+under tracemalloc, for the peak memory of the search and the memory that the
+tree keeps per node once it is done. The analyses of the shared cache are
+dropped before and after every search, so they are not counted.
+
+python -m pommerman.benchmarks.mcts --num_states=50 --budget=0.08
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+from ..agents import analysis
+from ..helpers import mcts
+from .suite import make_search_states
+
+
+def _count(tree):
+    '''Returns the nodes that a tree made and the states it simulated'''
+    if isinstance(tree, mcts.CompactMCTree):
+        return tree.num_nodes, int(tree.visits[1:tree.num_nodes].sum())
+    table = tree.table
+    return len(table.nodes) + 1, table.hits + table.misses
+
+
+def run(num_states, budget, num_turns, seed=0):
+    '''Searches the states with both trees and returns their stats'''
+    random.seed(seed)
+    np.random.seed(seed)
+    states = make_search_states(num_states)
+    result = {}
+    for name, tree_type in [('mcts', mcts.MCTree),
+                            ('compact_mcts', mcts.CompactMCTree)]:
+        random.seed(seed)
+        nodes = simulated = 0
+        search_time = 0.0
+        for obs in states:
+            analysis.CACHE.clear()
+            start = time.monotonic()
+            tree = tree_type(obs, deadline=start + budget)
+            tree.bestAction()
+            search_time += time.monotonic() - start
+            num_nodes, num_simulated = _count(tree)
+            nodes += num_nodes
+            simulated += num_simulated
+
+        random.seed(seed)
+        peaks = []
+        kept = 0
+        kept_nodes = 0
+        for obs in states:
+            analysis.CACHE.clear()
+            tracemalloc.start()
+            tree = tree_type(obs, turn=num_turns)
+            tree.bestAction()
+            analysis.CACHE.clear()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peaks.append(peak)
+            kept += current
+            kept_nodes += _count(tree)[0]
+
+        result[name + '_nodes_per_sec'] = nodes / search_time
+        result[name + '_simulated_states_per_sec'] = simulated / search_time
+        result[name + '_peak_kib_per_search'] = np.mean(peaks) / 1024
+        result[name + '_kept_bytes_per_node'] = kept / kept_nodes
+    return result
+
+
+def main():
+    '''CLI entry point for the MCTS benchmark'''
+    parser = argparse.ArgumentParser(description='MCTS benchmark.')
+    parser.add_argument('--num_states', type=int, default=50)
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=0.08,
+        help='Seconds that every timed search may take.')
+    parser.add_argument(
+        '--num_turns',
+        type=int,
+        default=100,
+        help='Turns of every search under tracemalloc.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    result = run(args.num_states, args.budget, args.num_turns, args.seed)
+    for key, value in sorted(result.items()):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark Pomme.reset, i.e. making new boards and items, by board size.
+
+The numbers of rigid walls, wooden walls and items are scaled from those of
+the competition board by the area of the board. With --board_library, the
+resets draw from a board library made beforehand instead.
+
+python -m pommerman.benchmarks.reset --sizes=11,15,21,31
+python -m pommerman.benchmarks.reset --board_library
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .. import agents
+from .. import board_library
+from .. import configs
+from .. import constants
+
+
+def scaled(number, board_size):
+    '''Scales a number of the competition board to another size, rounded to
+    an even number'''
+    area = float(board_size * board_size) / (
+        constants.BOARD_SIZE * constants.BOARD_SIZE)
+    return 2 * int(round(number * area / 2))
+
+
+def make_env(board_size):
+    '''Makes an FFA env with a board of the given size'''
+    config = configs.ffa_competition_env()
+    kwargs = dict(config['env_kwargs'])
+    kwargs.update({
+        'board_size': board_size,
+        'num_rigid': scaled(constants.NUM_RIGID, board_size),
+        'num_wood': scaled(constants.NUM_WOOD, board_size),
+        'num_items': scaled(constants.NUM_ITEMS, board_size),
+    })
+    env = config['env'](**kwargs)
+    agent_list = [agents.SimpleAgent() for _ in range(4)]
+    for agent_id, agent in enumerate(agent_list):
+        agent.init_agent(agent_id, config['game_type'])
+    env.set_agents(agent_list)
+    env.set_init_game_state(None)
+    return env
+
+
+def run(sizes, num_resets, seed=0, use_library=False):
+    '''Times resets and returns resets per second by board size'''
+    random.seed(seed)
+    np.random.seed(seed)
+    result = {}
+    directory = tempfile.mkdtemp() if use_library else None
+    for board_size in sizes:
+        env = make_env(board_size)
+        if use_library:
+            board_library.generate(
+                directory, num_resets, board_size, env._num_rigid,
+                env._num_wood, env._num_items, seed)
+            env.set_board_library(
+                board_library.BoardLibrary(directory, board_size,
+                                           env._num_rigid, env._num_wood,
+                                           env._num_items), seed)
+        env.reset()
+        start = time.time()
+        for _ in range(num_resets):
+            env.reset()
+        result['resets_per_sec_%d' % board_size] = \
+            num_resets / (time.time() - start)
+    if directory:
+        shutil.rmtree(directory)
+    return result
+
+
+def main():
+    '''CLI entry point for the reset benchmark'''
+    parser = argparse.ArgumentParser(description='Reset benchmark.')
+    parser.add_argument(
+        '--sizes',
+        default='11,15,19,23,27,31',
+        help='Comma separated board sizes.')
+    parser.add_argument('--num_resets', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--board_library',
+        default=False,
+        action='store_true',
+        help='Draw the boards from a board library made beforehand.')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    result = run(sizes, args.num_resets, args.seed, args.board_library)
+    for key, value in sorted(result.items(), key=lambda item: len(item[0])):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
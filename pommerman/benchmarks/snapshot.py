@@ -0,0 +1,81 @@
+"""Benchmark Pomme.snapshot/restore against the JSON round trip.
+
+Plays a game with random actions and, at every step, times taking and
+restoring a snapshot against get_json_info followed by set_json_info. Pass
+--check to also verify that restoring reproduces the game exactly.
+
+python -m pommerman.benchmarks.snapshot --config=PommeTeamCompetition-v1
+"""
+import argparse
+import time
+
+import numpy as np
+
+from .. import agents
+from .. import make
+
+
+def run(config, num_steps, check=False, seed=0):
+    '''Times both ways of saving and loading the state of a running game'''
+    np.random.seed(seed)
+    env = make(config, [agents.RandomAgent() for _ in range(4)])
+    env.seed(seed)
+    env.reset()
+
+    snapshot_time = json_time = 0.0
+    num_samples = 0
+    for _ in range(num_steps):
+        actions = [env.action_space.sample() for _ in range(4)]
+        info = env.get_json_info() if check else None
+
+        start = time.time()
+        snapshot = env.snapshot()
+        env.restore(snapshot)
+        snapshot_time += time.time() - start
+
+        start = time.time()
+        env._init_game_state = env.get_json_info()
+        env.set_json_info()
+        env._init_game_state = None
+        json_time += time.time() - start
+        num_samples += 1
+
+        if check:
+            snapshot = env.snapshot()
+            _, _, done, _ = env.step(actions)
+            stepped = env.get_json_info()
+            env.restore(snapshot)
+            assert env.get_json_info() == info, "Restore changed the game."
+            env.step(actions)
+            assert env.get_json_info() == stepped, \
+                "Stepping from a snapshot diverged."
+        else:
+            _, _, done, _ = env.step(actions)
+        if done:
+            break
+
+    return {
+        'snapshot_restore_usec': 1e6 * snapshot_time / num_samples,
+        'json_round_trip_usec': 1e6 * json_time / num_samples,
+    }
+
+
+def main():
+    '''CLI entry point for the snapshot benchmark'''
+    parser = argparse.ArgumentParser(description='Snapshot benchmark.')
+    parser.add_argument('--config', default='PommeFFACompetition-v0')
+    parser.add_argument('--num_steps', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--check',
+        default=False,
+        action='store_true',
+        help='Verify that restoring reproduces the game.')
+    args = parser.parse_args()
+    result = run(args.config, args.num_steps, args.check, args.seed)
+    for key, value in sorted(result.items()):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""Times the hot paths of the game engine and compares them to a baseline.
+
+Every benchmark is timed over a number of calls, a few rounds in a row, and
+the median time per call of the rounds is reported. The results are written
+as JSON and compared to the committed baseline.json. A benchmark that got
+slower than the baseline by more than the threshold is a regression and makes
+the run exit with status 1.
+
+python -m pommerman.benchmarks.suite --output=results.json
+python -m pommerman.benchmarks.suite --only=step_sparse,reset --threshold=0.5
+python -m pommerman.benchmarks.suite --update_baseline
+"""
+import argparse
+from collections import OrderedDict
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from .. import agents
+from .. import blast
+from .. import constants
+from .. import make
+from ..agents import analysis
+from ..forward_model import ForwardModel
+from ..helpers import mcts
+from ..helpers.reward import Reward
+from .batched import make_games
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+MOVES = [
+    constants.Action.Stop.value, constants.Action.Up.value,
+    constants.Action.Down.value, constants.Action.Left.value,
+    constants.Action.Right.value
+]
+
+
+def time_calls(make_calls, num_rounds):
+    """Returns the median time per call in usec.
+
+    Args:
+      make_calls: Makes the list of zero argument callables of one round.
+        Anything it does is not timed.
+      num_rounds: How many rounds to time.
+    """
+    times = []
+    for _ in range(num_rounds):
+        calls = make_calls()
+        start = time.time()
+        for call in calls:
+            call()
+        times.append((time.time() - start) / len(calls))
+    return 1e6 * float(np.median(times))
+
+
+def make_states(num_states, bomb_rate, ammo=1, blast_strength=2,
+                can_kick=False, num_warmup_steps=20):
+    '''Plays fresh games with random actions for a while and returns them'''
+    games = make_games(num_states)
+    for game in games:
+        for agent in game[1]:
+            agent.reset(ammo, True, blast_strength, can_kick)
+    for _ in range(num_warmup_steps):
+        for num, game in enumerate(games):
+            games[num] = ForwardModel.step(
+                random_actions(bomb_rate), *game)
+    return games
+
+
+def random_actions(bomb_rate):
+    '''Random actions that lay a bomb with probability bomb_rate'''
+    return [
+        constants.Action.Bomb.value
+        if random.random() < bomb_rate else random.choice(MOVES)
+        for _ in range(4)
+    ]
+
+
+def step_benchmark(bomb_rate, **kwargs):
+    '''Makes a benchmark of ForwardModel.step on states of played games'''
+
+    def benchmark(num_calls):
+        states = make_states(num_calls, bomb_rate, **kwargs)
+        actions = [random_actions(bomb_rate) for _ in states]
+
+        def make_calls():
+            return [
+                lambda state=copy.deepcopy(state), action=action:
+                ForwardModel.step(action, *state)
+                for state, action in zip(states, actions)
+            ]
+
+        return make_calls
+
+    return benchmark
+
+
+def play_env(config, num_steps, agent_types=None):
+    '''Makes an env and plays it with SimpleAgents for num_steps'''
+    agent_types = agent_types or [agents.SimpleAgent] * 4
+    env = make(config, [agent_type() for agent_type in agent_types])
+    env.seed(0)
+    obs = env.reset()
+    observations = []
+    for _ in range(num_steps):
+        # Full observations share the board of the env, so keep copies.
+        observations.append(copy.deepcopy(obs))
+        obs, _, done, _ = env.step(env.act(obs))
+        if done:
+            obs = env.reset()
+    return env, observations
+
+
+def make_search_states(num_states, config='PommeFFACompetition-v0'):
+    '''Returns observations of games of SimpleAgents that the trees search'''
+    states = []
+    while len(states) < num_states:
+        _, observations = play_env(config, 200)
+        for obs in observations:
+            for agent_obs in obs:
+                # The dead stay in the observations.
+                position = tuple(agent_obs['position'])
+                if agent_obs['board'][position] not in agent_obs['alive']:
+                    continue
+                if Reward().decideMode(agent_obs, None) in (
+                        constants.Mode.Evade, constants.Mode.Attack):
+                    states.append(agent_obs)
+    random.shuffle(states)
+    return states[:num_states]
+
+
+def repeat(call):
+    '''Makes a benchmark that calls call num_calls times'''
+
+    def benchmark(num_calls):
+        return lambda: [call] * num_calls
+
+    return benchmark
+
+
+def observations_benchmark(config):
+    '''Makes a benchmark of Pomme.get_observations in the middle of a game'''
+
+    def benchmark(num_calls):
+        env, _ = play_env(config, 50)
+        return repeat(env.get_observations)(num_calls)
+
+    return benchmark
+
+
+def env_step_benchmark(config):
+    """Makes a benchmark of Pomme.step from the start of a game.
+
+    Nothing reads the observations, as for seats that a learner ignores.
+    """
+
+    def benchmark(num_calls):
+        env, _ = play_env(config, 0)
+        actions = [random_actions(0.1) for _ in range(num_calls)]
+
+        def make_calls():
+            env.seed(0)
+            env.reset()
+            return [lambda action=action: env.step(action)
+                    for action in actions]
+
+        return make_calls
+
+    return benchmark
+
+
+def reset_benchmark(num_calls):
+    '''Benchmark of Pomme.reset, which makes a new board'''
+    env, _ = play_env('PommeFFACompetition-v0', 0)
+    return repeat(env.reset)(num_calls)
+
+
+def featurize_benchmark(num_calls):
+    '''Benchmark of Pomme.featurize on the observations of a game'''
+    env, observations = play_env('PommeFFACompetition-v0', num_calls)
+    return lambda: [lambda obs=obs[0]: env.featurize(obs)
+                    for obs in observations]
+
+
+def featurize_planar_benchmark(num_calls):
+    '''Benchmark of a PlanarFeaturizer writing into one buffer'''
+    env, observations = play_env('PommeFFACompetition-v0', num_calls)
+    featurizer = env.make_featurizer()
+    out = featurizer.make_buffer()
+    return lambda: [lambda obs=obs[0]: featurizer.featurize(obs, out)
+                    for obs in observations]
+
+
+def search_benchmark(tree_type, num_turns=20):
+    '''Makes a benchmark of searches of num_turns of an MCTS tree'''
+
+    def benchmark(num_calls):
+        states = make_search_states(num_calls)
+
+        def search(obs):
+            analysis.CACHE.clear()
+            return tree_type(obs, turn=num_turns).bestAction()
+
+        return lambda: [lambda obs=obs: search(obs) for obs in states]
+
+    return benchmark
+
+
+def danger_map_benchmark(num_calls):
+    '''Benchmark of blast.danger_map on the boards of a game with bombs'''
+    _, observations = play_env('PommeFFACompetition-v0', 4 * num_calls)
+    observations = [
+        obs[0] for obs in observations if obs[0]['bomb_blast_strength'].any()
+    ][:num_calls]
+    return lambda: [
+        lambda obs=obs: blast.danger_map(obs['board'], obs['bomb_life'],
+                                         obs['bomb_blast_strength'])
+        for obs in observations
+    ]
+
+
+def act_benchmark(agent_type, config='PommeFFACompetition-v0'):
+    '''Makes a benchmark of the act of an agent on the first seat'''
+
+    def benchmark(num_calls):
+        env, observations = play_env(
+            config, num_calls,
+            [agent_type] + [agents.SimpleAgent] * 3)
+        agent = env._agents[0]
+        # Agents only act while they are alive.
+        observations = [
+            obs[0] for obs in observations
+            if constants.Item.Agent0.value in obs[0]['alive']
+        ]
+
+        def act(obs):
+            # Time the agent on its own, without the analyses of the others.
+            analysis.CACHE.clear()
+            return agent.act(obs, env.action_space)
+
+        return lambda: [lambda obs=obs: act(obs) for obs in observations]
+
+    return benchmark
+
+
+def env_act_benchmark(agent_types, config):
+    '''Makes a benchmark of the act of all the agents of an env for a step'''
+
+    def benchmark(num_calls):
+        env, observations = play_env(config, num_calls, agent_types)
+
+        def act(obs):
+            analysis.CACHE.clear()
+            return env.act(obs)
+
+        return lambda: [lambda obs=obs: act(obs) for obs in observations]
+
+    return benchmark
+
+
+def json_benchmark(num_calls):
+    '''Benchmark of Pomme.get_json_info in the middle of a game'''
+    env, _ = play_env('PommeFFACompetition-v0', 50)
+    return repeat(env.get_json_info)(num_calls)
+
+
+# The benchmarks by name, with how many calls make one round.
+BENCHMARKS = OrderedDict([
+    ('step_sparse', (step_benchmark(0.0), 500)),
+    # Bombs laid from the first step on start to explode after 9 steps.
+    ('step_bomb_heavy',
+     (step_benchmark(0.5, ammo=5, blast_strength=4, num_warmup_steps=9),
+      500)),
+    ('step_kick_heavy',
+     (step_benchmark(0.3, ammo=3, can_kick=True, num_warmup_steps=9), 500)),
+    ('get_observations_full',
+     (observations_benchmark('PommeFFACompetition-v0'), 500)),
+    ('get_observations_partial',
+     (observations_benchmark('PommeTeamCompetition-v0'), 500)),
+    ('env_step_full', (env_step_benchmark('PommeFFACompetition-v0'), 100)),
+    ('env_step_partial',
+     (env_step_benchmark('PommeTeamCompetition-v0'), 100)),
+    ('reset', (reset_benchmark, 100)),
+    ('featurize', (featurize_benchmark, 500)),
+    ('featurize_planar', (featurize_planar_benchmark, 500)),
+    ('danger_map', (danger_map_benchmark, 500)),
+    ('simple_agent_act', (act_benchmark(agents.SimpleAgent), 200)),
+    ('heuristic_agent_act', (act_benchmark(agents.HeuristicAgent), 50)),
+    ('mcts_search', (search_benchmark(mcts.MCTree), 20)),
+    ('compact_mcts_search', (search_benchmark(mcts.CompactMCTree), 20)),
+    ('simple_team_agent_act',
+     (act_benchmark(agents.SimpleTeamAgent, 'PommeTeamCompetition-v0'), 200)),
+    ('simple_team_agent2_act',
+     (act_benchmark(agents.SimpleTeamAgent2, 'PommeTeamCompetition-v0'),
+      200)),
+    ('simple_agents_env_act',
+     (env_act_benchmark([agents.SimpleAgent] * 4, 'PommeFFACompetition-v0'),
+      200)),
+    ('simple_team_agents_env_act',
+     (env_act_benchmark([agents.SimpleTeamAgent, agents.SimpleTeamAgent2] * 2,
+                        'PommeTeamCompetition-v0'), 200)),
+    ('get_json_info', (json_benchmark, 200)),
+])
+
+
+def run(names=None, num_rounds=5, scale=1.0, seed=0):
+    '''Runs the benchmarks and returns their usec per call by name'''
+    result = OrderedDict()
+    for name, (benchmark, num_calls) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        random.seed(seed)
+        np.random.seed(seed)
+        make_calls = benchmark(max(int(num_calls * scale), 1))
+        result[name] = time_calls(make_calls, num_rounds)
+    return result
+
+
+def compare(result, baseline, threshold):
+    """Compares a result to a baseline.
+
+    Returns:
+      A list of (name, usec, baseline usec) for every benchmark that got
+      slower than the baseline by more than threshold, e.g. 0.2 for 20%.
+    """
+    regressions = []
+    for name, usec in result.items():
+        if name in baseline and usec > baseline[name] * (1 + threshold):
+            regressions.append((name, usec, baseline[name]))
+    return regressions
+
+
+def main():
+    '''CLI entry point for the benchmark suite'''
+    parser = argparse.ArgumentParser(description='Engine benchmark suite.')
+    parser.add_argument(
+        '--only',
+        default=None,
+        help='Comma separated benchmarks to run. One of: %s.' %
+        ', '.join(BENCHMARKS))
+    parser.add_argument('--num_rounds', type=int, default=5)
+    parser.add_argument(
+        '--scale',
+        type=float,
+        default=1.0,
+        help='Scales the number of calls of every round.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', default=None, help='Where to write the results as JSON.')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.2,
+        help='How much slower than the baseline is a regression.')
+    parser.add_argument(
+        '--update_baseline',
+        default=False,
+        action='store_true',
+        help='Write the results to the baseline instead of comparing.')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else None
+    unknown = [name for name in names or [] if name not in BENCHMARKS]
+    if unknown:
+        parser.error('unknown benchmarks: %s' % ', '.join(unknown))
+    result = run(names, args.num_rounds, args.scale, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(result)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write('\n')
+        baseline = {}
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        baseline = {}
+
+    for name, usec in result.items():
+        if name in baseline:
+            print("%s_usec: %.1f (%.2fx baseline)" %
+                  (name, usec, usec / baseline[name]))
+        else:
+            print("%s_usec: %.1f" % (name, usec))
+
+    regressions = compare(result, baseline, args.threshold)
+    for name, usec, baseline_usec in regressions:
+        print("Regression in %s: %.1f usec against %.1f usec." %
+              (name, usec, baseline_usec))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
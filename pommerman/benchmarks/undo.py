@@ -0,0 +1,102 @@
+"""Benchmark ForwardModel.apply/undo against copying the state and stepping.
+
+Every game is first played for a few random steps so that it has bombs and
+flames. Then both ways of trying an action and going back are timed on it.
+Pass --check to also verify that undo gives back the exact state and that
+the incrementally kept Zobrist hash and bomb maps match rebuilt ones.
+
+python -m pommerman.benchmarks.undo --num_games=100 --num_tries=100
+"""
+import argparse
+import copy
+import random
+import time
+
+import numpy as np
+
+from .. import constants
+from ..forward_model import ForwardModel
+from ..zobrist import get_zobrist
+from .batched import make_games, same_game
+
+
+def same_bomb_maps(model):
+    '''Checks the kept bomb maps of a model against rebuilt ones'''
+    board, _, bombs, _, _ = model.get_state()
+    rebuilt = ForwardModel.make_bomb_maps(len(board), bombs)
+    return all((kept == new).all()
+               for kept, new in zip(model.get_bomb_maps(), rebuilt))
+
+
+def run(num_games, num_tries, num_warmup_steps=30, check=False, seed=0):
+    '''Times both ways of trying actions and returns tries per second'''
+    random.seed(seed)
+    np.random.seed(seed)
+    games = make_games(num_games)
+    for _ in range(num_warmup_steps):
+        for num, game in enumerate(games):
+            actions = np.random.randint(len(constants.Action), size=4)
+            games[num] = ForwardModel.step(actions.tolist(), *game)
+    actions = np.random.randint(
+        len(constants.Action), size=(num_games, num_tries, 4)).tolist()
+
+    start = time.time()
+    for num, game in enumerate(games):
+        for tried in actions[num]:
+            ForwardModel.step(tried, *copy.deepcopy(game))
+    copy_time = time.time() - start
+
+    model = ForwardModel()
+    undo_time = 0.0
+    for num, game in enumerate(games):
+        model.set_state(*copy.deepcopy(game))
+        start = time.time()
+        for tried in actions[num]:
+            model.undo(model.apply(tried))
+        undo_time += time.time() - start
+
+        if check:
+            for tried in actions[num]:
+                stepped = ForwardModel.step(tried, *copy.deepcopy(game))
+                record = model.apply(tried)
+                assert same_game(stepped, model.get_state()), \
+                    "Apply differs from step in game %d." % num
+                assert model.get_hash() == get_zobrist().hash_state(
+                    *stepped[:3] + stepped[4:]), \
+                    "Incremental hash differs in game %d." % num
+                assert same_bomb_maps(model), \
+                    "Apply broke the bomb maps of game %d." % num
+                model.undo(record)
+                assert same_game(game, model.get_state()), \
+                    "Undo did not restore game %d." % num
+                assert same_bomb_maps(model), \
+                    "Undo broke the bomb maps of game %d." % num
+
+    total = float(num_games * num_tries)
+    return {
+        'copy_step_tries_per_sec': total / copy_time,
+        'apply_undo_tries_per_sec': total / undo_time,
+    }
+
+
+def main():
+    '''CLI entry point for the apply/undo benchmark'''
+    parser = argparse.ArgumentParser(description='Apply/undo benchmark.')
+    parser.add_argument('--num_games', type=int, default=100)
+    parser.add_argument('--num_tries', type=int, default=100)
+    parser.add_argument('--num_warmup_steps', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--check',
+        default=False,
+        action='store_true',
+        help='Verify that undo restores every game.')
+    args = parser.parse_args()
+    result = run(args.num_games, args.num_tries, args.num_warmup_steps,
+                 args.check, args.seed)
+    for key, value in sorted(result.items()):
+        print("%s: %.1f" % (key, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+'''Blast rays of bombs and the chaining of their explosions.
+
+The flames of a bomb go blast_strength - 1 cells up, down, left and right of
+it. Each ray stops before a rigid wall or the edge of the board and at the
+first wooden wall. The cells of every ray up to the edge of the board are
+precomputed per board size, so only the walls are left to check when a bomb
+explodes.
+
+The rays are not precomputed per layout of walls. Searches and batches of
+games interleave many boards, and rebuilding the rays for each of them costs
+more than checking the walls along the way.
+
+danger_map looks ahead instead: it finds when the flames of the bombs on a
+board will first reach every cell, chaining the bombs that they set off.
+'''
+from collections import defaultdict
+
+import numpy as np
+
+from . import constants
+
+_RAYS = {}
+_RAY_TABLES = {}
+_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def get_rays(board_size):
+    """Returns the blast rays of every cell of a board.
+
+    Returns:
+      A list indexed by flat cell, i.e. row * board_size + col. Each entry
+      holds the rays up, down, left and right of the cell as lists of the flat
+      cells they pass, in order and up to the edge of the board.
+    """
+    if board_size not in _RAYS:
+        rays = []
+        for row in range(board_size):
+            for col in range(board_size):
+                cell_rays = []
+                for d_row, d_col in _DIRECTIONS:
+                    ray = []
+                    r, c = row + d_row, col + d_col
+                    while 0 <= r < board_size and 0 <= c < board_size:
+                        ray.append(r * board_size + c)
+                        r, c = r + d_row, c + d_col
+                    cell_rays.append(ray)
+                rays.append(cell_rays)
+        _RAYS[board_size] = rays
+    return _RAYS[board_size]
+
+
+def get_ray_table(board_size):
+    """Returns the blast rays of every cell of a board as an array.
+
+    Returns:
+      An int array of shape [board_size * board_size, 4, board_size - 1] of
+      the rays of get_rays, padded with board_size * board_size, i.e. the
+      cell after the last one of the flat board.
+    """
+    if board_size not in _RAY_TABLES:
+        num_cells = board_size * board_size
+        table = np.full((num_cells, 4, board_size - 1), num_cells,
+                        dtype=np.intp)
+        for cell, cell_rays in enumerate(get_rays(board_size)):
+            for direction, ray in enumerate(cell_rays):
+                table[cell, direction, :len(ray)] = ray
+        _RAY_TABLES[board_size] = table
+    return _RAY_TABLES[board_size]
+
+
+def danger_map(board, bomb_life, bomb_blast_strength):
+    """Returns in how many steps flames first reach every cell of a board.
+
+    Cells that are on flames already are 0. A bomb with life t explodes t
+    steps from now, or as soon as the flames of another bomb reach it, and
+    one that lies on flames explodes on the next step. The flames are
+    blocked by the walls of the board as it is now. Wood that an earlier
+    explosion burns away still stops the flames of later bombs.
+
+    Args:
+      board: The board.
+      bomb_life: The life of the bombs by cell, as in the observations.
+      bomb_blast_strength: The blast strength of the bombs by cell.
+
+    Returns:
+      A float array like board of the number of steps, np.inf for the cells
+      that no flames reach.
+    """
+    board = np.asarray(board)
+    size = len(board)
+    num_cells = size * size
+    # The padding of the rays is a rigid wall past the end of the board.
+    values = np.append(board.ravel(), constants.Item.Rigid.value)
+    on_flames = values == constants.Item.Flames.value
+    strengths = np.asarray(bomb_blast_strength).ravel()
+    bomb_cells = np.flatnonzero(strengths > 0)
+    if not len(bomb_cells):
+        return np.where(on_flames[:num_cells], 0.,
+                        np.inf).reshape(board.shape)
+
+    rays = get_ray_table(size)[bomb_cells]
+    ray_values = values[rays]
+    rigid = ray_values == constants.Item.Rigid.value
+    walls = rigid | (ray_values == constants.Item.Wood.value)
+    # A ray reaches every cell up to its first wall, and that wall if it is
+    # wood, as far as blast_strength - 1 cells.
+    reach = strengths[bomb_cells].astype(np.intp) - 1
+    hit = (np.cumsum(walls, axis=2) - walls == 0) & ~rigid & \
+          (np.arange(size - 1) < reach[:, None, None])
+    blasts = np.zeros((len(bomb_cells), num_cells), dtype=bool)
+    blasts[np.nonzero(hit)[0], rays[hit]] = True
+    blasts[np.arange(len(bomb_cells)), bomb_cells] = True
+
+    times = np.asarray(bomb_life, dtype=float).ravel()[bomb_cells]
+    times[on_flames[bomb_cells]] = 1
+    # A bomb explodes no later than any bomb whose flames reach it. Every
+    # pass settles at least one more link of the chains.
+    if len(bomb_cells) > 1:
+        chains = blasts[:, bomb_cells]
+        while True:
+            chained = np.where(chains, times[:, None], np.inf).min(axis=0)
+            if not (chained < times).any():
+                break
+            times = np.minimum(times, chained)
+
+    danger = np.where(blasts, times[:, None], np.inf).min(axis=0)
+    danger[on_flames[:num_cells]] = 0
+    return danger.reshape(board.shape)
+
+
+def chain_explosions(board, bombs):
+    """Explodes the bombs with no life left and every bomb they chain to.
+
+    This does a single breadth first pass over the bombs instead of redoing
+    all of the explosions for every wave of the chain. Every bomb that is hit
+    by the flames of an exploding bomb is fired.
+
+    Args:
+      board: The board. Bombs must sit on cells that flames pass through.
+      bombs: The bombs. Those whose life is 0 explode.
+
+    Returns:
+      An array like board that is 1 on the cells hit by flames.
+    """
+    size = len(board)
+    queue = []
+    unexploded = defaultdict(list)
+    for bomb in bombs:
+        row, col = bomb.position
+        if bomb.exploded():
+            queue.append(bomb)
+        else:
+            unexploded[row * size + col].append(bomb)
+
+    exploded_map = np.zeros(size * size, dtype=board.dtype)
+    if not queue:
+        return exploded_map.reshape(board.shape)
+
+    rays = get_rays(size)
+    values = board.ravel().tolist()
+    rigid = constants.Item.Rigid.value
+    wood = constants.Item.Wood.value
+    hit = set()
+    while queue:
+        bomb = queue.pop()
+        reach = bomb.blast_strength - 1
+        if reach < 0:
+            continue
+        row, col = bomb.position
+        cells = [row * size + col]
+        for ray in rays[cells[0]]:
+            for cell in ray[:reach]:
+                value = values[cell]
+                if value == rigid:
+                    break
+                cells.append(cell)
+                if value == wood:
+                    break
+        for cell in cells:
+            if cell in hit:
+                continue
+            hit.add(cell)
+            for chained in unexploded.pop(cell, ()):
+                chained.fire()
+                queue.append(chained)
+
+    exploded_map[list(hit)] = 1
+    return exploded_map.reshape(board.shape)
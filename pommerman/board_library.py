@@ -0,0 +1,105 @@
+'''A library of pre-generated boards and items for instant resets.
+
+The boards of one config, i.e. board_size, num_rigid, num_wood and num_items,
+are stored in a single .npy file of shape [num_boards, 2, board_size,
+board_size]. The first plane of a board holds the board itself and the second
+one the values of the items hidden under its wooden walls, with 0 for none.
+
+The file is memory-mapped, so opening it is free, drawing a board only reads
+its pages and all processes that use the same library share the page cache.
+
+python -m pommerman.cli.make_board_library --directory=boards \
+    --config=PommeFFACompetition-v0 --num_boards=1000000
+'''
+import os
+
+import numpy as np
+
+from . import constants
+from . import utility
+
+
+def library_path(directory, board_size, num_rigid, num_wood, num_items):
+    '''Returns the path of the library of a config in a directory'''
+    return os.path.join(directory, 'boards_%d_%d_%d_%d.npy' %
+                        (board_size, num_rigid, num_wood, num_items))
+
+
+def generate(directory, num_boards, board_size=constants.BOARD_SIZE,
+             num_rigid=constants.NUM_RIGID, num_wood=constants.NUM_WOOD,
+             num_items=constants.NUM_ITEMS, seed=0, chunk_size=10000):
+    """Generates the library of a config.
+
+    The boards are written to the memory-mapped file a chunk at a time, so
+    this runs in constant memory. The same seed always gives the same library.
+
+    Returns:
+      The path of the library.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    path = library_path(directory, board_size, num_rigid, num_wood, num_items)
+    data = np.lib.format.open_memmap(
+        path,
+        mode='w+',
+        dtype=np.uint8,
+        shape=(num_boards, 2, board_size, board_size))
+    random_state = np.random.RandomState(seed)
+    chunk = np.zeros((chunk_size, 2, board_size, board_size), dtype=np.uint8)
+    for start in range(0, num_boards, chunk_size):
+        size = min(chunk_size, num_boards - start)
+        chunk[:size] = 0
+        for num in range(size):
+            board = utility.make_board(board_size, num_rigid, num_wood,
+                                       random_state)
+            items = utility.make_items(board, num_items, random_state)
+            chunk[num, 0] = board
+            for position, value in items.items():
+                chunk[num, 1][position] = value
+        data[start:start + size] = chunk[:size]
+    data.flush()
+    del data
+    return path
+
+
+class BoardLibrary(object):
+    """The pre-generated boards and items of one config."""
+
+    def __init__(self, directory, board_size=constants.BOARD_SIZE,
+                 num_rigid=constants.NUM_RIGID, num_wood=constants.NUM_WOOD,
+                 num_items=constants.NUM_ITEMS):
+        self.board_size = board_size
+        self.num_rigid = num_rigid
+        self.num_wood = num_wood
+        self.num_items = num_items
+        self.path = library_path(directory, board_size, num_rigid, num_wood,
+                                 num_items)
+        self._data = np.load(self.path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self._data)
+
+    def matches(self, board_size, num_rigid, num_wood, num_items):
+        '''Checks if this library holds boards of the given config'''
+        return (self.board_size, self.num_rigid, self.num_wood,
+                self.num_items) == (board_size, num_rigid, num_wood,
+                                    num_items)
+
+    def index_of_seed(self, seed):
+        '''Returns the index of the board of a seed. Always the same for a
+        seed and library size, so evaluations can refer to games by seed.'''
+        return np.random.RandomState(seed).randint(len(self._data))
+
+    def get(self, index):
+        """Returns a copy of the board and the items at an index.
+
+        Returns:
+          board: The board, as made by utility.make_board.
+          items: A dict of the item values by position, as made by
+            utility.make_items.
+        """
+        board, item_values = self._data[index]
+        rows, cols = np.nonzero(item_values)
+        items = {(int(row), int(col)): int(item_values[row, col])
+                 for row, col in zip(rows, cols)}
+        return np.array(board), items
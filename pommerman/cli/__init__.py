@@ -1,2 +1,5 @@
 '''CLI module entry point'''
+from . import export_dataset
+from . import make_board_library
+from . import replay_to_json
 from . import run_battle
@@ -0,0 +1,58 @@
+"""Export the games of replays to a dataset of featurized transitions.
+
+The games are re-simulated in a pool of processes and written to memory-mapped
+shards with a manifest. Running it again with the same arguments resumes an
+export that was stopped, skipping the shards that are already there.
+
+An example:
+python export_dataset.py --replays=replays --directory=dataset --games_per_shard=100
+"""
+import argparse
+
+from .. import dataset
+from .. import featurizer
+
+
+def main():
+    '''CLI entry point to export replays to a dataset'''
+    parser = argparse.ArgumentParser(
+        description='Export replays to a dataset.')
+    parser.add_argument(
+        '--replays',
+        nargs='+',
+        help='Replay files, or directories to search for *.pomr files.')
+    parser.add_argument(
+        '--directory',
+        default='dataset',
+        help='Directory to write the dataset to.')
+    parser.add_argument('--games_per_shard', type=int, default=100)
+    parser.add_argument(
+        '--channels',
+        default=','.join(featurizer.DEFAULT_CHANNELS),
+        help='Comma separated channels of the observations.')
+    parser.add_argument(
+        '--dtype',
+        default='uint8',
+        help='The dtype of the observations.')
+    parser.add_argument(
+        '--num_workers',
+        type=int,
+        default=None,
+        help='How many processes to export with. Defaults to one per cpu. '
+        '0 exports in this process.')
+    args = parser.parse_args()
+
+    manifest = dataset.export(
+        args.replays,
+        args.directory,
+        games_per_shard=args.games_per_shard,
+        channels=args.channels.split(','),
+        dtype=args.dtype,
+        num_workers=args.num_workers)
+    print("Wrote %d games, %d steps in %d shards to %s." %
+          (manifest['num_games'], manifest['num_steps'],
+           len(manifest['shards']), args.directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Pre-generate the boards and items of a config into a board library.
+
+Envs of the config can then draw their boards from the library on reset with
+env.set_board_library(board_library.BoardLibrary(directory, ...)).
+
+An example with a million competition boards:
+python make_board_library.py --config=PommeFFACompetition-v0 --num_boards=1000000 --directory=boards
+"""
+import time
+
+import argparse
+import gym
+
+from .. import board_library
+from .. import REGISTRY
+
+
+def main():
+    '''CLI entry point to make a board library'''
+    parser = argparse.ArgumentParser(description='Make a board library.')
+    parser.add_argument(
+        '--config',
+        default='PommeFFACompetition-v0',
+        help='Configuration whose boards to make. Possible values: {}. The '
+        'library holds the boards of its board_size, num_rigid, num_wood and '
+        'num_items.'.format(REGISTRY))
+    parser.add_argument('--num_boards', type=int, default=100000)
+    parser.add_argument(
+        '--directory',
+        default='boards',
+        help='Directory to write the library to.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    assert args.config in REGISTRY, "Unknown configuration '{}'. " \
+        "Possible values: {}".format(args.config, REGISTRY)
+    kwargs = gym.spec(args.config)._kwargs
+    start = time.time()
+    path = board_library.generate(
+        args.directory,
+        args.num_boards,
+        board_size=kwargs['board_size'],
+        num_rigid=kwargs['num_rigid'],
+        num_wood=kwargs['num_wood'],
+        num_items=kwargs['num_items'],
+        seed=args.seed)
+    print("Wrote %d boards to %s in %.1f sec." %
+          (args.num_boards, path, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
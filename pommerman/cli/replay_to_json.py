@@ -0,0 +1,53 @@
+"""Convert a binary replay to the game_state.json of --record_json_dir.
+
+Every game of the replay is written to a directory of its own, numbered
+from 1, as run_battle does for --record_json_dir.
+
+An example:
+python replay_to_json.py --replay=replays/1.pomr --output_dir=json
+"""
+import json
+import os
+
+import argparse
+
+from .. import replay
+
+
+def convert(replay_path, output_dir):
+    '''Converts every finished game of a replay. Returns their paths'''
+    paths = []
+    for num, (header, frames, end) in enumerate(
+            replay.iter_games(replay_path)):
+        if end is None:
+            print("Skipping game %d, which did not finish." % (num + 1))
+            continue
+        game_dir = os.path.join(output_dir, '%d' % (num + 1))
+        if not os.path.isdir(game_dir):
+            os.makedirs(game_dir)
+        path = os.path.join(game_dir, 'game_state.json')
+        with open(path, 'w') as f:
+            f.write(json.dumps(replay.to_game_state_json(header, frames, end),
+                               sort_keys=True, indent=4))
+        paths.append(path)
+    return paths
+
+
+def main():
+    '''CLI entry point to convert a replay to JSON'''
+    parser = argparse.ArgumentParser(description='Convert a replay to JSON.')
+    parser.add_argument('--replay', help='The replay file.')
+    parser.add_argument(
+        '--output_dir',
+        default=None,
+        help='Directory to write the JSON to. Defaults to the directory of '
+        'the replay.')
+    args = parser.parse_args()
+    output_dir = args.output_dir or os.path.dirname(
+        os.path.abspath(args.replay))
+    for path in convert(args.replay, output_dir):
+        print("Wrote %s." % path)
+
+
+if __name__ == "__main__":
+    main()
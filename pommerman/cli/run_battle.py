@@ -14,6 +14,7 @@ python run_battle.py --agents=player::arrows,docker::pommerman/test-agent,random
 """
 import atexit
 from datetime import datetime
+import json
 import os
 import random
 import sys
@@ -22,9 +23,10 @@ import time
 import argparse
 import numpy as np
 
+from .. import dispatch
 from .. import helpers
 from .. import make
-from pommerman import utility
+from .. import replay
 
 
 def run(args, num_times=1, seed=None):
@@ -43,6 +45,23 @@ def run(args, num_times=1, seed=None):
     ]
 
     env = make(config, agents, game_state_file, render_mode=render_mode)
+    agent_strings = args.agents.split(',')
+
+    dispatcher = None
+    act_deadline = getattr(args, 'act_deadline', None)
+    if getattr(args, 'concurrent_act', False) or act_deadline is not None:
+        dispatcher = dispatch.ActDispatcher(deadline=act_deadline)
+        env.set_act_dispatcher(dispatcher)
+
+    replay_recorder = None
+    record_replay_dir = getattr(args, 'record_replay_dir', None)
+    if record_replay_dir:
+        if not os.path.isdir(record_replay_dir):
+            os.makedirs(record_replay_dir)
+        # All games go to one replay, after those of earlier runs.
+        replay_recorder = replay.ReplayRecorder(
+            os.path.join(record_replay_dir, 'replay.pomr'), env, config,
+            agent_strings, mode='ab')
 
     def _run(record_pngs_dir=None, record_json_dir=None):
         '''Runs a game'''
@@ -52,6 +71,15 @@ def run(args, num_times=1, seed=None):
         if record_json_dir and not os.path.isdir(record_json_dir):
             os.makedirs(record_json_dir)
 
+        # The JSON is recorded as a replay and converted once the game is
+        # done, instead of writing and merging a file per step.
+        recorders = [replay_recorder] if replay_recorder else []
+        if record_json_dir:
+            json_replay = os.path.join(record_json_dir, 'replay.pomr')
+            json_recorder = replay.ReplayRecorder(json_replay, env, config,
+                                                  agent_strings)
+            recorders.append(json_recorder)
+
         obs = env.reset()
         done = False
 
@@ -59,33 +87,36 @@ def run(args, num_times=1, seed=None):
             if args.render:
                 env.render(
                     record_pngs_dir=record_pngs_dir,
-                    record_json_dir=record_json_dir,
                     do_sleep=do_sleep)
-            if args.render is False and record_json_dir:
-                env.save_json(record_json_dir)
-                time.sleep(1.0 / env._render_fps)
+            for recorder in recorders:
+                recorder.record()
             actions = env.act(obs)
             obs, reward, done, info = env.step(actions)
 
         print("Final Result: ", info)
+        if dispatcher:
+            print("Act Latencies: ", dispatcher.summary())
         if args.render:
             env.render(
                 record_pngs_dir=record_pngs_dir,
-                record_json_dir=record_json_dir,
                 do_sleep=do_sleep)
             if do_sleep:
                 time.sleep(5)
             env.render(close=True)
-            
-        if args.render is False and record_json_dir:
-            env.save_json(record_json_dir)
-            time.sleep(1.0 / env._render_fps)
+
+        finished_at = datetime.now().isoformat()
+        for recorder in recorders:
+            recorder.record()
+            recorder.end(info, finished_at)
 
         if record_json_dir:
-            finished_at = datetime.now().isoformat()
-            _agents = args.agents.split(',')
-            utility.join_json_state(record_json_dir, _agents, finished_at,
-                                    config, info)
+            json_recorder.close()
+            header, frames, end = next(replay.iter_games(json_replay))
+            with open(os.path.join(record_json_dir, 'game_state.json'),
+                      'w') as f:
+                f.write(json.dumps(replay.to_game_state_json(
+                    header, frames, end), sort_keys=True, indent=4))
+            os.remove(json_replay)
 
         return info
 
@@ -110,6 +141,8 @@ def run(args, num_times=1, seed=None):
         times.append(time.time() - start)
         print("Game Time: ", times[-1])
 
+    if replay_recorder:
+        replay_recorder.close()
     atexit.register(env.close)
     return infos
 
@@ -151,6 +184,12 @@ def main():
         default=None,
         help='Directory to record the JSON representations of '
         "the game. Doesn't record if None.")
+    parser.add_argument(
+        '--record_replay_dir',
+        default=None,
+        help='Directory to record the games to as a binary replay, '
+        'replay.pomr. Convert it to JSON with replay_to_json. '
+        "Doesn't record if None.")
     parser.add_argument(
         "--render",
         default=False,
@@ -168,6 +207,18 @@ def main():
         '--do_sleep',
         default=True,
         help="Whether we sleep after each rendering.")
+    parser.add_argument(
+        "--concurrent_act",
+        default=False,
+        action='store_true',
+        help="Whether the docker and http agents act concurrently. "
+        "Defaults to False.")
+    parser.add_argument(
+        '--act_deadline',
+        type=float,
+        default=None,
+        help='Seconds the concurrent agents have to act per step before '
+        'they Stop. Implies --concurrent_act. No deadline if None.')
     args = parser.parse_args()
     run(args)
 
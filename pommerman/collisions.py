@@ -0,0 +1,212 @@
+'''Resolution of the collisions and kicks of moving agents and bombs.
+
+Agents and bombs are given as flat cells, i.e. row * board_size + col, and
+the occupancy of the board is kept in flat lists instead of dicts keyed by
+positions. The rules are the ones of ForwardModel.step:
+
+- Two agents or two bombs that switch cells both stay. A bomb that switches
+  cells with an agent stays.
+- Everyone moving to a cell wanted by two or more agents or two or more
+  bombs stays. This is repeated as staying may cause new collisions, e.g.
+  with three agents in a row.
+- An agent that can kick and moves onto a bomb kicks it one cell further if
+  that cell is free, else both stay. A kick that collides later is undone,
+  including a bomb kicked back to where it came from.
+
+Every agent and bomb can only be sent back once, so each fixpoint loop ends
+after at most num_agents + num_bombs + 1 passes.
+'''
+from . import constants
+from . import utility
+
+
+def flat_cells(positions, board_size):
+    '''Returns the flat cells of (row, col) positions'''
+    return [row * board_size + col for row, col in positions]
+
+
+def _border(cell, other, board_size):
+    '''Index of the border between two adjacent cells'''
+    if abs(cell - other) == board_size:
+        return 2 * min(cell, other)
+    return 2 * min(cell, other) + 1
+
+
+def resolve_collisions(board, agent_cells, agent_desired, agent_can_kick,
+                       agent_actions, bomb_cells, bomb_desired):
+    """Resolves where the alive agents and the bombs end up this step.
+
+    Args:
+      board: The board, with the agents and bombs cleared off.
+      agent_cells: The flat cells of the alive agents.
+      agent_desired: The flat cells the alive agents want to move to. This is
+        updated in place to where they end up.
+      agent_can_kick: Whether each alive agent can kick.
+      agent_actions: The constants.Action value of each alive agent.
+      bomb_cells: The flat cells of the bombs.
+      bomb_desired: The flat cells the bombs want to move to. This is updated
+        in place to where they end up.
+
+    Returns:
+      A dict from the index of every kicked bomb to the index of the agent
+      that kicked it.
+    """
+    board_size = len(board)
+    num_cells = board_size * board_size
+    max_passes = len(agent_cells) + len(bomb_cells) + 1
+
+    # Position switches:
+    # Agent <-> Agent => revert both to previous position.
+    # Bomb <-> Bomb => revert both to previous position.
+    # Agent <-> Bomb => revert Bomb to previous position.
+    crossings = [None] * (2 * num_cells)
+    for num_agent, cell in enumerate(agent_cells):
+        desired = agent_desired[num_agent]
+        if desired != cell:
+            border = _border(cell, desired, board_size)
+            if crossings[border] is not None:
+                agent_desired[num_agent] = cell
+                num_agent2, _ = crossings[border]
+                agent_desired[num_agent2] = agent_cells[num_agent2]
+            else:
+                crossings[border] = (num_agent, True)
+
+    for num_bomb, cell in enumerate(bomb_cells):
+        desired = bomb_desired[num_bomb]
+        if desired != cell:
+            border = _border(cell, desired, board_size)
+            if crossings[border] is not None:
+                bomb_desired[num_bomb] = cell
+                num, is_agent = crossings[border]
+                if not is_agent:
+                    bomb_desired[num] = bomb_cells[num]
+            else:
+                crossings[border] = (num_bomb, False)
+
+    agent_occupancy = [0] * num_cells
+    bomb_occupancy = [0] * num_cells
+    for desired in agent_desired:
+        agent_occupancy[desired] += 1
+    for desired in bomb_desired:
+        bomb_occupancy[desired] += 1
+
+    # Resolve >=2 agents or >=2 bombs trying to occupy the same space. The
+    # occupancy is only ever increased, so cells that were wanted stay taken.
+    for _ in range(max_passes):
+        change = False
+        for num_agent, cell in enumerate(agent_cells):
+            desired = agent_desired[num_agent]
+            if desired != cell and (agent_occupancy[desired] > 1 or
+                                    bomb_occupancy[desired] > 1):
+                agent_desired[num_agent] = cell
+                agent_occupancy[cell] += 1
+                change = True
+
+        for num_bomb, cell in enumerate(bomb_cells):
+            desired = bomb_desired[num_bomb]
+            if desired != cell and (bomb_occupancy[desired] > 1 or
+                                    agent_occupancy[desired] > 1):
+                bomb_desired[num_bomb] = cell
+                bomb_occupancy[cell] += 1
+                change = True
+
+        if not change:
+            break
+
+    # Handle kicks.
+    agent_at = [-1] * num_cells
+    for num_agent, desired in enumerate(agent_desired):
+        agent_at[desired] = num_agent
+
+    kicked = {}
+    kicked_by_agent = {}
+    delayed_bomb_updates = []
+    delayed_agent_updates = []
+    for num_bomb, cell in enumerate(bomb_cells):
+        desired = bomb_desired[num_bomb]
+        num_agent = agent_at[desired]
+        if num_agent < 0:
+            # There was never an agent around or it moved from a collision.
+            continue
+
+        if desired == agent_cells[num_agent]:
+            # Agent did not move. If the bomb moved, it reverts and stops.
+            if desired != cell:
+                delayed_bomb_updates.append((num_bomb, cell))
+            continue
+
+        # The agent tried to move onto the bomb. Moving either one now could
+        # put two agents on a cell, so the changes are delayed.
+        if not agent_can_kick[num_agent]:
+            delayed_bomb_updates.append((num_bomb, cell))
+            delayed_agent_updates.append((num_agent, agent_cells[num_agent]))
+            continue
+
+        direction = constants.Action(agent_actions[num_agent])
+        target_position = utility.get_next_position(
+            divmod(desired, board_size), direction)
+        target = target_position[0] * board_size + target_position[1]
+        if utility.position_on_board(board, target_position) and \
+           agent_occupancy[target] == 0 and \
+           bomb_occupancy[target] == 0 and \
+           not utility.position_is_powerup(board, target_position) and \
+           not utility.position_is_wall(board, target_position):
+            # Let the agent stay on the cell of the bomb. The target cell is
+            # checked again below as other bombs may still move there.
+            bomb_occupancy[desired] = 0
+            delayed_bomb_updates.append((num_bomb, target))
+            kicked[num_bomb] = num_agent
+            kicked_by_agent[num_agent] = num_bomb
+        else:
+            delayed_bomb_updates.append((num_bomb, cell))
+            delayed_agent_updates.append((num_agent, agent_cells[num_agent]))
+
+    for num_bomb, cell in delayed_bomb_updates:
+        bomb_desired[num_bomb] = cell
+        bomb_occupancy[cell] += 1
+    for num_agent, cell in delayed_agent_updates:
+        agent_desired[num_agent] = cell
+        agent_occupancy[cell] += 1
+    if not delayed_bomb_updates and not delayed_agent_updates:
+        return kicked
+
+    # Agents and bombs can only share a cell if they both stay where they
+    # are, i.e. the agent dropped the bomb and has not moved.
+    for _ in range(max_passes):
+        change = False
+        for num_agent, cell in enumerate(agent_cells):
+            desired = agent_desired[num_agent]
+            if desired != cell and (agent_occupancy[desired] > 1 or
+                                    bomb_occupancy[desired] != 0):
+                # This agent collided late, so undo its kick if it had one.
+                if num_agent in kicked_by_agent:
+                    num_bomb = kicked_by_agent.pop(num_agent)
+                    del kicked[num_bomb]
+                    bomb_desired[num_bomb] = bomb_cells[num_bomb]
+                    bomb_occupancy[bomb_cells[num_bomb]] += 1
+                agent_desired[num_agent] = cell
+                agent_occupancy[cell] += 1
+                change = True
+
+        for num_bomb, cell in enumerate(bomb_cells):
+            desired = bomb_desired[num_bomb]
+            # A bomb kicked back to where it came from is still checked, so
+            # that the kick is undone if it is blocked.
+            if desired == cell and num_bomb not in kicked:
+                continue
+
+            if bomb_occupancy[desired] > 1 or agent_occupancy[desired] != 0:
+                bomb_desired[num_bomb] = cell
+                bomb_occupancy[cell] += 1
+                num_agent = kicked.pop(num_bomb, None)
+                if num_agent is not None:
+                    agent_cell = agent_cells[num_agent]
+                    agent_desired[num_agent] = agent_cell
+                    agent_occupancy[agent_cell] += 1
+                    del kicked_by_agent[num_agent]
+                change = True
+
+        if not change:
+            break
+
+    return kicked
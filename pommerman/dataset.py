@@ -0,0 +1,326 @@
+'''Exports replays to datasets of featurized transitions.
+
+Every finished game of the replays is re-simulated from its states: the
+observations of every seat are rebuilt with ForwardModel.get_observations and
+featurized into planes by featurizer.PlanarFeaturizer, and the rewards and
+done flags are recomputed with ForwardModel.get_rewards and get_done. They
+are all made from the states as the agents observed them, i.e. before the
+board collapsed on the collapse steps of v1.
+
+A dataset is a directory of shards of games_per_shard games each, numbered in
+the order of the replays and their games. A shard is a directory with a .npy
+file per field, so it can be memory-mapped with np.load(mmap_mode='r'). Its
+rows are the steps of its games in order:
+- observations: [N, num_agents, C, H, W] of the states before the steps.
+- actions: [N, num_agents, action_size] int16 of the steps.
+- rewards: [N, num_agents] float32 after the steps.
+- dones: [N, num_agents] bool, whether the episode of the seat is over after
+  the step, i.e. the game is done or the agent is dead.
+shard.json lists the games of the shard and where their rows start, and
+manifest.json all shards and the shapes and dtypes of the fields.
+
+Shards are written to a temporary directory that is renamed when it is
+complete, and are made in worker processes independently of each other. So
+the same replays and options always give the same dataset, and an export
+that was stopped resumes by skipping the shards that are already there.
+
+python -m pommerman.cli.export_dataset --replays=replays --directory=dataset
+'''
+from collections import OrderedDict
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import numpy as np
+
+from . import constants
+from . import featurizer
+from .forward_model import ForwardModel
+from . import replay
+
+REPLAY_EXTENSION = '.pomr'
+MANIFEST = 'manifest.json'
+SHARD_INFO = 'shard.json'
+FIELDS = ('observations', 'actions', 'rewards', 'dones')
+
+# The readers of the replays of a worker, by path.
+_READERS = {}
+
+
+def find_replays(paths):
+    '''Returns the replay files of paths, searching directories recursively'''
+    replays = set()
+    for path in paths:
+        if not os.path.isdir(path):
+            replays.add(os.path.normpath(path))
+            continue
+        for root, _, files in os.walk(path):
+            replays.update(
+                os.path.normpath(os.path.join(root, name)) for name in files
+                if name.endswith(REPLAY_EXTENSION))
+    return sorted(replays)
+
+
+def _reader(path):
+    '''Returns the reader of a replay, opening it once per process'''
+    if path not in _READERS:
+        _READERS[path] = replay.ReplayReader(path)
+    return _READERS[path]
+
+
+def list_games(replay_paths):
+    """Lists the finished games of replays.
+
+    Returns:
+      A list of (path, game, num_steps) and the spec that the games share.
+    """
+    games = []
+    spec = None
+    for path in replay_paths:
+        reader = _reader(path)
+        for game in range(len(reader)):
+            if reader.end(game) is None:
+                continue
+            header = reader.header(game)
+            game_spec = _spec(header)
+            spec = spec or game_spec
+            assert game_spec == spec, \
+                "Game %d of %s does not match the other games: %s != %s." % (
+                    game, path, game_spec, spec)
+            games.append((path, game, reader.num_frames(game) - 1))
+    return games, spec
+
+
+def _spec(header):
+    '''Returns what the arrays of a game depend on'''
+    return OrderedDict([
+        ('board_size', header['board_size']),
+        ('num_agents', header['num_agents']),
+        ('radio_num_words', header.get('radio_num_words', 0)),
+        ('radio_vocab_size', header.get('radio_vocab_size', 0)),
+    ])
+
+
+def shard_path(directory, num):
+    '''Returns the directory of a shard of a dataset'''
+    return os.path.join(directory, 'shard_%05d' % num)
+
+
+def make_featurizer(spec, channels, dtype):
+    '''Returns the featurizer of the observations of games of a spec'''
+    return featurizer.PlanarFeaturizer(
+        spec['board_size'], channels, spec['radio_num_words'],
+        spec['radio_vocab_size'], dtype)
+
+
+def _write_game(reader, game, fields, start, feats, model):
+    '''Writes the rows of a game from row start on. Returns the next row.
+
+    feats holds the featurizer of every seat.
+    '''
+    header = reader.header(game)
+    game_type = constants.GameType(header['game_type'])
+    max_steps = header.get('max_steps', constants.MAX_STEPS)
+    agents = reader.make_agents(game)
+    num_steps = reader.num_frames(game) - 1
+    previous = None
+    for num, frame in enumerate(reader.iter_frames(game)):
+        observations = reader.observations(game, frame, agents, previous)
+        previous = frame
+        if num < num_steps:
+            for obs, seat_feats, out in zip(
+                    observations, feats, fields['observations'][start + num]):
+                seat_feats.featurize(obs, out)
+        if num == 0:
+            continue
+        # The step that led to this frame, counted as Pomme.step does.
+        row = start + num - 1
+        step_count = int(frame.state.step_count) - 1
+        # Pomme only records the moves, the radio holds the messages.
+        actions = fields['actions'][row]
+        actions[:, 0] = np.ravel(frame.intended_actions)
+        if frame.radio is not None:
+            actions[:, 1:] = frame.radio
+        fields['rewards'][row] = model.get_rewards(agents, game_type,
+                                                   step_count, max_steps)
+        done = model.get_done(agents, step_count, max_steps, game_type, None)
+        fields['dones'][row] = [done or not agent.is_alive for agent in agents]
+    return start + num_steps
+
+
+def export_shard(task):
+    """Exports the games of a shard. Runs in the workers.
+
+    Args:
+      task: (directory, num, games, spec, options) where games is a list of
+        (path, game, num_steps) and options a dict of the channels and dtype
+        of the observations.
+
+    Returns:
+      (num, num_games, num_steps).
+    """
+    directory, num, games, spec, options = task
+    # A featurizer per seat, whose agent planes then stay the same.
+    feats = [
+        make_featurizer(spec, options['channels'], options['dtype'])
+        for _ in range(spec['num_agents'])
+    ]
+    num_steps = sum(steps for _, _, steps in games)
+    num_agents = spec['num_agents']
+    action_size = 1 + spec['radio_num_words']
+    shapes = {
+        'observations': ((num_steps, num_agents) + feats[0].shape,
+                         feats[0].dtype),
+        'actions': ((num_steps, num_agents, action_size), np.int16),
+        'rewards': ((num_steps, num_agents), np.float32),
+        'dones': ((num_steps, num_agents), np.bool_),
+    }
+
+    path = shard_path(directory, num)
+    temp_path = path + '.tmp'
+    if os.path.isdir(temp_path):
+        shutil.rmtree(temp_path)
+    os.makedirs(temp_path)
+    arrays = {
+        name: np.lib.format.open_memmap(
+            os.path.join(temp_path, name + '.npy'),
+            mode='w+',
+            dtype=dtype,
+            shape=shape)
+        for name, (shape, dtype) in shapes.items()
+    }
+    # Indexing plain views of the memmaps is much cheaper.
+    fields = {name: array.view(np.ndarray) for name, array in arrays.items()}
+
+    model = ForwardModel()
+    info = []
+    row = 0
+    for replay_path, game, steps in games:
+        info.append({
+            'replay': replay_path,
+            'game': game,
+            'start': row,
+            'num_steps': steps
+        })
+        row = _write_game(_reader(replay_path), game, fields, row, feats,
+                          model)
+    assert row == num_steps, (row, num_steps)
+    for array in arrays.values():
+        array.flush()
+    del arrays, fields
+
+    with open(os.path.join(temp_path, SHARD_INFO), 'w') as f:
+        json.dump({
+            'options': options,
+            'games': info,
+            'num_steps': num_steps
+        }, f, indent=4)
+    os.rename(temp_path, path)
+    return num, len(games), num_steps
+
+
+def _is_done(directory, num, games, options):
+    '''Returns whether a shard was already exported from the same games'''
+    path = os.path.join(shard_path(directory, num), SHARD_INFO)
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        info = json.load(f)
+    return info['options'] == options and \
+        [(game['replay'], game['game'], game['num_steps'])
+         for game in info['games']] == [tuple(game) for game in games]
+
+
+def export(replay_paths, directory, games_per_shard=100,
+           channels=featurizer.DEFAULT_CHANNELS, dtype='uint8',
+           num_workers=None, log=print):
+    """Exports the finished games of replays to a dataset.
+
+    Args:
+      replay_paths: Replay files and directories to search for them.
+      directory: The directory of the dataset.
+      games_per_shard: How many games each shard holds.
+      channels: The channels of the observations, see PlanarFeaturizer.
+      dtype: The dtype of the observations.
+      num_workers: How many processes to export shards with. None for one per
+        cpu and 0 to export in this process.
+      log: Called with a line of progress per shard.
+
+    Returns:
+      The manifest.
+    """
+    replay_paths = find_replays(replay_paths)
+    games, spec = list_games(replay_paths)
+    options = {'channels': list(channels), 'dtype': np.dtype(dtype).name}
+    shards = [
+        games[start:start + games_per_shard]
+        for start in range(0, len(games), games_per_shard)
+    ]
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    tasks = []
+    for num, shard in enumerate(shards):
+        if _is_done(directory, num, shard, options):
+            continue
+        if os.path.isdir(shard_path(directory, num)):
+            shutil.rmtree(shard_path(directory, num))
+        tasks.append((directory, num, shard, spec, options))
+    log("Exporting %d of %d shards of %d games from %d replays." %
+        (len(tasks), len(shards), len(games), len(replay_paths)))
+
+    start = time.time()
+    total_games = total_steps = 0
+    if num_workers == 0:
+        results = map(export_shard, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(num_workers)
+        results = pool.imap_unordered(export_shard, tasks)
+    try:
+        for num, num_games, num_steps in results:
+            total_games += num_games
+            total_steps += num_steps
+            elapsed = time.time() - start
+            log("Shard %d: %d games, %d steps. %.1f games/sec." %
+                (num, num_games, num_steps, total_games / elapsed))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if tasks:
+        elapsed = time.time() - start
+        log("Exported %d games, %d steps in %.1f sec: %.1f games/sec, "
+            "%.0f steps/sec." % (total_games, total_steps, elapsed,
+                                 total_games / elapsed,
+                                 total_steps / elapsed))
+
+    feats = make_featurizer(spec, channels, dtype)
+    manifest = OrderedDict([
+        ('spec', spec),
+        ('options', options),
+        ('channels', list(feats.channels)),
+        ('observation_shape', list(feats.shape)),
+        ('fields', list(FIELDS)),
+        ('num_games', len(games)),
+        ('num_steps', sum(steps for _, _, steps in games)),
+        ('shards', [{
+            'path': os.path.basename(shard_path(directory, num)),
+            'num_games': len(shard),
+            'num_steps': sum(steps for _, _, steps in shard)
+        } for num, shard in enumerate(shards)]),
+    ])
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def load_shard(directory, num, mmap_mode='r'):
+    '''Returns the fields of a shard of a dataset as memory-mapped arrays'''
+    path = shard_path(directory, num)
+    return {
+        name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+        for name in FIELDS
+    }
@@ -0,0 +1,210 @@
+'''Concurrent acting of the agents of a step.
+
+ForwardModel.act asks the agents for their actions one after the other. The
+requests of the remote agents, DockerAgent and HttpAgent, time out after
+150 ms each, so a step with four of them may wait for 600 ms. An
+ActDispatcher overlaps the acts instead:
+- Threaded agents act in a thread of their own seat. These are the remote
+  agents and ProcessAgents, which run CPU-bound agents in processes of their
+  own, and any seat that is passed as threaded.
+- The other, local agents act in the calling thread in the order of their
+  seats meanwhile, as in ForwardModel.act. A game with only local agents
+  plays exactly as without the dispatcher.
+- A threaded seat that did not answer by the deadline of the step gets its
+  default action. Its late answer is dropped, and it keeps getting its
+  default action until the late act is done rather than queueing up acts.
+- The latency of every act is recorded per seat.
+
+Threaded agents must not share state with the others, e.g. draw from the
+random module, or their games are not repeatable.
+
+An example with a deadline of 100 ms:
+  env = pommerman.make('PommeFFACompetition-v0', agent_list)
+  env.set_act_dispatcher(ActDispatcher(deadline=0.1))
+'''
+from collections import deque
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+from . import agents
+from . import constants
+
+# The agents that wait on other processes for their actions.
+REMOTE_AGENTS = (agents.DockerAgent, agents.HttpAgent, agents.ProcessAgent)
+
+
+class SeatStats(object):
+    '''The latencies of the acts of a seat, in seconds'''
+
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.timeouts = 0
+        self.total = 0.
+        self.max = 0.
+        self.last = None
+        self.recent = deque(maxlen=window)
+
+    def add(self, latency):
+        self.calls += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.last = latency
+        self.recent.append(latency)
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.
+
+    def percentile(self, q):
+        '''The qth percentile of the recent latencies, 0 if there are none'''
+        return float(np.percentile(self.recent, q)) if self.recent else 0.
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'timeouts': self.timeouts,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': self.max,
+        }
+
+
+class ActDispatcher(object):
+    '''Dispatches the acts of the agents of a step concurrently'''
+
+    def __init__(self, deadline=None, default_actions=None,
+                 threaded_seats=(), remote_agents=REMOTE_AGENTS):
+        """Sets up the dispatcher. The threads are started on first use.
+
+        Args:
+          deadline: How many seconds after the start of the act of a step the
+            threaded agents have to answer by. None to wait for them.
+          default_actions: The action by agent id of the threaded seats that
+            miss the deadline. Stop for the seats that are not in it.
+          threaded_seats: The agent ids of local agents to act in threads too,
+            e.g. of agents that release the GIL.
+          remote_agents: The agent classes that act in threads.
+        """
+        self.deadline = deadline
+        self.default_actions = dict(default_actions or {})
+        self.threaded_seats = set(threaded_seats)
+        self.remote_agents = tuple(remote_agents)
+        self.stats = {}
+        self._executors = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def is_threaded(self, agent):
+        return agent.agent_id in self.threaded_seats or \
+            isinstance(agent, self.remote_agents)
+
+    def default_action(self, agent_id):
+        return self.default_actions.get(agent_id, constants.Action.Stop.value)
+
+    def _stats(self, agent_id):
+        if agent_id not in self.stats:
+            self.stats[agent_id] = SeatStats()
+        return self.stats[agent_id]
+
+    def _record(self, agent_id, start):
+        '''Records the latency of an act that started at start'''
+        latency = time.monotonic() - start
+        with self._lock:
+            self._stats(agent_id).add(latency)
+
+    def _timed_act(self, agent, obs, action_space):
+        start = time.monotonic()
+        try:
+            return agent.act(obs, action_space=action_space)
+        finally:
+            self._record(agent.agent_id, start)
+
+    def _submit(self, agent, obs, action_space):
+        if agent.agent_id not in self._executors:
+            # A thread per seat keeps the acts of the seat in order, and a
+            # seat that hangs can't hold up the others.
+            self._executors[agent.agent_id] = \
+                concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # A late act may read its observation while the env steps, which
+        # updates the arrays of the observations in place.
+        obs = {
+            key: value.copy() if isinstance(value, np.ndarray) else value
+            for key, value in obs.items()
+        }
+        return self._executors[agent.agent_id].submit(
+            self._timed_act, agent, obs, action_space)
+
+    def act(self, agents, obs, action_space, is_communicative=False):
+        """Returns the actions of the agents, like ForwardModel.act.
+
+        Args:
+          agents: A list of agent objects.
+          obs: A list of matching observations per agent.
+          action_space: The action space for the environment.
+          is_communicative: Whether the actions include a message.
+
+        Returns a list of actions.
+        """
+        start = time.monotonic()
+        ret = [None] * len(agents)
+        futures = {}
+        for num, agent in enumerate(agents):
+            if agent.is_alive and self.is_threaded(agent):
+                pending = self._pending.get(agent.agent_id)
+                if pending is not None and not pending.done():
+                    futures[num] = pending
+                    continue
+                futures[num] = self._submit(agent, obs[agent.agent_id],
+                                            action_space)
+
+        for num, agent in enumerate(agents):
+            if not agent.is_alive:
+                ret[num] = constants.Action.Stop.value
+            elif num not in futures:
+                ret[num] = self._timed_act(agent, obs[agent.agent_id],
+                                           action_space)
+
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(self.deadline - (time.monotonic() - start), 0)
+        concurrent.futures.wait(list(futures.values()), timeout=timeout)
+        for num, future in futures.items():
+            agent_id = agents[num].agent_id
+            # The act of an earlier step, whose answer is dropped.
+            is_late = future is self._pending.get(agent_id)
+            if future.done() and not is_late:
+                ret[num] = future.result()
+                continue
+            if future.done():
+                del self._pending[agent_id]
+            else:
+                self._pending[agent_id] = future
+            with self._lock:
+                self._stats(agent_id).timeouts += 1
+            ret[num] = self.default_action(agent_id)
+
+        if is_communicative:
+            for num, action in enumerate(ret):
+                if type(action) == int:
+                    ret[num] = [action, 0, 0]
+                assert (type(ret[num]) == list)
+        return ret
+
+    def summary(self):
+        '''Returns the stats of every seat as a dict by agent id'''
+        with self._lock:
+            return {
+                agent_id: stats.to_dict()
+                for agent_id, stats in sorted(self.stats.items())
+            }
+
+    def close(self):
+        '''Stops the threads, without waiting for the acts that are late'''
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors = {}
+        self._pending = {}
@@ -2,3 +2,4 @@
 from . import v0
 from . import v1
 from . import v2
+from . import vec
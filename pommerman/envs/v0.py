@@ -5,6 +5,7 @@ such as in v1.py, will inherit from this.
 """
 import json
 import os
+import random
 
 import numpy as np
 import time
@@ -14,7 +15,9 @@ import gym
 
 from .. import characters
 from .. import constants
+from .. import featurizer
 from .. import forward_model
+from .. import game_state
 from .. import graphics
 from .. import utility
 
@@ -40,6 +43,13 @@ class Pomme(gym.Env):
         self._render_fps = render_fps
         self._intended_actions = []
         self._agents = None
+        self._act_dispatcher = None
+        self._board_is_shared = False
+        self._board_library = None
+        self._board_random_state = None
+        self._bomb_life = None
+        self._bomb_blast_strength = None
+        self._bomb_maps_are_shared = False
         self._game_type = game_type
         self._board_size = board_size
         self._agent_view_size = agent_view_size
@@ -102,6 +112,15 @@ class Pomme(gym.Env):
     def set_training_agent(self, agent_id):
         self.training_agent = agent_id
 
+    def set_act_dispatcher(self, dispatcher):
+        """Lets the agents act concurrently.
+
+        Args:
+          dispatcher: A dispatch.ActDispatcher, which the env closes with
+            itself. None to let the agents act one after the other.
+        """
+        self._act_dispatcher = dispatcher
+
     def set_init_game_state(self, game_state_file):
         """Set the initial game state.
 
@@ -124,6 +143,29 @@ class Pomme(gym.Env):
             with open(game_state_file, 'r') as f:
                 self._init_game_state = json.loads(f.read())
 
+    def set_board_library(self, library, seed=None):
+        """Makes resets draw their boards and items from a library.
+
+        The library has to hold boards of the config of this env. Resets then
+        only copy a board out of the memory-mapped library instead of making
+        a new one. Pass None to make new boards again.
+
+        Args:
+          library: A board_library.BoardLibrary.
+          seed: Seeds the draws of the boards, so that the same seed always
+            gives the same sequence of boards. If None, one is taken from the
+            random module.
+        """
+        if library is not None:
+            assert library.matches(self._board_size, self._num_rigid,
+                                   self._num_wood, self._num_items), \
+                "The library %s does not hold boards of this config." % \
+                library.path
+            if seed is None:
+                seed = random.getrandbits(32)
+            self._board_random_state = np.random.RandomState(seed)
+        self._board_library = library
+
     def make_board(self):
         self._board = utility.make_board(self._board_size, self._num_rigid,
                                          self._num_wood)
@@ -134,13 +176,17 @@ class Pomme(gym.Env):
     def act(self, obs):
         agents = [agent for agent in self._agents \
                   if agent.agent_id != self.training_agent]
-        return self.model.act(agents, obs, self.action_space)
+        return self.model.act(agents, obs, self.action_space,
+                              dispatcher=self._act_dispatcher)
 
     def get_observations(self):
         self.observations = self.model.get_observations(
             self._board, self._agents, self._bombs,
             self._is_partially_observable, self._agent_view_size,
-            self._game_type, self._env)
+            self._game_type, self._env, self._bomb_blast_strength,
+            self._bomb_life)
+        # Fully observing agents get views of the bomb maps.
+        self._bomb_maps_are_shared = not self._is_partially_observable
         for obs in self.observations:
             obs['step_count'] = self._step_count
         return self.observations
@@ -157,18 +203,34 @@ class Pomme(gym.Env):
     def _get_info(self, done, rewards):
         return self.model.get_info(done, rewards, self._game_type, self._agents)
 
-    def reset(self):
+    def reset(self, board_index=None):
+        """Resets the game.
+
+        Args:
+          board_index: The index of the board to draw from the board library,
+            e.g. library.index_of_seed(seed). If None, the next one is drawn
+            at random. Only used with a board library.
+        """
         assert (self._agents is not None)
+        self._board_is_shared = False
 
         if self._init_game_state is not None:
             self.set_json_info()
         else:
             self._step_count = 0
-            self.make_board()
-            self.make_items()
+            if self._board_library is not None:
+                if board_index is None:
+                    board_index = self._board_random_state.randint(
+                        len(self._board_library))
+                self._board, self._items = self._board_library.get(
+                    board_index)
+            else:
+                self.make_board()
+                self.make_items()
             self._bombs = []
             self._flames = []
             self._powerups = []
+            self._make_bomb_maps()
             for agent_id, agent in enumerate(self._agents):
                 pos = np.where(self._board == utility.agent_value(agent_id))
                 row = pos[0][0]
@@ -186,6 +248,12 @@ class Pomme(gym.Env):
     def step(self, actions):
         self._intended_actions = actions
 
+        # The board may be shared with snapshots. Copy it before writing.
+        if self._board_is_shared:
+            self._board = self._board.copy()
+            self._board_is_shared = False
+        self._unshare_bomb_maps()
+
         max_blast_strength = self._agent_view_size or 10
         result = self.model.step(
             actions,
@@ -194,7 +262,9 @@ class Pomme(gym.Env):
             self._bombs,
             self._items,
             self._flames,
-            max_blast_strength=max_blast_strength)
+            max_blast_strength=max_blast_strength,
+            bomb_life=self._bomb_life,
+            bomb_blast_strength=self._bomb_blast_strength)
         self._board, self._agents, self._bombs, self._items, self._flames = \
                                                                     result[:5]
 
@@ -277,6 +347,9 @@ class Pomme(gym.Env):
             self._viewer.close()
             self._viewer = None
 
+        if self._act_dispatcher is not None:
+            self._act_dispatcher.close()
+
         for agent in self._agents:
             agent.shutdown()
 
@@ -297,6 +370,20 @@ class Pomme(gym.Env):
             (board, bomb_blast_strength, bomb_life, position, ammo,
              blast_strength, can_kick, teammate, enemies))
 
+    def make_featurizer(self, channels=featurizer.DEFAULT_CHANNELS):
+        """Makes a featurizer of the observations of this env into planes.
+
+        Unlike featurize, this keeps the board as [C, H, W] planes and writes
+        them into buffers that the caller owns.
+
+        Args:
+          channels: The names of the planes. See featurizer.DEFAULT_CHANNELS.
+
+        Returns:
+          A featurizer.PlanarFeaturizer.
+        """
+        return featurizer.PlanarFeaturizer(self._board_size, channels)
+
     def save_json(self, record_json_dir):
         info = self.get_json_info()
         count = "{0:0=3d}".format(self._step_count)
@@ -305,63 +392,84 @@ class Pomme(gym.Env):
         with open(path, 'w') as f:
             f.write(json.dumps(info, sort_keys=True, indent=4))
 
-    def get_json_info(self):
-        """Returns a json snapshot of the current game state."""
-        ret = {
-            'board_size': self._board_size,
+    def _make_bomb_maps(self):
+        '''Rebuilds the bomb maps, which step then keeps up to date'''
+        self._bomb_blast_strength, self._bomb_life = \
+            self.model.make_bomb_maps(self._board_size, self._bombs)
+        self._bomb_maps_are_shared = False
+
+    def _unshare_bomb_maps(self):
+        '''Copies the bomb maps before they are written to if the last
+        observations view them, so that those stay as they were'''
+        if self._bomb_maps_are_shared:
+            self._bomb_life = self._bomb_life.copy()
+            self._bomb_blast_strength = self._bomb_blast_strength.copy()
+            self._bomb_maps_are_shared = False
+
+    def get_game_state(self):
+        """Returns the current game state as a compact GameState."""
+        return game_state.GameState.from_objects(
+            self._board, self._agents, self._bombs, self._items,
+            self._flames, self._step_count)
+
+    def set_game_state(self, state):
+        """Sets the current game state from a GameState."""
+        self._board_is_shared = False
+        self._board_size = state.board_size
+        self._step_count = int(state.step_count)
+        self._board, self._agents, self._bombs, self._items, self._flames = \
+            state.to_objects(self._agents)
+        self._make_bomb_maps()
+
+    def snapshot(self):
+        """Returns a cheap snapshot of the current game state.
+
+        The board is shared with the env instead of being copied. The env
+        copies it before its next write, so the snapshot stays valid. All
+        other entities are stored as tuples of their attributes.
+        """
+        self._board_is_shared = True
+        return {
             'step_count': self._step_count,
             'board': self._board,
-            'agents': self._agents,
-            'bombs': self._bombs,
-            'flames': self._flames,
-            'items': [[k, i] for k, i in self._items.items()],
+            'agents': [(agent.position, agent.ammo, agent.is_alive,
+                        agent.blast_strength, agent.can_kick)
+                       for agent in self._agents],
+            'bombs': [(bomb.bomber, bomb.position, bomb.life,
+                       bomb.blast_strength, bomb.moving_direction)
+                      for bomb in self._bombs],
+            'flames': [(flame.position, flame._life) for flame in self._flames],
+            'items': dict(self._items),
             'intended_actions': self._intended_actions
         }
+
+    def restore(self, snapshot):
+        """Sets the game state from a snapshot. A snapshot can be restored
+        any number of times."""
+        self._step_count = snapshot['step_count']
+        self._board = snapshot['board']
+        self._board_is_shared = True
+        for agent, (position, ammo, is_alive, blast_strength, can_kick) in \
+                zip(self._agents, snapshot['agents']):
+            agent.set_start_position(position)
+            agent.reset(ammo, is_alive, blast_strength, can_kick)
+        self._bombs = [characters.Bomb(*bomb) for bomb in snapshot['bombs']]
+        self._make_bomb_maps()
+        self._flames = [
+            characters.Flame(*flame) for flame in snapshot['flames']
+        ]
+        self._items = dict(snapshot['items'])
+        self._intended_actions = snapshot['intended_actions']
+
+    def get_json_info(self):
+        """Returns a json snapshot of the current game state."""
+        ret = self.get_game_state().to_json_info()
+        ret['intended_actions'] = self._intended_actions
         for key, value in ret.items():
             ret[key] = json.dumps(value, cls=utility.PommermanJSONEncoder)
         return ret
 
     def set_json_info(self):
         """Sets the game state as the init_game_state."""
-        board_size = int(self._init_game_state['board_size'])
-        self._board_size = board_size
-        self._step_count = int(self._init_game_state['step_count'])
-
-        board_array = json.loads(self._init_game_state['board'])
-        self._board = np.ones((board_size, board_size)).astype(np.uint8)
-        self._board *= constants.Item.Passage.value
-        for x in range(self._board_size):
-            for y in range(self._board_size):
-                self._board[x, y] = board_array[x][y]
-
-        self._items = {}
-        item_array = json.loads(self._init_game_state['items'])
-        for i in item_array:
-            self._items[tuple(i[0])] = i[1]
-
-        agent_array = json.loads(self._init_game_state['agents'])
-        for a in agent_array:
-            agent = next(x for x in self._agents \
-                         if x.agent_id == a['agent_id'])
-            agent.set_start_position((a['position'][0], a['position'][1]))
-            agent.reset(
-                int(a['ammo']), bool(a['is_alive']), int(a['blast_strength']),
-                bool(a['can_kick']))
-
-        self._bombs = []
-        bomb_array = json.loads(self._init_game_state['bombs'])
-        for b in bomb_array:
-            bomber = next(x for x in self._agents \
-                          if x.agent_id == b['bomber_id'])
-            moving_direction = b['moving_direction']
-            if moving_direction is not None:
-                moving_direction = constants.Action(moving_direction)
-            self._bombs.append(
-                characters.Bomb(bomber, tuple(b['position']), int(b['life']),
-                                int(b['blast_strength']), moving_direction))
-
-        self._flames = []
-        flame_array = json.loads(self._init_game_state['flames'])
-        for f in flame_array:
-            self._flames.append(
-                characters.Flame(tuple(f['position']), f['life']))
+        self.set_game_state(
+            game_state.GameState.from_json_info(self._init_game_state))
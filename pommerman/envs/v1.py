@@ -15,6 +15,8 @@ The collapsing works in the following manner:
    and turn it into rigid walls. This has the effect of destroying any items,
    bombs (which don't go off), and agents in those squares.
 """
+import json
+
 from .. import constants
 from .. import utility
 from . import v0
@@ -48,6 +50,7 @@ class Pomme(v0.Pomme):
           ring: Integer value of which cells to collapse.
         """
         board = self._board.copy()
+        self._unshare_bomb_maps()
 
         def collapse(r, c):
             '''Handles the collapsing of the board. Will
@@ -67,6 +70,8 @@ class Pomme(v0.Pomme):
                     else:
                         new_bombs.append(b)
                 self._bombs = new_bombs
+                self._bomb_life[r][c] = 0
+                self._bomb_blast_strength[r][c] = 0
             elif (r, c) in self._items:
                 # Item. Remove the item.
                 del self._items[(r, c)]
@@ -84,9 +89,18 @@ class Pomme(v0.Pomme):
 
         return board
 
+    def snapshot(self):
+        ret = super().snapshot()
+        ret['collapses'] = list(self.collapses)
+        return ret
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self.collapses = list(snapshot['collapses'])
+
     def get_json_info(self):
         ret = super().get_json_info()
-        ret['collapses'] = json.dumps(self.collapses, cls=json_encoder)
+        ret['collapses'] = json.dumps(self.collapses, cls=utility.PommermanJSONEncoder)
         return ret
 
     def set_json_info(self):
@@ -7,10 +7,13 @@ observation stream for each agent.
 
 NOTE: This is here for posterity but is not used in the competition.
 """
+import json
+
 from gym import spaces
 import numpy as np
 
 from .. import constants
+from .. import featurizer
 from .. import utility
 from . import v0
 
@@ -73,6 +76,13 @@ class Pomme(v0.Pomme):
         self.observation_space = spaces.Box(
             np.array(min_obs), np.array(max_obs))
 
+    def act(self, obs):
+        agents = [agent for agent in self._agents \
+                  if agent.agent_id != self.training_agent]
+        return self.model.act(
+            agents, obs, self.action_space, is_communicative=True,
+            dispatcher=self._act_dispatcher)
+
     def get_observations(self):
         observations = super().get_observations()
         for obs in observations:
@@ -102,21 +112,46 @@ class Pomme(v0.Pomme):
         message = utility.make_np_float(message)
         return np.concatenate((ret, message))
 
+    def make_featurizer(self, channels=featurizer.DEFAULT_CHANNELS):
+        """Makes a featurizer of the observations of this env into planes.
+
+        The message from the teammate is one-hot encoded into
+        radio_num_words * radio_vocab_size extra planes after all others.
+        """
+        return featurizer.PlanarFeaturizer(
+            self._board_size, channels, self._radio_num_words,
+            self._radio_vocab_size)
+
+    def snapshot(self):
+        ret = super().snapshot()
+        ret['radio_from_agent'] = dict(self._radio_from_agent)
+        return ret
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        self._radio_from_agent = dict(snapshot['radio_from_agent'])
+
     def get_json_info(self):
         ret = super().get_json_info()
         ret['radio_vocab_size'] = json.dumps(
-            self._radio_vocab_size, cls=json_encoder)
+            self._radio_vocab_size, cls=utility.PommermanJSONEncoder)
         ret['radio_num_words'] = json.dumps(
-            self._radio_num_words, cls=json_encoder)
+            self._radio_num_words, cls=utility.PommermanJSONEncoder)
         ret['_radio_from_agent'] = json.dumps(
-            self._radio_from_agent, cls=json_encoder)
+            {agent.value: message
+             for agent, message in self._radio_from_agent.items()},
+            cls=utility.PommermanJSONEncoder)
         return ret
 
     def set_json_info(self):
         super().set_json_info()
-        self.radio_vocab_size = json.loads(
+        self._radio_vocab_size = json.loads(
             self._init_game_state['radio_vocab_size'])
-        self.radio_num_words = json.loads(
+        self._radio_num_words = json.loads(
             self._init_game_state['radio_num_words'])
-        self._radio_from_agent = json.loads(
+        radio_from_agent = json.loads(
             self._init_game_state['_radio_from_agent'])
+        self._radio_from_agent = {
+            constants.Item(int(agent)): tuple(message)
+            for agent, message in radio_from_agent.items()
+        }
@@ -0,0 +1,294 @@
+"""Runs many Pommerman envs in worker processes, K envs per worker.
+
+The workers write the observations, rewards and dones of their envs straight
+into shared memory numpy buffers, and read the actions from one, instead of
+pickling them through pipes. The pipes only carry the commands and the infos.
+
+Every observation field is stacked into one buffer of shape
+[num_envs, 4, ...], indexed by env and then by agent id:
+- board (uint8), bomb_blast_strength and bomb_life (float32): [board_size,
+  board_size] grids, as in the observations of the envs.
+- position [2], ammo, blast_strength, can_kick, teammate, enemies [3] and
+  step_count (int32). teammate and enemies hold the values of the Items.
+- alive (uint8): [4], 1 for every agent that is alive.
+- message (int32): [radio_num_words], the message from the teammate. Only
+  for envs with radio, i.e. v2.
+
+The agents of an env run in its worker. If there is a training agent, its
+actions are the ones passed to step_async, otherwise all agents act in the
+workers. Envs reset themselves when they are done, so the observations of a
+done env are those of its next game.
+
+An example with 16 FFA envs in 4 workers and a training agent on seat 0:
+  vec_env = SubprocVecPomme('PommeFFACompetition-v0', 16, 4, training_agent=0)
+  obs = vec_env.reset()
+  obs, rewards, dones, infos = vec_env.step(actions)
+"""
+import ctypes
+import multiprocessing
+import random
+
+import gym
+import numpy as np
+
+from .. import agents
+from .. import constants
+
+
+def simple_agents():
+    '''Makes the default agents, four SimpleAgents'''
+    return [agents.SimpleAgent() for _ in range(4)]
+
+
+def observation_spec(config_id):
+    """Returns the shape and dtype of every observation field of a config.
+
+    Returns:
+      A dict of (shape, dtype) by field. The shapes are those of one agent.
+    """
+    kwargs = gym.spec(config_id)._kwargs
+    board_size = kwargs['board_size']
+    spec = {
+        'board': ((board_size, board_size), np.uint8),
+        'bomb_blast_strength': ((board_size, board_size), np.float32),
+        'bomb_life': ((board_size, board_size), np.float32),
+        'position': ((2,), np.int32),
+        'ammo': ((), np.int32),
+        'blast_strength': ((), np.int32),
+        'can_kick': ((), np.int32),
+        'teammate': ((), np.int32),
+        'enemies': ((3,), np.int32),
+        'step_count': ((), np.int32),
+        'alive': ((4,), np.uint8),
+    }
+    if kwargs.get('radio_num_words'):
+        spec['message'] = ((kwargs['radio_num_words'],), np.int32)
+    return spec
+
+
+def action_size(config_id):
+    '''Returns the number of values in the action of an agent'''
+    return 1 + (gym.spec(config_id)._kwargs.get('radio_num_words') or 0)
+
+
+def _shared_array(shape, dtype):
+    '''Allocates a shared memory buffer. Returns it and a numpy view of it'''
+    dtype = np.dtype(dtype)
+    raw = multiprocessing.RawArray(ctypes.c_byte,
+                                   max(int(np.prod(shape)), 1) * dtype.itemsize)
+    return raw, _view(raw, shape, dtype)
+
+
+def _view(raw, shape, dtype):
+    '''Returns a numpy view of a shared memory buffer'''
+    dtype = np.dtype(dtype)
+    return np.frombuffer(raw, dtype=dtype,
+                         count=int(np.prod(shape))).reshape(shape)
+
+
+def write_observations(buffers, index, observations):
+    '''Writes the observations of the agents of an env to the buffers'''
+    for agent_id, obs in enumerate(observations):
+        for key, buffer in buffers.items():
+            if key == 'alive':
+                alive = buffer[index, agent_id]
+                alive[:] = 0
+                for value in obs['alive']:
+                    alive[value - constants.Item.Agent0.value] = 1
+            elif key == 'teammate':
+                buffer[index, agent_id] = obs['teammate'].value
+            elif key == 'enemies':
+                buffer[index, agent_id] = [enemy.value for enemy in obs['enemies']]
+            else:
+                buffer[index, agent_id] = obs[key]
+
+
+def _worker(remote, parent_remote, config_id, indices, make_agents,
+            training_agent, seed, raw_buffers, spec):
+    '''Runs the envs at indices and writes to the shared buffers'''
+    parent_remote.close()
+    # Boards are made from the random module and np.random.
+    random.seed(seed + indices[0])
+    np.random.seed(seed + indices[0])
+
+    num_envs = raw_buffers['rewards'][1][0]
+    buffers = {
+        key: _view(raw_buffers['obs'][key], (num_envs, 4) + shape, dtype)
+        for key, (shape, dtype) in spec.items()
+    }
+    actions = _view(*raw_buffers['actions'])
+    rewards = _view(*raw_buffers['rewards'])
+    dones = _view(*raw_buffers['dones'])
+    has_radio = 'message' in spec
+
+    # Imported here so that the envs are registered in spawned workers too.
+    from .. import make
+    envs = []
+    for index in indices:
+        env = make(config_id, make_agents())
+        env.seed(seed + index)
+        if training_agent is not None:
+            env.set_training_agent(training_agent)
+        envs.append(env)
+    observations = [None] * len(envs)
+
+    try:
+        while True:
+            command = remote.recv()
+            if command == 'reset':
+                for num, (index, env) in enumerate(zip(indices, envs)):
+                    observations[num] = env.reset()
+                    write_observations(buffers, index, observations[num])
+                remote.send(None)
+            elif command == 'step':
+                infos = []
+                for num, (index, env) in enumerate(zip(indices, envs)):
+                    env_actions = env.act(observations[num])
+                    if training_agent is not None:
+                        action = actions[index, training_agent]
+                        action = [int(value) for value in action] \
+                            if has_radio else int(action[0])
+                        env_actions.insert(training_agent, action)
+                    obs, reward, done, info = env.step(env_actions)
+                    if done:
+                        obs = env.reset()
+                    observations[num] = obs
+                    write_observations(buffers, index, obs)
+                    rewards[index] = reward
+                    dones[index] = done
+                    infos.append(info)
+                remote.send(infos)
+            elif command == 'close':
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+            else:
+                raise ValueError('Unknown command %s' % command)
+    except KeyboardInterrupt:
+        pass
+
+
+class SubprocVecPomme(object):
+    '''Steps num_envs envs of a config in worker processes'''
+
+    def __init__(self,
+                 config_id,
+                 num_envs,
+                 num_envs_per_worker=1,
+                 make_agents=simple_agents,
+                 training_agent=None,
+                 seed=0,
+                 start_method=None):
+        """Starts the workers.
+
+        Args:
+          config_id: Any registered config, e.g. PommeRadio-v2.
+          num_envs: How many envs to run.
+          num_envs_per_worker: How many envs each worker process runs.
+          make_agents: Makes the list of four agents of an env. Called in the
+            workers, so it has to be picklable with the spawn start method.
+          training_agent: The agent id whose actions are passed to
+            step_async. If None, all agents act in the workers.
+          seed: Env number i is seeded with seed + i.
+          start_method: The multiprocessing start method of the workers.
+        """
+        self.config_id = config_id
+        self.num_envs = num_envs
+        self.training_agent = training_agent
+        self.spec = observation_spec(config_id)
+        self._waiting = False
+        self._closed = False
+
+        raw_obs = {}
+        self.observations = {}
+        for key, (shape, dtype) in self.spec.items():
+            raw_obs[key], self.observations[key] = _shared_array(
+                (num_envs, 4) + shape, dtype)
+        actions_shape = (num_envs, 4, action_size(config_id))
+        raw_actions, self.actions = _shared_array(actions_shape, np.int64)
+        raw_rewards, self.rewards = _shared_array((num_envs, 4), np.float32)
+        raw_dones, self.dones = _shared_array((num_envs,), np.bool_)
+        raw_buffers = {
+            'obs': raw_obs,
+            'actions': (raw_actions, actions_shape, np.int64),
+            'rewards': (raw_rewards, (num_envs, 4), np.float32),
+            'dones': (raw_dones, (num_envs,), np.bool_),
+        }
+
+        context = multiprocessing.get_context(start_method)
+        self._remotes = []
+        self._processes = []
+        for start in range(0, num_envs, num_envs_per_worker):
+            indices = list(range(start, min(start + num_envs_per_worker,
+                                            num_envs)))
+            remote, worker_remote = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(worker_remote, remote, config_id, indices, make_agents,
+                      training_agent, seed, raw_buffers, self.spec))
+            process.daemon = True
+            process.start()
+            worker_remote.close()
+            self._remotes.append(remote)
+            self._processes.append(process)
+
+    def reset(self):
+        '''Resets all envs and returns their observations'''
+        for remote in self._remotes:
+            remote.send('reset')
+        for remote in self._remotes:
+            remote.recv()
+        return self.observations
+
+    def step_async(self, actions=None):
+        """Starts to step all envs.
+
+        Args:
+          actions: The actions of the training agent in every env, of shape
+            [num_envs] or, with radio, [num_envs, 1 + radio_num_words]. None
+            if there is no training agent.
+        """
+        assert not self._waiting, "step_wait has to be called first."
+        if self.training_agent is not None:
+            self.actions[:, self.training_agent] = np.reshape(
+                actions, (self.num_envs, -1))
+        for remote in self._remotes:
+            remote.send('step')
+        self._waiting = True
+
+    def step_wait(self):
+        """Waits for the step of all envs to finish.
+
+        The observations, rewards and dones are the shared buffers, which
+        the next step overwrites. Copy them to keep them.
+
+        Returns:
+          observations: A dict of the observation buffers by field.
+          rewards: [num_envs, 4] rewards.
+          dones: [num_envs] dones. Done envs have already been reset.
+          infos: A list of the infos of the envs.
+        """
+        infos = []
+        for remote in self._remotes:
+            infos.extend(remote.recv())
+        self._waiting = False
+        return self.observations, self.rewards, self.dones, infos
+
+    def step(self, actions=None):
+        '''Steps all envs. See step_async and step_wait'''
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        '''Closes the envs and stops the workers'''
+        if self._closed:
+            return
+        if self._waiting:
+            for remote in self._remotes:
+                remote.recv()
+        for remote in self._remotes:
+            remote.send('close')
+        for process in self._processes:
+            process.join()
+        self._closed = True
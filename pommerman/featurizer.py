@@ -0,0 +1,173 @@
+'''Featurizes observations into planar [C, H, W] tensors.
+
+Unlike Pomme.featurize, which flattens everything into one vector, every
+feature is a plane of the board. The planes are written straight into a
+buffer that the caller owns, so featurizing allocates nothing per step:
+- The one-hot planes of items and agents are all made by a single np.take
+  from a small table of which board values light up which plane.
+- The bomb maps are copied into their planes.
+- Scalar features, e.g. ammo, fill their whole plane.
+- With radio, the message from the teammate is one-hot encoded into
+  radio_num_words * radio_vocab_size constant planes after all others.
+
+Observations do not hold the lives of flames, so flames are one-hot like any
+other item.
+'''
+from collections import OrderedDict
+
+import numpy as np
+
+from . import constants
+
+# The one-hot planes of items, by name.
+ITEM_CHANNELS = OrderedDict([
+    ('passage', constants.Item.Passage),
+    ('rigid', constants.Item.Rigid),
+    ('wood', constants.Item.Wood),
+    ('bomb', constants.Item.Bomb),
+    ('flames', constants.Item.Flames),
+    ('fog', constants.Item.Fog),
+    ('extra_bomb', constants.Item.ExtraBomb),
+    ('incr_range', constants.Item.IncrRange),
+    ('kick', constants.Item.Kick),
+])
+# The one-hot planes of the agents, as seen by the observing agent.
+AGENT_CHANNELS = ('self', 'teammate', 'enemies')
+# The planes copied from the bomb maps of the observation.
+MAP_CHANNELS = ('bomb_life', 'bomb_blast_strength')
+# The planes filled with a scalar of the observation.
+SCALAR_CHANNELS = ('ammo', 'blast_strength', 'can_kick')
+
+DEFAULT_CHANNELS = tuple(ITEM_CHANNELS) + AGENT_CHANNELS + MAP_CHANNELS + \
+    SCALAR_CHANNELS
+
+_AGENTS = [
+    constants.Item.Agent0, constants.Item.Agent1, constants.Item.Agent2,
+    constants.Item.Agent3
+]
+
+
+class PlanarFeaturizer(object):
+    """Writes observations into [C, H, W] planes.
+
+    The one-hot planes come first, in the order of channels, then the
+    planes of the bomb maps and scalars, then the radio planes.
+    """
+
+    def __init__(self,
+                 board_size=constants.BOARD_SIZE,
+                 channels=DEFAULT_CHANNELS,
+                 radio_num_words=0,
+                 radio_vocab_size=0,
+                 dtype=np.float32):
+        """Initializes the featurizer.
+
+        Args:
+          board_size: The size of the boards, i.e. H and W.
+          channels: The names of the planes, from ITEM_CHANNELS,
+            AGENT_CHANNELS, MAP_CHANNELS and SCALAR_CHANNELS.
+          radio_num_words: How many words a message has. 0 for no radio.
+          radio_vocab_size: How many words there are.
+          dtype: The dtype of the buffers.
+        """
+        unknown = set(channels) - set(DEFAULT_CHANNELS)
+        assert not unknown, "Unknown channels: %s." % sorted(unknown)
+        self.board_size = board_size
+        self.radio_num_words = radio_num_words
+        self.radio_vocab_size = radio_vocab_size
+        self.dtype = np.dtype(dtype)
+
+        one_hot = [
+            name for name in channels
+            if name in ITEM_CHANNELS or name in AGENT_CHANNELS
+        ]
+        self._values = [name for name in channels if name in MAP_CHANNELS]
+        self._scalars = [name for name in channels if name in SCALAR_CHANNELS]
+        self.channels = tuple(one_hot + self._values + self._scalars)
+        self.num_channels = len(self.channels) + \
+            radio_num_words * radio_vocab_size
+        self.shape = (self.num_channels, board_size, board_size)
+
+        self._num_one_hot = len(one_hot)
+        self._table = np.zeros((len(one_hot), len(constants.Item)),
+                               dtype=self.dtype)
+        for num, name in enumerate(one_hot):
+            if name in ITEM_CHANNELS:
+                self._table[num, ITEM_CHANNELS[name].value] = 1
+        self._agent_rows = [
+            one_hot.index(name) if name in one_hot else None
+            for name in AGENT_CHANNELS
+        ]
+        self._agent_key = None
+
+    def make_buffer(self, batch_size=None):
+        '''Allocates a buffer of [C, H, W], or [N, C, H, W] for batches'''
+        shape = self.shape if batch_size is None else \
+            (batch_size,) + self.shape
+        return np.zeros(shape, dtype=self.dtype)
+
+    def _set_agents(self, obs):
+        '''Points the agent rows of the table at the agents of obs'''
+        teammate = obs['teammate']
+        enemies = obs['enemies']
+        key = (teammate, tuple(enemies))
+        if key == self._agent_key:
+            return
+        self._agent_key = key
+        own = [
+            agent for agent in _AGENTS
+            if agent != teammate and agent not in enemies
+        ]
+        for row, agents in zip(self._agent_rows, (own, [teammate], enemies)):
+            if row is None:
+                continue
+            self._table[row] = 0
+            for agent in agents:
+                if agent != constants.Item.AgentDummy:
+                    self._table[row, agent.value] = 1
+
+    def featurize(self, obs, out=None):
+        """Writes the planes of an observation.
+
+        Args:
+          obs: The observation of one agent.
+          out: The [C, H, W] buffer to write to. If None, one is allocated.
+
+        Returns:
+          out.
+        """
+        if out is None:
+            out = self.make_buffer()
+        self._set_agents(obs)
+        num = self._num_one_hot
+        np.take(self._table, obs['board'], axis=1, out=out[:num], mode='clip')
+        for name in self._values:
+            np.copyto(out[num], obs[name], casting='unsafe')
+            num += 1
+        for name in self._scalars:
+            out[num].fill(obs[name])
+            num += 1
+        if self.radio_num_words:
+            radio = out[num:]
+            radio.fill(0)
+            for word, value in enumerate(obs['message']):
+                if value:
+                    radio[word * self.radio_vocab_size + int(value) - 1].fill(1)
+        return out
+
+    def featurize_batch(self, observations, out=None):
+        """Writes the planes of a batch of observations.
+
+        Args:
+          observations: A list of N observations.
+          out: The [N, C, H, W] buffer to write to. If None, one is
+            allocated.
+
+        Returns:
+          out.
+        """
+        if out is None:
+            out = self.make_buffer(len(observations))
+        for num, obs in enumerate(observations):
+            self.featurize(obs, out[num])
+        return out
@@ -0,0 +1,164 @@
+'''Visibility of the board for partially observable agents.
+
+An agent sees the square of cells within agent_view_size of its position in
+both directions. The slices of that window are precomputed for every position
+of every board and view size in use, so fogging a grid costs one slice
+assignment instead of a check per cell.
+'''
+import numpy as np
+
+from . import constants
+
+_VIEW_WINDOWS = {}
+_UNSEEN = {}
+
+
+def get_view_windows(board_size, agent_view_size):
+    '''Returns the (rows, cols) slices of the view window by position'''
+    key = (board_size, agent_view_size)
+    if key not in _VIEW_WINDOWS:
+        bounds = [
+            slice(max(num - agent_view_size, 0),
+                  min(num + agent_view_size + 1, board_size))
+            for num in range(board_size)
+        ]
+        _VIEW_WINDOWS[key] = [[(row, col) for col in bounds] for row in bounds]
+    return _VIEW_WINDOWS[key]
+
+
+def view_window(position, board_size, agent_view_size):
+    '''Returns the (rows, cols) slices seen by an agent at position'''
+    row, col = position
+    return get_view_windows(board_size, agent_view_size)[row][col]
+
+
+def in_view(position, other, agent_view_size):
+    '''Checks if the cell other is seen by an agent at position'''
+    return abs(position[0] - other[0]) <= agent_view_size and \
+        abs(position[1] - other[1]) <= agent_view_size
+
+
+def fog(grid, window, fog_value=constants.Item.Fog.value):
+    """Returns a copy of grid with every cell outside window fogged.
+
+    Args:
+      grid: An array whose first two axes are the board rows and columns.
+      window: The (rows, cols) slices that stay visible.
+      fog_value: What fogged cells are set to. This may be an array that is
+        broadcast to the trailing axes, e.g. a color.
+    """
+    ret = np.empty_like(grid)
+    ret[...] = fog_value
+    ret[window] = grid[window]
+    return ret
+
+
+def read_only(grid):
+    '''Returns a view of grid that can't be written to'''
+    ret = grid.view()
+    ret.flags.writeable = False
+    return ret
+
+
+def unseen(board_size):
+    """Returns grids in which nothing is seen, for agents that are dead.
+
+    The grids are made once per board size and shared by all observations of
+    dead agents, so they are read only.
+
+    Returns:
+      board: A board that is all fog.
+      bomb_blast_strength, bomb_life: Empty bomb maps.
+    """
+    if board_size not in _UNSEEN:
+        board = np.full((board_size, board_size), constants.Item.Fog.value,
+                        dtype=np.uint8)
+        bomb_map = np.zeros((board_size, board_size))
+        _UNSEEN[board_size] = (read_only(board), read_only(bomb_map),
+                               read_only(bomb_map))
+    return _UNSEEN[board_size]
+
+
+class LazyObservation(dict):
+    """An observation whose fogged grids are only made when they are read.
+
+    Agents that never read their observation, e.g. the training agent of a
+    learner that only looks at some seats, cost no fogging at all. Listing
+    the items, copying or pickling the observation makes all of its grids
+    and the copies are plain dicts.
+
+    Args:
+      window: The (rows, cols) slices that the agent sees.
+      grids: The grids to fog by key, as (grid, fog_value). They must not
+        change before they are read, so pass copies of live grids.
+      **kwargs: The other items of the observation.
+    """
+
+    def __init__(self, window, grids, **kwargs):
+        super().__init__(**kwargs)
+        self._window = window
+        self._grids = grids
+
+    def __missing__(self, key):
+        if key not in self._grids:
+            raise KeyError(key)
+        grid, fog_value = self._grids.pop(key)
+        value = fog(grid, self._window, fog_value)
+        self[key] = value
+        return value
+
+    def _make_all(self):
+        '''Makes every grid that has not been read yet'''
+        for key in list(self._grids):
+            self.__missing__(key)
+        return self
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._grids
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._grids)
+
+    def __iter__(self):
+        return dict.__iter__(self._make_all())
+
+    def __eq__(self, other):
+        return dict.__eq__(self._make_all(), other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return dict.__repr__(self._make_all())
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return dict.keys(self._make_all())
+
+    def values(self):
+        return dict.values(self._make_all())
+
+    def items(self):
+        return dict.items(self._make_all())
+
+    def copy(self):
+        return dict(self.items())
+
+    def pop(self, key, *default):
+        if key in self._grids and not dict.__contains__(self, key):
+            self.__missing__(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        return dict.popitem(self._make_all())
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
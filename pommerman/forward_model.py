@@ -1,16 +1,49 @@
 '''Module to manage and advanced game state'''
-from collections import defaultdict
-
 import numpy as np
 
+from . import batched_forward_model
+from . import blast
 from . import constants
 from . import characters
+from . import collisions
+from . import fog
 from . import utility
+from . import zobrist
+
+
+class UndoRecord(object):
+    """What one ForwardModel.apply changed, so that undo can revert it."""
+
+    __slots__ = ('cells', 'values', 'agents', 'bombs', 'bomb_states',
+                 'flames', 'flame_lives', 'items', 'hash')
+
+    def __init__(self):
+        self.hash = 0
+        self.cells = None
+        self.values = None
+        self.agents = []
+        self.bombs = []
+        self.bomb_states = []
+        self.flames = []
+        self.flame_lives = []
+        self.items = {}
 
 
 class ForwardModel(object):
     """Class for helping with the [forward] modeling of the game state."""
 
+    def __init__(self):
+        self._board = None
+        self._agents = None
+        self._bombs = None
+        self._items = None
+        self._flames = None
+        self._max_blast_strength = 10
+        self._zobrist = None
+        self._hash = 0
+        self._bomb_life = None
+        self._bomb_blast_strength = None
+
     def run(self,
             num_times,
             board,
@@ -82,7 +115,8 @@ class ForwardModel(object):
         return steps, board, agents, bombs, items, flames, done, info
 
     @staticmethod
-    def act(agents, obs, action_space, is_communicative=False):
+    def act(agents, obs, action_space, is_communicative=False,
+            dispatcher=None):
         """Returns actions for each agent in this list.
 
         Args:
@@ -91,9 +125,13 @@ class ForwardModel(object):
           action_space: The action space for the environment using this model.
           is_communicative: Whether the action depends on communication
             observations as well.
+          dispatcher: A dispatch.ActDispatcher to let the agents act
+            concurrently. If None, they act one after the other.
 
         Returns a list of actions.
         """
+        if dispatcher is not None:
+            return dispatcher.act(agents, obs, action_space, is_communicative)
 
         def act_ex_communication(agent):
             '''Handles agent's move without communication'''
@@ -129,8 +167,18 @@ class ForwardModel(object):
              curr_bombs,
              curr_items,
              curr_flames,
-             max_blast_strength=10):
+             max_blast_strength=10,
+             bomb_life=None,
+             bomb_blast_strength=None):
+        """Runs one step of the game in place.
+
+        If the bomb_life and bomb_blast_strength maps of the bombs are given,
+        then they are kept up to date in place as well. This only touches the
+        cells of the bombs, so callers don't need to rebuild them every step.
+        """
         board_size = len(curr_board)
+        if bomb_life is not None:
+            old_bomb_positions = [bomb.position for bomb in curr_bombs]
 
         # Tick the flames. Replace any dead ones with passages. If there is an
         # item there, then reveal that item.
@@ -202,224 +250,36 @@ class ForwardModel(object):
                    and not utility.position_is_wall(curr_board, desired_position):
                     desired_bomb_positions[num_bomb] = desired_position
 
-        # Position switches:
-        # Agent <-> Agent => revert both to previous position.
-        # Bomb <-> Bomb => revert both to previous position.
-        # Agent <-> Bomb => revert Bomb to previous position.
-        crossings = {}
-
-        def crossing(current, desired):
-            '''Checks to see if an agent is crossing paths'''
-            current_x, current_y = current
-            desired_x, desired_y = desired
-            if current_x != desired_x:
-                assert current_y == desired_y
-                return ('X', min(current_x, desired_x), current_y)
-            assert current_x == desired_x
-            return ('Y', current_x, min(current_y, desired_y))
-
-        for num_agent, agent in enumerate(alive_agents):
-            if desired_agent_positions[num_agent] != agent.position:
-                desired_position = desired_agent_positions[num_agent]
-                border = crossing(agent.position, desired_position)
-                if border in crossings:
-                    # Crossed another agent - revert both to prior positions.
-                    desired_agent_positions[num_agent] = agent.position
-                    num_agent2, _ = crossings[border]
-                    desired_agent_positions[num_agent2] = alive_agents[
-                        num_agent2].position
-                else:
-                    crossings[border] = (num_agent, True)
-
-        for num_bomb, bomb in enumerate(curr_bombs):
-            if desired_bomb_positions[num_bomb] != bomb.position:
-                desired_position = desired_bomb_positions[num_bomb]
-                border = crossing(bomb.position, desired_position)
-                if border in crossings:
-                    # Crossed - revert to prior position.
-                    desired_bomb_positions[num_bomb] = bomb.position
-                    num, is_agent = crossings[border]
-                    if not is_agent:
-                        # Crossed bomb - revert that to prior position as well.
-                        desired_bomb_positions[num] = curr_bombs[num].position
-                else:
-                    crossings[border] = (num_bomb, False)
-
-        # Deal with multiple agents or multiple bomb collisions on desired next
-        # position by resetting desired position to current position for
-        # everyone involved in the collision.
-        agent_occupancy = defaultdict(int)
-        bomb_occupancy = defaultdict(int)
-        for desired_position in desired_agent_positions:
-            agent_occupancy[desired_position] += 1
-        for desired_position in desired_bomb_positions:
-            bomb_occupancy[desired_position] += 1
-
-        # Resolve >=2 agents or >=2 bombs trying to occupy the same space.
-        change = True
-        while change:
-            change = False
-            for num_agent, agent in enumerate(alive_agents):
-                desired_position = desired_agent_positions[num_agent]
-                curr_position = agent.position
-                # Either another agent is going to this position or more than
-                # one bomb is going to this position. In both scenarios, revert
-                # to the original position.
-                if desired_position != curr_position and \
-                      (agent_occupancy[desired_position] > 1 or bomb_occupancy[desired_position] > 1):
-                    desired_agent_positions[num_agent] = curr_position
-                    agent_occupancy[curr_position] += 1
-                    change = True
-
-            for num_bomb, bomb in enumerate(curr_bombs):
-                desired_position = desired_bomb_positions[num_bomb]
-                curr_position = bomb.position
-                if desired_position != curr_position and \
-                      (bomb_occupancy[desired_position] > 1 or agent_occupancy[desired_position] > 1):
-                    desired_bomb_positions[num_bomb] = curr_position
-                    bomb_occupancy[curr_position] += 1
-                    change = True
-
-        # Handle kicks.
-        agent_indexed_by_kicked_bomb = {}
-        kicked_bomb_indexed_by_agent = {}
-        delayed_bomb_updates = []
-        delayed_agent_updates = []
-
-        # Loop through all bombs to see if they need a good kicking or cause
-        # collisions with an agent.
-        for num_bomb, bomb in enumerate(curr_bombs):
-            desired_position = desired_bomb_positions[num_bomb]
-
-            if agent_occupancy[desired_position] == 0:
-                # There was never an agent around to kick or collide.
-                continue
-
-            agent_list = [
-                (num_agent, agent) for (num_agent, agent) in enumerate(alive_agents) \
-                if desired_position == desired_agent_positions[num_agent]]
-            if not agent_list:
-                # Agents moved from collision.
-                continue
-
-            # The agent_list should contain a single element at this point.
-            assert (len(agent_list) == 1)
-            num_agent, agent = agent_list[0]
-
-            if desired_position == agent.position:
-                # Agent did not move
-                if desired_position != bomb.position:
-                    # Bomb moved, but agent did not. The bomb should revert
-                    # and stop.
-                    delayed_bomb_updates.append((num_bomb, bomb.position))
-                continue
-
-            # NOTE: At this point, we have that the agent in question tried to
-            # move into this position.
-            if not agent.can_kick:
-                # If we move the agent at this point, then we risk having two
-                # agents on a square in future iterations of the loop. So we
-                # push this change to the next stage instead.
-                delayed_bomb_updates.append((num_bomb, bomb.position))
-                delayed_agent_updates.append((num_agent, agent.position))
-                continue
-
-            # Agent moved and can kick - see if the target for the kick never had anyhing on it
-            direction = constants.Action(actions[agent.agent_id])
-            target_position = utility.get_next_position(desired_position,
-                                                        direction)
-            if utility.position_on_board(curr_board, target_position) and \
-                       agent_occupancy[target_position] == 0 and \
-                       bomb_occupancy[target_position] == 0 and \
-                       not utility.position_is_powerup(curr_board, target_position) and \
-                       not utility.position_is_wall(curr_board, target_position):
-                # Ok to update bomb desired location as we won't iterate over it again here
-                # but we can not update bomb_occupancy on target position and need to check it again
-                # However we need to set the bomb count on the current position to zero so
-                # that the agent can stay on this position.
-                bomb_occupancy[desired_position] = 0
-                delayed_bomb_updates.append((num_bomb, target_position))
-                agent_indexed_by_kicked_bomb[num_bomb] = num_agent
-                kicked_bomb_indexed_by_agent[num_agent] = num_bomb
-                bomb.moving_direction = direction
-                # Bombs may still collide and we then need to reverse bomb and agent ..
-            else:
-                delayed_bomb_updates.append((num_bomb, bomb.position))
-                delayed_agent_updates.append((num_agent, agent.position))
-
-        for (num_bomb, bomb_position) in delayed_bomb_updates:
-            desired_bomb_positions[num_bomb] = bomb_position
-            bomb_occupancy[bomb_position] += 1
-            change = True
-
-        for (num_agent, agent_position) in delayed_agent_updates:
-            desired_agent_positions[num_agent] = agent_position
-            agent_occupancy[agent_position] += 1
-            change = True
-
-        while change:
-            change = False
-            for num_agent, agent in enumerate(alive_agents):
-                desired_position = desired_agent_positions[num_agent]
-                curr_position = agent.position
-                # Agents and bombs can only share a square if they are both in their
-                # original position (Agent dropped bomb and has not moved)
-                if desired_position != curr_position and \
-                      (agent_occupancy[desired_position] > 1 or bomb_occupancy[desired_position] != 0):
-                    # Late collisions resulting from failed kicks force this agent to stay at the
-                    # original position. Check if this agent successfully kicked a bomb above and undo
-                    # the kick.
-                    if num_agent in kicked_bomb_indexed_by_agent:
-                        num_bomb = kicked_bomb_indexed_by_agent[num_agent]
-                        bomb = curr_bombs[num_bomb]
-                        desired_bomb_positions[num_bomb] = bomb.position
-                        bomb_occupancy[bomb.position] += 1
-                        del agent_indexed_by_kicked_bomb[num_bomb]
-                        del kicked_bomb_indexed_by_agent[num_agent]
-                    desired_agent_positions[num_agent] = curr_position
-                    agent_occupancy[curr_position] += 1
-                    change = True
-
-            for num_bomb, bomb in enumerate(curr_bombs):
-                desired_position = desired_bomb_positions[num_bomb]
-                curr_position = bomb.position
-
-                # This bomb may be a boomerang, i.e. it was kicked back to the
-                # original location it moved from. If it is blocked now, it
-                # can't be kicked and the agent needs to move back to stay
-                # consistent with other movements.
-                if desired_position == curr_position and num_bomb not in agent_indexed_by_kicked_bomb:
-                    continue
-
-                bomb_occupancy_ = bomb_occupancy[desired_position]
-                agent_occupancy_ = agent_occupancy[desired_position]
-                # Agents and bombs can only share a square if they are both in their
-                # original position (Agent dropped bomb and has not moved)
-                if bomb_occupancy_ > 1 or agent_occupancy_ != 0:
-                    desired_bomb_positions[num_bomb] = curr_position
-                    bomb_occupancy[curr_position] += 1
-                    num_agent = agent_indexed_by_kicked_bomb.get(num_bomb)
-                    if num_agent is not None:
-                        agent = alive_agents[num_agent]
-                        desired_agent_positions[num_agent] = agent.position
-                        agent_occupancy[agent.position] += 1
-                        del kicked_bomb_indexed_by_agent[num_agent]
-                        del agent_indexed_by_kicked_bomb[num_bomb]
-                    change = True
+        # Resolve switches, collisions and kicks on flat cells.
+        agent_cells = collisions.flat_cells(
+            [agent.position for agent in alive_agents], board_size)
+        agent_desired = collisions.flat_cells(desired_agent_positions,
+                                              board_size)
+        bomb_cells = collisions.flat_cells(
+            [bomb.position for bomb in curr_bombs], board_size)
+        bomb_desired = collisions.flat_cells(desired_bomb_positions,
+                                             board_size)
+        kicked = collisions.resolve_collisions(
+            curr_board, agent_cells, agent_desired,
+            [agent.can_kick for agent in alive_agents],
+            [actions[agent.agent_id] for agent in alive_agents], bomb_cells,
+            bomb_desired)
 
         for num_bomb, bomb in enumerate(curr_bombs):
-            if desired_bomb_positions[num_bomb] == bomb.position and \
-               not num_bomb in agent_indexed_by_kicked_bomb:
+            if num_bomb in kicked:
+                bomb.moving_direction = constants.Action(
+                    actions[alive_agents[kicked[num_bomb]].agent_id])
+                bomb.position = divmod(bomb_desired[num_bomb], board_size)
+            elif bomb_desired[num_bomb] == bomb_cells[num_bomb]:
                 # Bomb was not kicked this turn and its desired position is its
                 # current location. Stop it just in case it was moving before.
                 bomb.stop()
             else:
                 # Move bomb to the new position.
-                # NOTE: We already set the moving direction up above.
-                bomb.position = desired_bomb_positions[num_bomb]
+                bomb.position = divmod(bomb_desired[num_bomb], board_size)
 
         for num_agent, agent in enumerate(alive_agents):
-            if desired_agent_positions[num_agent] != agent.position:
+            if agent_desired[num_agent] != agent_cells[num_agent]:
                 agent.move(actions[agent.agent_id])
                 if utility.position_is_powerup(curr_board, agent.position):
                     agent.pick_up(
@@ -427,43 +287,21 @@ class ForwardModel(object):
                         max_blast_strength=max_blast_strength)
 
         # Explode bombs.
-        exploded_map = np.zeros_like(curr_board)
-        has_new_explosions = False
-
         for bomb in curr_bombs:
             bomb.tick()
-            if bomb.exploded():
-                has_new_explosions = True
-            elif curr_board[bomb.position] == constants.Item.Flames.value:
+            if not bomb.exploded() and \
+               curr_board[bomb.position] == constants.Item.Flames.value:
                 bomb.fire()
-                has_new_explosions = True
 
         # Chain the explosions.
-        while has_new_explosions:
-            next_bombs = []
-            has_new_explosions = False
-            for bomb in curr_bombs:
-                if not bomb.exploded():
-                    next_bombs.append(bomb)
-                    continue
-
+        exploded_map = blast.chain_explosions(curr_board, curr_bombs)
+        next_bombs = []
+        for bomb in curr_bombs:
+            if bomb.exploded():
                 bomb.bomber.incr_ammo()
-                for _, indices in bomb.explode().items():
-                    for r, c in indices:
-                        if not all(
-                            [r >= 0, c >= 0, r < board_size, c < board_size]):
-                            break
-                        if curr_board[r][c] == constants.Item.Rigid.value:
-                            break
-                        exploded_map[r][c] = 1
-                        if curr_board[r][c] == constants.Item.Wood.value:
-                            break
-
-            curr_bombs = next_bombs
-            for bomb in curr_bombs:
-                if bomb.in_range(exploded_map):
-                    bomb.fire()
-                    has_new_explosions = True
+            else:
+                next_bombs.append(bomb)
+        curr_bombs = next_bombs
 
         # Update the board's bombs.
         for bomb in curr_bombs:
@@ -483,38 +321,222 @@ class ForwardModel(object):
             else:
                 curr_board[agent.position] = utility.agent_value(agent.agent_id)
 
+        if bomb_life is not None:
+            ForwardModel.update_bomb_maps(old_bomb_positions, curr_bombs,
+                                          bomb_life, bomb_blast_strength)
         return curr_board, curr_agents, curr_bombs, curr_items, curr_flames
 
+    @staticmethod
+    def make_bomb_maps(board_size, bombs):
+        '''Makes arrays of the bombs' blast strengths and lives over the board'''
+        blast_strengths = np.zeros((board_size, board_size))
+        life = np.zeros((board_size, board_size))
+        for bomb in bombs:
+            blast_strengths[bomb.position] = bomb.blast_strength
+            life[bomb.position] = bomb.life
+        return blast_strengths, life
+
+    @staticmethod
+    def update_bomb_maps(old_positions, bombs, bomb_life,
+                         bomb_blast_strength):
+        """Moves the bomb maps in place from old_positions to the bombs.
+
+        Bombs are laid, moved, ticked and exploded within a step, so it is
+        enough to clear the cells where the bombs were and to write the bombs
+        where they are now.
+        """
+        for position in old_positions:
+            bomb_life[position] = 0
+            bomb_blast_strength[position] = 0
+        for bomb in bombs:
+            bomb_life[bomb.position] = bomb.life
+            bomb_blast_strength[bomb.position] = bomb.blast_strength
+
+    @staticmethod
+    def step_state(actions, state, max_blast_strength=10):
+        """Runs step on a GameState instead of per-entity objects.
+
+        The state is advanced in place with the vectorized rules of the
+        BatchedForwardModel. Prefer batching many states there when possible.
+
+        Args:
+          actions: The actions of the agents, indexed by agent_id.
+          state: A single game GameState.
+          max_blast_strength: The cap for picked up IncrRange powerups.
+
+        Returns:
+          The state.
+        """
+        # Grow the bomb table first so that the batched view shares it.
+        state.reserve_bombs(state.num_agents)
+        batched_forward_model.BatchedForwardModel(
+            state=state.batched(),
+            max_blast_strength=max_blast_strength).step([actions])
+        return state
+
+    def set_state(self, board, agents, bombs, items, flames,
+                  max_blast_strength=10):
+        """Binds a game state for apply and undo.
+
+        The state is used in place, not copied. Its Zobrist hash is kept up
+        to date by apply and undo.
+        """
+        self._board = board
+        self._agents = agents
+        self._bombs = bombs
+        self._items = items
+        self._flames = flames
+        self._max_blast_strength = max_blast_strength
+        self._zobrist = zobrist.get_zobrist(len(board))
+        self._hash = self._zobrist.hash_state(board, agents, bombs, flames)
+        self._bomb_blast_strength, self._bomb_life = self.make_bomb_maps(
+            len(board), bombs)
+
+    def get_state(self):
+        """Returns the bound board, agents, bombs, items and flames."""
+        return self._board, self._agents, self._bombs, self._items, \
+            self._flames
+
+    def get_hash(self):
+        """Returns the Zobrist hash of the bound state."""
+        return self._hash
+
+    def get_bomb_maps(self):
+        """Returns the bomb blast strength and life maps of the bound state.
+
+        These are kept up to date by apply and undo. Don't write to them.
+        """
+        return self._bomb_blast_strength, self._bomb_life
+
+    def apply(self, actions):
+        """Runs step on the bound state and records how to take it back.
+
+        Only the board cells and the entities that changed are recorded, so
+        searchers can go down and back up the tree without copying states.
+
+        Args:
+          actions: The actions of the agents, indexed by agent_id.
+
+        Returns:
+          An UndoRecord to pass to undo. Records must be undone in the reverse
+          order of the applies that made them.
+        """
+        record = UndoRecord()
+        record.hash = self._hash
+        board = self._board
+        old_board = board.copy()
+
+        old_agents = [(agent.position, agent.ammo, agent.is_alive,
+                       agent.blast_strength, agent.can_kick)
+                      for agent in self._agents]
+        record.bombs = list(self._bombs)
+        record.bomb_states = [(bomb.position, bomb.life, bomb.moving_direction)
+                              for bomb in self._bombs]
+        record.flames = self._flames
+        record.flame_lives = [flame._life for flame in self._flames]
+        # Dying flames reveal, and so remove, the items under them.
+        for flame in self._flames:
+            if flame.is_dead() and flame.position in self._items:
+                record.items[flame.position] = self._items[flame.position]
+
+        self._board, self._agents, self._bombs, self._items, self._flames = \
+            self.step(actions, board, self._agents, self._bombs, self._items,
+                      self._flames, self._max_blast_strength,
+                      self._bomb_life, self._bomb_blast_strength)
+
+        record.cells = np.nonzero(self._board != old_board)
+        record.values = old_board[record.cells]
+        for agent, old_agent in zip(self._agents, old_agents):
+            if old_agent != (agent.position, agent.ammo, agent.is_alive,
+                             agent.blast_strength, agent.can_kick):
+                record.agents.append((agent, old_agent))
+        self._update_hash(record)
+        return record
+
+    def _update_hash(self, record):
+        """XORs out the features that apply changed and XORs in the new ones.
+
+        Bombs and flames tick on every step, so their keys are all redone.
+        """
+        keys = self._zobrist
+        ret = record.hash ^ keys.hash_cells(record.cells, record.values) ^ \
+            keys.hash_cells(record.cells, self._board[record.cells])
+        for agent, (position, ammo, is_alive, blast_strength, can_kick) in \
+                record.agents:
+            ret ^= keys.hash_agent(agent.agent_id, position, is_alive, ammo,
+                                   blast_strength, can_kick)
+            ret ^= keys.hash_agent(agent.agent_id, agent.position,
+                                   agent.is_alive, agent.ammo,
+                                   agent.blast_strength, agent.can_kick)
+        for bomb, (position, life, moving_direction) in zip(
+                record.bombs, record.bomb_states):
+            ret ^= keys.hash_bomb(position, life, bomb.blast_strength,
+                                  moving_direction)
+        for bomb in self._bombs:
+            ret ^= keys.hash_bomb(bomb.position, bomb.life,
+                                  bomb.blast_strength, bomb.moving_direction)
+        for flame, life in zip(record.flames, record.flame_lives):
+            ret ^= keys.hash_flame(flame.position, life)
+        for flame in self._flames:
+            ret ^= keys.hash_flame(flame.position, flame._life)
+        self._hash = ret
+
+    def undo(self, record):
+        """Reverts the bound state to before the apply that made record."""
+        self._board[record.cells] = record.values
+        for agent, (position, ammo, is_alive, blast_strength, can_kick) in \
+                record.agents:
+            agent.set_start_position(position)
+            agent.reset(ammo, is_alive, blast_strength, can_kick)
+        bomb_positions = [bomb.position for bomb in self._bombs]
+        for bomb, (position, life, moving_direction) in zip(
+                record.bombs, record.bomb_states):
+            bomb.position = position
+            bomb.life = life
+            bomb.moving_direction = moving_direction
+        self._bombs = record.bombs
+        self.update_bomb_maps(bomb_positions, self._bombs, self._bomb_life,
+                              self._bomb_blast_strength)
+        for flame, life in zip(record.flames, record.flame_lives):
+            flame._life = life
+        self._flames = record.flames
+        self._items.update(record.items)
+        self._hash = record.hash
+
     def get_observations(self, curr_board, agents, bombs,
                          is_partially_observable, agent_view_size, 
-                         game_type, game_env):
+                         game_type, game_env, bomb_blast_strength=None,
+                         bomb_life=None):
         """Gets the observations as an np.array of the visible squares.
 
         The agent gets to choose whether it wants to keep the fogged part in
         memory.
+
+        If the caller keeps the bomb maps up to date, e.g. with step, then it
+        can pass them in instead of having them rebuilt from the bombs. Fully
+        observing agents then get read only views of them, so the caller has
+        to copy the maps before it writes to them again, e.g. in the next
+        step.
+
+        Partially observing agents get fog.LazyObservations, which only fog
+        their grids when they are read. Dead agents see nothing and share
+        the same read only grids.
         """
         board_size = len(curr_board)
-
-        def make_bomb_maps(position):
-            ''' Makes an array of an agents bombs and the bombs attributes '''
-            blast_strengths = np.zeros((board_size, board_size))
-            life = np.zeros((board_size, board_size))
-
-            for bomb in bombs:
-                x, y = bomb.position
-                if not is_partially_observable \
-                   or in_view_range(position, x, y):
-                    blast_strengths[(x, y)] = bomb.blast_strength
-                    life[(x, y)] = bomb.life
-            return blast_strengths, life
-
-        def in_view_range(position, v_row, v_col):
-            '''Checks to see if a tile is in an agents viewing area'''
-            row, col = position
-            return all([
-                row >= v_row - agent_view_size, row <= v_row + agent_view_size,
-                col >= v_col - agent_view_size, col <= v_col + agent_view_size
-            ])
+        if bomb_life is None:
+            blast_strengths, life = ForwardModel.make_bomb_maps(board_size,
+                                                                bombs)
+            shared_maps = None
+        else:
+            blast_strengths, life = bomb_blast_strength, bomb_life
+            shared_maps = fog.read_only(blast_strengths), fog.read_only(life)
+        if is_partially_observable:
+            # The lazy observations are fogged from these after the board and
+            # the bomb maps may have changed, so they need copies of them.
+            grids = [('board', curr_board.copy(), constants.Item.Fog.value),
+                     ('bomb_blast_strength', blast_strengths.copy()
+                      if shared_maps else blast_strengths, 0),
+                     ('bomb_life', life.copy() if shared_maps else life, 0)]
 
         attrs = [
             'position', 'blast_strength', 'can_kick', 'teammate', 'ammo',
@@ -528,24 +550,34 @@ class ForwardModel(object):
 
         observations = []
         for agent in agents:
-            agent_obs = {'alive': alive_agents}
-            board = curr_board
-            if is_partially_observable:
-                board = board.copy()
-                for row in range(board_size):
-                    for col in range(board_size):
-                        if not in_view_range(agent.position, row, col):
-                            board[row, col] = constants.Item.Fog.value
-            agent_obs['board'] = board
-            bomb_blast_strengths, bomb_life = make_bomb_maps(agent.position)
-            agent_obs['bomb_blast_strength'] = bomb_blast_strengths
-            agent_obs['bomb_life'] = bomb_life
+            # Read the attributes off the character instead of going through
+            # the __getattr__ of the agent for each of them.
+            character = getattr(agent, '_character', agent)
+            if not character.is_alive:
+                agent_obs = {'alive': alive_agents}
+                agent_obs['board'], agent_obs['bomb_blast_strength'], \
+                    agent_obs['bomb_life'] = fog.unseen(board_size)
+            elif is_partially_observable:
+                window = fog.view_window(character.position, board_size,
+                                         agent_view_size)
+                agent_obs = fog.LazyObservation(
+                    window, {key: (grid, fog_value)
+                             for key, grid, fog_value in grids},
+                    alive=alive_agents)
+            else:
+                agent_obs = {'alive': alive_agents}
+                agent_obs['board'] = curr_board
+                if shared_maps is None:
+                    agent_obs['bomb_blast_strength'] = blast_strengths.copy()
+                    agent_obs['bomb_life'] = life.copy()
+                else:
+                    agent_obs['bomb_blast_strength'], \
+                        agent_obs['bomb_life'] = shared_maps
             agent_obs['game_type'] = game_type.value
             agent_obs['game_env'] = game_env
 
             for attr in attrs:
-                assert hasattr(agent, attr)
-                agent_obs[attr] = getattr(agent, attr)
+                agent_obs[attr] = getattr(character, attr)
             observations.append(agent_obs)
 
         return observations
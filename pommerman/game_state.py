@@ -0,0 +1,314 @@
+'''Compact struct-of-arrays container for the state of a game.
+
+A GameState keeps everything ForwardModel.step needs in a handful of
+preallocated numpy arrays instead of Bomber, Bomb and Flame objects:
+
+  - board, items and flames grids. items holds the hidden item under each
+    cell (0 for none). flames is a bitmask where bit k means "a flame with k
+    ticks of life left".
+  - agent arrays indexed by agent_id.
+  - an ordered, fixed capacity bomb table. Only the first num_bombs rows are
+    in use and they are kept in the order of the scalar bomb list.
+
+Every array may carry leading batch dimensions, which is how the
+BatchedForwardModel holds many games at once. Copying a state is a few
+ndarray.copy() calls.
+'''
+import json
+
+import numpy as np
+
+from . import characters
+from . import constants
+
+MAX_AMMO = 10
+
+BOARD_FIELDS = ('board', 'items', 'flames')
+AGENT_FIELDS = ('agent_position', 'agent_alive', 'agent_ammo',
+                'agent_blast_strength', 'agent_can_kick')
+BOMB_FIELDS = ('bomb_position', 'bomb_life', 'bomb_blast_strength',
+               'bomb_moving_direction', 'bomb_bomber')
+FIELDS = BOARD_FIELDS + AGENT_FIELDS + BOMB_FIELDS + ('num_bombs',
+                                                      'step_count')
+
+
+class GameState(object):
+    """Container for the arrays making up one game, or a batch of games."""
+
+    __slots__ = FIELDS
+
+    def __init__(self,
+                 board_size=constants.BOARD_SIZE,
+                 num_agents=4,
+                 max_bombs=None,
+                 batch_shape=()):
+        batch_shape = tuple(batch_shape)
+        max_bombs = max_bombs or num_agents * MAX_AMMO
+
+        shape = batch_shape + (board_size, board_size)
+        self.board = np.zeros(shape, dtype=np.uint8)
+        self.items = np.zeros(shape, dtype=np.uint8)
+        self.flames = np.zeros(shape, dtype=np.uint8)
+
+        shape = batch_shape + (num_agents,)
+        self.agent_position = np.zeros(shape + (2,), dtype=np.int64)
+        self.agent_alive = np.zeros(shape, dtype=bool)
+        self.agent_ammo = np.zeros(shape, dtype=np.int64)
+        self.agent_blast_strength = np.zeros(shape, dtype=np.int64)
+        self.agent_can_kick = np.zeros(shape, dtype=bool)
+
+        shape = batch_shape + (max_bombs,)
+        self.bomb_position = np.zeros(shape + (2,), dtype=np.int64)
+        self.bomb_life = np.zeros(shape, dtype=np.int64)
+        self.bomb_blast_strength = np.zeros(shape, dtype=np.int64)
+        self.bomb_moving_direction = np.zeros(shape, dtype=np.int64)
+        self.bomb_bomber = np.full(shape, -1, dtype=np.int64)
+
+        self.num_bombs = np.zeros(batch_shape, dtype=np.int64)
+        self.step_count = np.zeros(batch_shape, dtype=np.int64)
+
+    @property
+    def board_size(self):
+        return self.board.shape[-1]
+
+    @property
+    def num_agents(self):
+        return self.agent_alive.shape[-1]
+
+    @property
+    def max_bombs(self):
+        return self.bomb_life.shape[-1]
+
+    @property
+    def batch_shape(self):
+        return self.num_bombs.shape
+
+    @classmethod
+    def _from_arrays(cls, arrays):
+        state = cls.__new__(cls)
+        for field, array in zip(FIELDS, arrays):
+            setattr(state, field, array)
+        return state
+
+    def copy(self):
+        '''Returns a deep copy of this state'''
+        return self._from_arrays(
+            [getattr(self, field).copy() for field in FIELDS])
+
+    def batched(self):
+        '''Returns a view of this state with one more leading batch axis'''
+        return self._from_arrays(
+            [getattr(self, field)[None] for field in FIELDS])
+
+    def game(self, index):
+        '''Returns a view of one game of a batched state'''
+        return self._from_arrays(
+            [getattr(self, field)[index, ...] for field in FIELDS])
+
+    def reserve_bombs(self, num_new):
+        '''Grows the bomb table if num_new more bombs may not fit.
+
+        Growing reallocates the bomb arrays, so views made by batched() or
+        game() before the call no longer share them.
+        '''
+        max_bombs = self.max_bombs
+        needed = int(self.num_bombs.max()) + num_new
+        if needed <= max_bombs:
+            return
+        max_bombs_ = max(needed, 2 * max_bombs)
+        for field in BOMB_FIELDS:
+            array = getattr(self, field)
+            shape = list(array.shape)
+            shape[len(self.batch_shape)] = max_bombs_
+            grown = np.full(shape, -1 if field == 'bomb_bomber' else 0,
+                            dtype=array.dtype)
+            grown[(slice(None),) * len(self.batch_shape) +
+                  (slice(max_bombs),)] = array
+            setattr(self, field, grown)
+
+    @classmethod
+    def from_objects(cls, board, agents, bombs, items, flames, step_count=0):
+        """Makes a state from the ForwardModel representation.
+
+        Args:
+          board: The board array.
+          agents: The agent characters. They are indexed by agent_id.
+          bombs: The list of characters.Bomb.
+          items: The dict of hidden items by position.
+          flames: The list of characters.Flame.
+          step_count: The step count.
+        """
+        max_bombs = max(len(agents) * MAX_AMMO, len(bombs))
+        state = cls(len(board), len(agents), max_bombs)
+        state.set_objects(board, agents, bombs, items, flames, step_count)
+        return state
+
+    def set_objects(self, board, agents, bombs, items, flames, step_count=0):
+        '''Overwrites this single game with the ForwardModel representation'''
+        self.board[...] = board
+        self.items[...] = 0
+        for position, value in items.items():
+            self.items[position] = value
+        self.flames[...] = 0
+        for flame in flames:
+            self.flames[flame.position] |= 1 << flame._life
+
+        for agent in agents:
+            agent_id = agent.agent_id
+            self.agent_position[agent_id] = agent.position
+            self.agent_alive[agent_id] = agent.is_alive
+            self.agent_ammo[agent_id] = agent.ammo
+            self.agent_blast_strength[agent_id] = agent.blast_strength
+            self.agent_can_kick[agent_id] = agent.can_kick
+
+        assert len(bombs) <= self.max_bombs, "Bomb table is full."
+        self.num_bombs[...] = len(bombs)
+        for num, bomb in enumerate(bombs):
+            bomber_id = getattr(bomb.bomber, 'agent_id', None)
+            if bomber_id is None or not 0 <= bomber_id < self.num_agents:
+                bomber_id = -1
+            direction = bomb.moving_direction
+            self.bomb_position[num] = bomb.position
+            self.bomb_life[num] = bomb.life
+            self.bomb_blast_strength[num] = bomb.blast_strength
+            self.bomb_moving_direction[num] = \
+                0 if direction is None else constants.Action(direction).value
+            self.bomb_bomber[num] = bomber_id
+        self.step_count[...] = step_count
+
+    def to_objects(self, agents=None):
+        """Exports this single game to the ForwardModel representation.
+
+        Args:
+          agents: Optional agents, indexed by agent_id, which are reset to
+            this state and used as bombers. If None, new characters.Bomber
+            are made.
+
+        Returns:
+          board, agents, bombs, items, flames as used by ForwardModel.step.
+        """
+        if agents is None:
+            agents = [characters.Bomber(agent_id)
+                      for agent_id in range(self.num_agents)]
+        for agent in agents:
+            agent_id = agent.agent_id
+            agent.set_start_position(
+                tuple(int(x) for x in self.agent_position[agent_id]))
+            agent.reset(
+                int(self.agent_ammo[agent_id]),
+                bool(self.agent_alive[agent_id]),
+                int(self.agent_blast_strength[agent_id]),
+                bool(self.agent_can_kick[agent_id]))
+
+        dummy_bomber = characters.Bomber()
+        dummy_bomber.agent_id = -1
+        bombs = []
+        for num in range(int(self.num_bombs)):
+            bomber_id = self.bomb_bomber[num]
+            direction = self.bomb_moving_direction[num]
+            bombs.append(
+                characters.Bomb(
+                    agents[bomber_id] if bomber_id >= 0 else dummy_bomber,
+                    tuple(int(x) for x in self.bomb_position[num]),
+                    int(self.bomb_life[num]),
+                    int(self.bomb_blast_strength[num]),
+                    constants.Action(direction) if direction else None))
+
+        items = {}
+        for row, col in zip(*np.where(self.items)):
+            items[(int(row), int(col))] = int(self.items[row, col])
+
+        # Older flames have less life left and come first, which mirrors the
+        # order in which ForwardModel.step appends them.
+        flames = []
+        for life in range(8):
+            for row, col in zip(*np.where(self.flames & (1 << life))):
+                flames.append(characters.Flame((int(row), int(col)), life))
+
+        return self.board.copy(), agents, bombs, items, flames
+
+    def to_json_info(self):
+        """Returns this single game as the values of Pomme.get_json_info.
+
+        The values are not yet encoded as JSON strings.
+        """
+        agents = []
+        for agent_id in range(self.num_agents):
+            agents.append({
+                "agent_id": agent_id,
+                "is_alive": bool(self.agent_alive[agent_id]),
+                "position": self.agent_position[agent_id].tolist(),
+                "ammo": int(self.agent_ammo[agent_id]),
+                "blast_strength": int(self.agent_blast_strength[agent_id]),
+                "can_kick": bool(self.agent_can_kick[agent_id])
+            })
+
+        bombs = []
+        for num in range(int(self.num_bombs)):
+            direction = int(self.bomb_moving_direction[num])
+            bombs.append({
+                "position": self.bomb_position[num].tolist(),
+                "bomber_id": int(self.bomb_bomber[num]),
+                "life": int(self.bomb_life[num]),
+                "blast_strength": int(self.bomb_blast_strength[num]),
+                "moving_direction": direction or None
+            })
+
+        flames = []
+        for life in range(8):
+            for row, col in zip(*np.where(self.flames & (1 << life))):
+                flames.append({"position": [int(row), int(col)], "life": life})
+
+        items = [[[int(row), int(col)], int(self.items[row, col])]
+                 for row, col in zip(*np.where(self.items))]
+
+        return {
+            'board_size': self.board_size,
+            'step_count': int(self.step_count),
+            'board': self.board.tolist(),
+            'agents': agents,
+            'bombs': bombs,
+            'flames': flames,
+            'items': items,
+        }
+
+    @classmethod
+    def from_json_info(cls, info):
+        """Makes a state from the JSON values of Pomme.get_json_info.
+
+        Args:
+          info: A dict whose values are either JSON strings, as in
+            get_json_info and recorded game states, or the decoded values.
+        """
+        def load(key):
+            value = info[key]
+            return json.loads(value) if isinstance(value, str) else value
+
+        board = np.array(load('board'), dtype=np.uint8)
+        agents = load('agents')
+        bombs = load('bombs')
+        state = cls(len(board), len(agents),
+                    max(len(agents) * MAX_AMMO, len(bombs)))
+        state.board[...] = board
+        state.step_count[...] = int(load('step_count'))
+        for position, value in load('items'):
+            state.items[tuple(position)] = value
+        for flame in load('flames'):
+            state.flames[tuple(flame['position'])] |= 1 << flame['life']
+
+        for agent in agents:
+            agent_id = agent['agent_id']
+            state.agent_position[agent_id] = agent['position']
+            state.agent_alive[agent_id] = bool(agent['is_alive'])
+            state.agent_ammo[agent_id] = int(agent['ammo'])
+            state.agent_blast_strength[agent_id] = int(agent['blast_strength'])
+            state.agent_can_kick[agent_id] = bool(agent['can_kick'])
+
+        state.num_bombs[...] = len(bombs)
+        for num, bomb in enumerate(bombs):
+            state.bomb_position[num] = bomb['position']
+            state.bomb_life[num] = int(bomb['life'])
+            state.bomb_blast_strength[num] = int(bomb['blast_strength'])
+            state.bomb_moving_direction[num] = bomb['moving_direction'] or 0
+            state.bomb_bomber[num] = bomb['bomber_id']
+        return state
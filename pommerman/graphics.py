@@ -32,6 +32,7 @@ except ImportError as error:
     print("Import error GL! You will not be able to render --> %s" % error)
 
 from . import constants
+from . import fog
 from . import utility
 
 __location__ = os.path.dirname(os.path.realpath(__file__))
@@ -193,17 +194,14 @@ class PixelViewer(Viewer):
         frames.append(all_frame)
 
         for agent in agents:
-            row, col = agent.position
-            my_frame = all_frame.copy()
-            for r in range(board_size):
-                for c in range(board_size):
-                    if is_partially_observable and not all([
-                            row >= r - agent_view_size, row <
-                            r + agent_view_size, col >= c - agent_view_size,
-                            col < c + agent_view_size
-                    ]):
-                        my_frame[r, c] = constants.ITEM_COLORS[
-                            constants.Item.Fog.value]
+            if is_partially_observable:
+                window = fog.view_window(agent.position, board_size,
+                                         agent_view_size)
+                my_frame = fog.fog(
+                    all_frame, window,
+                    constants.ITEM_COLORS[constants.Item.Fog.value])
+            else:
+                my_frame = all_frame.copy()
             frames.append(my_frame)
 
         return frames
@@ -309,20 +307,10 @@ class PommeViewer(Viewer):
         if not self._is_partially_observable:
             return self._board_state
 
-        agent_view_size = self._agent_view_size
-        state = self._board_state.copy()
-        fog_value = self._resource_manager.fog_value()
-        row, col = agent.position
-
-        for r in range(self._board_size):
-            for c in range(self._board_size):
-                if self._is_partially_observable and not all([
-                        row >= r - agent_view_size, row <= r + agent_view_size,
-                        col >= c - agent_view_size, col <= c + agent_view_size
-                ]):
-                    state[r][c] = fog_value
-
-        return state
+        window = fog.view_window(agent.position, self._board_size,
+                                 self._agent_view_size)
+        return fog.fog(self._board_state, window,
+                       self._resource_manager.fog_value())
 
     def render_background(self):
         image_pattern = pyglet.image.SolidColorImagePattern(
@@ -13,7 +13,7 @@ def make_agent_from_string(agent_string, agent_id, docker_env_dict=None):
     
     agent_type, agent_control = agent_string.split("::")
 
-    assert agent_type in ["player", "simple", "random", "ignore", "simpleTeam", "simpleTeam2", "mcts", "mcts_avg", "mcts_minmax", "docker",
+    assert agent_type in ["player", "simple", "random", "ignore", "simpleTeam", "simpleTeam2", "mcts", "mcts_compact", "mcts_avg", "mcts_minmax", "docker",
                           "http", "test", "tensorforce"]
 
     agent_instance = None
@@ -32,6 +32,8 @@ def make_agent_from_string(agent_string, agent_id, docker_env_dict=None):
         agent_instance = agents.SimpleTeamAgent2()
     elif agent_type == "mcts":
         agent_instance = agents.HeuristicAgent()
+    elif agent_type == "mcts_compact":
+        agent_instance = agents.HeuristicAgent(compact=True)
     elif agent_type == "mcts_avg":
         agent_instance = agents.HeuristicAgent(standard=False, minmax=False)
     elif agent_type == "mcts_minmax":
@@ -5,10 +5,15 @@ import collections
 import uuid
 import math
 import heapq
+import time
 
-from .simulator import Simulator  
+import numpy as np
+
+from .simulator import AGENT_VIEW_SIZE, Simulator  
 from .reward import Reward
 from .. import constants
+from .. import fog
+from .. import zobrist
 
 '''Globals'''
 STOP = constants.Action.Stop
@@ -24,6 +29,12 @@ ACTIONS = [
 SCALAR=1/math.sqrt(2.0)
 
 
+def isPastDeadline(deadline):
+    '''Whether the time.monotonic() deadline of a search has passed. A
+    deadline of None never does.'''
+    return deadline is not None and time.monotonic() >= deadline
+
+
 class Generator:
     '''Generator'''
     def __init__(self, generator, remains):
@@ -31,11 +42,39 @@ class Generator:
         self.remains = remains
 
 
+class TranspositionTable:
+    '''Bounded table of tree nodes keyed by state hash.
+    The least recently used node is dropped when the table is full.'''
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.nodes = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        node = self.nodes.get(key)
+        if node is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.nodes.move_to_end(key)
+        return node
+
+    def put(self, key, node):
+        self.nodes[key] = node
+        self.nodes.move_to_end(key)
+        if len(self.nodes) > self.max_size:
+            self.nodes.popitem(last=False)
+
+
 class Node:
     '''Tree Node'''
     def __init__(self, obs, parent=None, reward=0.0,
-                action_space={}, bomb_tracker={}, root_flag=False):
+                action_space={}, bomb_tracker={}, root_flag=False,
+                table=None):
         self.visits = 0
+        self.table = table
+        self.hash = None    # the Zobrist hash of obs, once it is needed
         self.uid = uuid.uuid4()
         self.isVisited = False
         self.obs = obs
@@ -89,8 +128,20 @@ class Node:
         self.max_reward = reward
     
     def getNext(self, next_obs):
+        # identical positions share one node, and so its statistics
+        key = None
+        if self.table is not None:
+            board_size = len(next_obs['board'])
+            key = (zobrist.get_zobrist(board_size).hash_obs(next_obs), self.mode)
+            node = self.table.get(key)
+            if node is not None:
+                return node
         next_reward = Reward().reward(next_obs, self.mode) or 0.0
-        return Node(next_obs, parent=self, reward=next_reward)
+        node = Node(next_obs, parent=self, reward=next_reward, table=self.table)
+        if key is not None:
+            node.hash = key[0]
+            self.table.put(key, node)
+        return node
 
     def incrementVisit(self):
         self.visits += 1
@@ -113,38 +164,125 @@ class Node:
         rewards = [x.getAggregatingReward() for x in children]
         return sum(rewards)/len(rewards) + self.reward, max(rewards) + self.reward
 
-    def _expand(self, action, computer_reward=False):
+    def _expand(self, action, computer_reward=False, deadline=None):
         """
-        Add children with specific action
+        Add children with specific action, until the deadline passes
         """
         if self.mode == constants.Mode.Explore: return
 
         next_observations = self.simulator.update(action)
         if computer_reward:
             for next_obs in next_observations:
-                child = self.getNext()
+                if isPastDeadline(deadline): return
+                child = self.getNext(next_obs)
                 self.counter -= 1
                 self.num_of_children += 1
                 self.children[action].append(child)
             return
         for next_obs in next_observations:
+            if isPastDeadline(deadline): return
             self.counter -= 1
             child = Node(next_obs, parent=self)
             self.num_of_children += 1
             self.children[action].append(child)
         
-    def expandAll(self, computer_reward=False):
+    def expandAll(self, computer_reward=False, deadline=None):
         """
-        expand all child node
+        expand all child node, until the deadline passes
         """
         for action in ACTIONS:
-            self._expand(action, computer_reward=computer_reward)
+            self._expand(action, computer_reward=computer_reward,
+                         deadline=deadline)
         return [x for l in self.children.values() for x in l]
 
     def fullyExpanded(self):
         return self.counter == 0
 
 
+def simulatedView(obs):
+    '''Returns obs as the Simulator observes it, fogged outside the view of
+    the agent'''
+    board_size = len(obs['board'])
+    window = fog.view_window(obs['position'], board_size, AGENT_VIEW_SIZE)
+    ret = dict(obs)
+    ret['board'] = fog.fog(obs['board'], window)
+    ret['bomb_life'] = fog.fog(obs['bomb_life'], window, 0)
+    ret['bomb_blast_strength'] = fog.fog(obs['bomb_blast_strength'], window, 0)
+    return ret
+
+
+def findChild(root, action, obs):
+    '''Returns the child of root that action led to and whose state has the
+    Zobrist hash of obs, else None. The states of the children are simulated
+    observations, so obs is compared as the Simulator would observe it.'''
+    keys = zobrist.get_zobrist(len(obs['board']))
+    key = keys.hash_obs(simulatedView(obs))
+    for child in root.children[action]:
+        if child.hash is None:
+            child.hash = keys.hash_obs(child.obs)
+        if child.hash == key:
+            return child
+    return None
+
+
+def pruneTable(table, root):
+    """Drops the nodes that are not under root from the table, and the links
+    of the nodes under root to them, so that they can be freed.
+
+    Returns:
+      The number of nodes under root, itself included.
+    """
+    subtree = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node in subtree:
+            continue
+        subtree.add(node)
+        stack.extend(x for l in node.children.values() for x in l)
+    if table is not None:
+        for key in [key for key, node in table.nodes.items()
+                    if node not in subtree]:
+            del table.nodes[key]
+    for node in subtree:
+        if node.parent is not None and node.parent not in subtree:
+            node.parent = None
+    root.parent = None
+    return len(subtree)
+
+
+class _ReusableTree:
+    '''The reuse of a tree of Nodes from turn to turn'''
+    def reuse(self, action, obs, deadline=None, minimax=False):
+        """Makes the node that our action led to and that matches obs the
+        root, with the statistics of the search below it, and prunes its
+        siblings.
+
+        Args:
+          action: The action we took from the root, as an int.
+          obs: Our observation after it.
+          deadline: The deadline of the next bestAction.
+          minimax: As for the next bestAction.
+
+        Returns:
+          Whether a node matched. If not, the tree is left as it was.
+        """
+        child = findChild(self.root, constants.Action(action), obs)
+        if child is None:
+            return False
+        self.root = child
+        child.root_flag = True
+        self.num_reused = pruneTable(self.table, child)
+        self.deadline = deadline
+        self.priority = []
+        self.rewards = {step: Act(step) for step in ACTIONS}
+        for step in ACTIONS:
+            if child.children[step]:
+                _agg, _ = child.updateStatus(step=step, minimax=minimax)
+                self.rewards[step].setReward(_agg)
+        return True
+
+
 class Act:
     '''self-defined object for act-reward pair'''
     def __init__(self, action):
@@ -164,15 +302,23 @@ class Act:
         return self.action
 
 
-class MCTree:
-    '''Monte-Carlo Tree'''
-    def __init__(self, obs, level=2, agent=None, turn=1000):
-        self.root = Node(obs, root_flag=True)
+class MCTree(_ReusableTree):
+    '''Monte-Carlo Tree
+
+    An anytime search: bestAction checks the deadline before every expansion
+    and returns the best action found so far once it has passed. reuse keeps
+    the subtree of the next turn.'''
+    def __init__(self, obs, level=2, agent=None, turn=1000, table_size=10000,
+                 deadline=None):
+        self.table = TranspositionTable(table_size)
+        self.root = Node(obs, root_flag=True, table=self.table)
         self.level = level
         self.best_action = random.choice(ACTIONS)
         self.agent = agent
         self.priority = []
         self.turn = turn
+        self.deadline = deadline    # time.monotonic() to stop by, or None
+        self.num_reused = 0         # the nodes kept by the last reuse
         self.rewards = {
             STOP: Act(STOP), 
             UP: Act(UP), 
@@ -190,7 +336,8 @@ class MCTree:
         '''The function to propagate the current best action back to the parent'''
         best_act = self.priority[0]
         self.best_action = random.choice([n.getAction() for n in self.priority if n.getReward()==best_act.getReward()])
-        self.agent.best_action = self.best_action.value
+        if self.agent is not None:
+            self.agent.best_action = self.best_action.value
         
     def _expand(self, curr, is_leaf=False):
         '''return the next to-be-visited node'''
@@ -248,40 +395,52 @@ class MCTree:
     def bestAction(self, minimax=False):
         '''Return best action'''
         self._initHeap()
+        if self.root.num_of_children:
+            # a reused root has the statistics of its children already
+            heapq.heapify(self.priority)
+            self._updateBestAction()
         curr = self.root
         first_step = None
         curr_turn = self.turn
-        while curr_turn:
+        while curr_turn and not isPastDeadline(self.deadline):
             '''Traverse to leaf'''
             curr = self.root
+            # nodes are shared through the table, so keep the path for backup
+            path = [curr]
             curr_level = self.level - 1 
             while curr_level: 
+                # every expansion may make a Node, which takes a while, so
+                # a late iteration stops at the node that it got to
+                if curr is not self.root and isPastDeadline(self.deadline):
+                    break
                 prev = curr
                 step, curr = self._expand(curr)
                 if not curr: break
+                path.append(curr)
                 if curr_level == self.level - 1:
                     first_step = step
                 curr_level -= 1
             
-            if curr:  
+            if not curr:
+                curr = prev
+            elif curr is self.root or not isPastDeadline(self.deadline):
                 step, leaf = self._expand(curr, is_leaf=True)
                 if leaf:
                     curr = leaf
-            else:
-                curr = prev
+                    path.append(leaf)
             
             curr.isVisited = True
             curr.incrementVisit()
             curr.setAggregatingReward(curr.getReward())    
-            curr = curr.parent
+            path.pop()
             
             '''Back propagate'''
-            while curr and curr != self.root:
+            while path and path[-1] != self.root:
+                curr = path.pop()
                 _agg, _max = curr.updateStatus(minimax=minimax)
                 curr.incrementVisit()
                 curr.setAggregatingReward(_agg)
                 curr.setMaxReward(_max)
-                curr = curr.parent
             
             '''Update best action'''
             if self.root.num_of_children:
@@ -296,14 +455,177 @@ class MCTree:
         return self.best_action.value
 
 
-class SimTree:
-    '''Just do some random play-out'''
-    def __init__(self, obs, level=2, agent=None):
-        self.root = Node(obs, root_flag=True)
+class CompactMCTree:
+    '''Monte-Carlo Tree with its nodes in flat arrays
+
+    A node is a row of the arrays visits, value_sums, parents, first_children,
+    num_children and actions, some 22 bytes instead of the Simulator, Reward,
+    generators and observation of a Node. The children of a node are made
+    lazily, all in one block of rows, the first time the search goes through
+    it, one per action. UCT picks among them with numpy ops over the block.
+
+    The states are not stored. Every iteration steps the model of the one
+    Simulator of the root down its path with apply, sampling the actions of
+    the other agents, and takes it back with undo. So a node stands for our
+    actions, whatever the others do (open loop). Its value is the mean sum of
+    the rewards of the states after its step and those below it.
+
+    Like MCTree, it is an anytime search that stops at the deadline.'''
+    # the rewards of Reward are within [0, MAX_REWARD]
+    MAX_REWARD = 100.
+
+    def __init__(self, obs, level=2, agent=None, turn=1000, capacity=1024,
+                 deadline=None):
+        self.simulator = Simulator(obs, {})
+        self.mode = Reward().decideMode(obs, None)
+        self.level = level
+        self.best_action = random.choice(ACTIONS)
+        self.agent = agent
+        self.turn = turn
+        self.deadline = deadline    # time.monotonic() to stop by, or None
+
+        self.num_nodes = 1          # the root is row 0
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.value_sums = np.zeros(capacity, dtype=np.float64)
+        self.parents = np.full(capacity, -1, dtype=np.int32)
+        self.first_children = np.full(capacity, -1, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+
+    @property
+    def capacity(self):
+        return len(self.visits)
+
+    def nbytes(self):
+        '''The bytes of the arrays of the nodes'''
+        return sum(array.nbytes for array in [
+            self.visits, self.value_sums, self.parents, self.first_children,
+            self.num_children, self.actions])
+
+    def _grow(self, capacity):
+        '''Doubles the rows until there are capacity of them'''
+        new_capacity = self.capacity
+        while new_capacity < capacity:
+            new_capacity *= 2
+        extra = new_capacity - self.capacity
+        self.visits = np.concatenate([self.visits, np.zeros(extra, np.int32)])
+        self.value_sums = np.concatenate(
+            [self.value_sums, np.zeros(extra, np.float64)])
+        self.parents = np.concatenate([self.parents, np.full(extra, -1, np.int32)])
+        self.first_children = np.concatenate(
+            [self.first_children, np.full(extra, -1, np.int32)])
+        self.num_children = np.concatenate(
+            [self.num_children, np.zeros(extra, np.int8)])
+        self.actions = np.concatenate([self.actions, np.zeros(extra, np.int8)])
+
+    def _expand(self, node):
+        '''Makes the children of node. At the root, only for the actions
+        that Simulator finds valid.'''
+        if node == 0:
+            actions = [action.value for action in ACTIONS
+                       if self.simulator.getNumOfNextObs(action)]
+        else:
+            actions = [action.value for action in ACTIONS]
+        first = self.num_nodes
+        if first + len(actions) > self.capacity:
+            self._grow(first + len(actions))
+        self.parents[first:first + len(actions)] = node
+        self.actions[first:first + len(actions)] = actions
+        self.first_children[node] = first
+        self.num_children[node] = len(actions)
+        self.num_nodes += len(actions)
+
+    def _bestChild(self, node, scalar):
+        '''UCT over the block of the children of node, unvisited ones
+        first'''
+        first = self.first_children[node]
+        children = slice(first, first + self.num_children[node])
+        visits = self.visits[children]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited):
+            return first + int(random.choice(unvisited))
+        exploit = self.value_sums[children] / visits / self.MAX_REWARD
+        explore = np.sqrt(2.0 * math.log(self.visits[node]) / visits)
+        scores = exploit + scalar * explore
+        return first + int(random.choice(np.flatnonzero(scores == scores.max())))
+
+    def _reward(self):
+        next_obs = self.simulator.observe()
+        return Reward().reward(next_obs, self.mode) or 0.0
+
+    def _iterate(self):
+        '''Runs one path down from the root and backs it up'''
+        model = self.simulator.model
+        node = 0
+        path = [node]
+        records = []
+        rewards = []
+        for _ in range(self.level):
+            if self.first_children[node] < 0:
+                self._expand(node)
+            if not self.num_children[node]:
+                break
+            node = self._bestChild(node, SCALAR)
+            path.append(node)
+            action = constants.Action(int(self.actions[node]))
+            records.append(model.apply(self.simulator.sampleActions(action)))
+            if not self.simulator.isAlive():
+                # there is nothing to gain below a state we died in
+                rewards.append(0.0)
+                break
+            rewards.append(self._reward())
+        for record in reversed(records):
+            model.undo(record)
+
+        path = np.array(path)
+        self.visits[path] += 1
+        # every node below the root gets the rewards from its step down
+        self.value_sums[path[1:]] += np.cumsum(rewards[::-1])[::-1]
+
+    def _updateBestAction(self):
+        '''The child of the root with the best mean value'''
+        first = self.first_children[0]
+        if first < 0:
+            return
+        children = slice(first, first + self.num_children[0])
+        visits = self.visits[children]
+        if not visits.any():
+            return
+        means = np.full(len(visits), -np.inf)
+        means[visits > 0] = self.value_sums[children][visits > 0] / \
+            visits[visits > 0]
+        best = first + np.flatnonzero(means == means.max())
+        self.best_action = constants.Action(int(self.actions[random.choice(best)]))
+
+    def bestAction(self):
+        '''Return best action'''
+        curr_turn = self.turn
+        while curr_turn and not isPastDeadline(self.deadline):
+            self._iterate()
+            if not self.num_children[0]:
+                break
+            curr_turn -= 1
+        self._updateBestAction()
+        if self.agent is not None:
+            self.agent.best_action = self.best_action.value
+        return self.best_action.value
+
+
+class SimTree(_ReusableTree):
+    '''Just do some random play-out
+
+    Like MCTree, it returns the best action so far once the deadline passed,
+    and can be reused on the next turn.'''
+    def __init__(self, obs, level=2, agent=None, table_size=10000,
+                 deadline=None):
+        self.table = TranspositionTable(table_size)
+        self.root = Node(obs, root_flag=True, table=self.table)
         self.level = level
         self.best_action = random.choice(ACTIONS)
         self.agent = agent
         self.priority = []
+        self.deadline = deadline    # time.monotonic() to stop by, or None
+        self.num_reused = 0         # the nodes kept by the last reuse
         self.rewards = {
             STOP: Act(STOP), 
             UP: Act(UP), 
@@ -320,56 +642,72 @@ class SimTree:
     def _updateBestAction(self):
         '''The function to propagate the current best action back to the parent'''
         self.best_action = self.priority[0].getAction()
-        self.agent.best_action = self.best_action.value
+        if self.agent is not None:
+            self.agent.best_action = self.best_action.value
         
     def _randomSelect(self, curr, is_leaf=False):
-        '''Randomly return a next node'''
-        action = random.choice(list(curr.obs_generators.keys()))
-        num_of_next_obs = curr.getNumOfNextObs4SingleAct(action)
-        while num_of_next_obs == 0:
+        """Randomly returns an action and a next node of curr.
+
+        A leaf gets a new state. Otherwise a random state of a random action
+        is picked, and a new one is made if it wasn't yet. Picks of visited
+        nodes are retried among the actions that still have an unvisited
+        child or states left.
+
+        Returns:
+          (None, None) if the deadline passed, or if curr has nothing left
+          to visit, in which case curr is marked visited.
+        """
+        for action in [a for a in curr.obs_generators
+                       if curr.getNumOfNextObs4SingleAct(a) == 0]:
             del curr.obs_generators[action]
-            if not curr.obs_generators: break
-            action = random.choice(list(curr.obs_generators.keys()))
-            num_of_next_obs = curr.getNumOfNextObs4SingleAct(action)
-        
-        if not curr.obs_generators:
-            return None, None
-        
-        if is_leaf:
-            while curr.obs_generators[action].remains == 0:
-                action = random.choice(list(curr.obs_generators.keys()))
-                num_of_next_obs = curr.getNumOfNextObs4SingleAct(action)
 
-        rdn = random.randint(0, num_of_next_obs-1)
-        if is_leaf or rdn >= len(curr.children[action]):
-            
+        while not isPastDeadline(self.deadline):
+            actions = [
+                a for a, obs_generator in curr.obs_generators.items()
+                if obs_generator.remains or not is_leaf and
+                any(not x.isVisited for x in curr.children[a])]
+            if not actions:
+                curr.isVisited = True
+                return None, None
+
+            action = random.choice(actions)
             obs_generator = curr.obs_generators[action]
-            nxt_node = curr.getNext(next(obs_generator.generator))
-            obs_generator.remains -= 1
-            curr.num_of_children += 1
-            curr.children[action].append(nxt_node)
-            return action, nxt_node 
-        else:
-            nxt_node = curr.children[action][rdn]
-            if nxt_node.isVisited:
-                return self._randomSelect(curr)
-            return action, nxt_node
+            num_of_next_obs = curr.getNumOfNextObs4SingleAct(action)
+            rdn = random.randint(0, num_of_next_obs-1)
+            if obs_generator.remains and \
+                    (is_leaf or rdn >= len(curr.children[action])):
+                nxt_node = curr.getNext(next(obs_generator.generator))
+                obs_generator.remains -= 1
+                curr.num_of_children += 1
+                curr.children[action].append(nxt_node)
+                return action, nxt_node
+            if rdn < len(curr.children[action]):
+                nxt_node = curr.children[action][rdn]
+                if not nxt_node.isVisited:
+                    return action, nxt_node
 
         return None, None
 
     def bestAction(self, minimax=False):
         '''Return best action'''
         self._initHeap()
+        if self.root.num_of_children:
+            # a reused root has the statistics of its children already
+            heapq.heapify(self.priority)
+            self._updateBestAction()
         curr = self.root
         first_step = None
-        while not self.root.isVisited:
+        while not self.root.isVisited and not isPastDeadline(self.deadline):
             '''Traverse to leaf'''
             curr = self.root
+            # nodes are shared through the table, so keep the path for backup
+            path = [curr]
             curr_level = self.level - 1 
             while curr_level: 
                 prev = curr
                 step, curr = self._randomSelect(curr)
                 if not curr: break
+                path.append(curr)
                 if curr_level == self.level - 1:
                     first_step = step
                 curr_level -= 1
@@ -378,19 +716,20 @@ class SimTree:
                 step, leaf = self._randomSelect(curr, is_leaf=True)
                 if leaf:
                     curr = leaf
+                    path.append(leaf)
             else:
                 curr = prev
             
             curr.isVisited = True
             curr.setAggregatingReward(curr.getReward())    
-            curr = curr.parent
+            path.pop()
             
             '''Back propagate'''
-            while curr and curr != self.root:
+            while path and path[-1] != self.root:
+                curr = path.pop()
                 _agg, _max = curr.updateStatus(minimax=minimax)
                 curr.setAggregatingReward(_agg)
                 curr.setMaxReward(_max)
-                curr = curr.parent
             
             '''Update best action'''
             if self.root.num_of_children:
@@ -403,23 +742,30 @@ class SimTree:
 
 
 class BFSTree:
-    '''BFS Tree'''
-    def __init__(self, obs={}, level=2):
+    '''BFS Tree
+
+    It expands the tree level by level until the deadline passes, and then
+    backpropagates the part of the tree that it has.'''
+    def __init__(self, obs={}, level=2, deadline=None):
         self.root = Node(obs, root_flag=True)
         self.level = level
         self.best_action = constants.Action.Stop
+        self.deadline = deadline    # time.monotonic() to stop by, or None
     
     def bestAction(self):
         """
         Backpropagate and return the best action
         """
-        leaves = self._buildTree()
-        root = self._backPropagate(leaves)
+        levels = self._buildTree()
+        self._backPropagate(levels)
         ave_rewards = {}
 
         for action in ACTIONS:
-            rewards = [x.aggregating_reward for x in root.children[action]]
-            ave_rewards[action] = sum(rewards)/len(rewards)
+            rewards = [x.aggregating_reward for x in self.root.children[action]]
+            if rewards:
+                ave_rewards[action] = sum(rewards)/len(rewards)
+        if not ave_rewards:
+            return self.best_action
 
         max_agg_reward = max(ave_rewards.values())
         best_actions = [k for k in ave_rewards if ave_rewards[k] == max_agg_reward]
@@ -427,39 +773,32 @@ class BFSTree:
         return random.choice(best_actions)
 
     def _buildTree(self):
-        queue = [self.root]
+        '''Returns the nodes of every level that got expanded'''
+        levels = [[self.root]]
         for _ in range(self.level):
             temp = []
-            while queue:
-                curr = queue.pop(0)
-                temp.extend(curr.expandAll(computer_reward=True))
-            queue = temp
-            # print('reward:', [n.reward for n in queue])
-
-        for node in queue:
-            node.setAggregatingReward(node.getReward())    
-        
-        return queue
-
-    def _backPropagate(self, leaves):
-        temp = []
-        while not leaves[0].isRoot():
-            parent = leaves[0].parent
-            num_of_children = parent.num_of_children
-            aggregating_rewards = []
-            
-            for _ in range(num_of_children):
-                leaf = leaves.pop(0)
-                aggregating_rewards.append(leaf.getAggregatingReward())
-            
-            parent.setAggregatingReward(sum(aggregating_rewards)/len(aggregating_rewards)+parent.reward)
-            parent.setMaxReward(max(aggregating_rewards)+parent.reward)
-            temp.append(parent)
-            
-            if not leaves:
-                leaves = temp
-                temp = []
-        return leaves[0]        
+            for curr in levels[-1]:
+                if isPastDeadline(self.deadline):
+                    break
+                temp.extend(curr.expandAll(computer_reward=True,
+                                           deadline=self.deadline))
+            if not temp:
+                break
+            levels.append(temp)
+            # print('reward:', [n.reward for n in temp])
+        return levels
+
+    def _backPropagate(self, levels):
+        '''Sets the aggregating rewards from the deepest level up'''
+        for nodes in reversed(levels):
+            for node in nodes:
+                children = [x for l in node.children.values() for x in l]
+                if not children:
+                    node.setAggregatingReward(node.getReward())
+                    continue
+                aggregating_rewards = [x.getAggregatingReward() for x in children]
+                node.setAggregatingReward(sum(aggregating_rewards)/len(aggregating_rewards)+node.reward)
+                node.setMaxReward(max(aggregating_rewards)+node.reward)
 
 
 if __name__=="__main__":
@@ -2,28 +2,23 @@ from collections import defaultdict
 import queue
 import random
 from .. import constants
+from ..agents import analysis
+from ..agents import pathing
 import numpy as np
 
 class Reward:
     def convert_bombs(self, bomb_map):
         '''Flatten outs the bomb array'''
-        ret = []
-        locations = np.where(bomb_map > 0)
-        for r, c in zip(locations[0], locations[1]):
-            ret.append({
-                'position': (r, c),
-                'blast_strength': int(bomb_map[(r, c)])
-            })
-        return ret
+        return analysis.convert_bombs(bomb_map)
     def decideMode(self, obs, action_space):
         ## switch condition and get action
-        bombs = self.convert_bombs(np.array(obs['bomb_blast_strength']))
+        bombs = analysis.bombs(obs)
         my_position = tuple(obs['position'])
         board = np.array(obs['board'])
         ammo = int(obs['ammo'])
         enemyList = [x.value for x in obs.get('enemies')]
         if self.evadeCondition(obs) == True:
-            # return evadeScore(my_position, obs['bomb_blast_strength'], obs['bomb_life'])
+            # return evadeScore(my_position, obs['bomb_blast_strength'], analysis.danger(obs))
             return constants.Mode.Evade
         elif self.attackCondition(obs) == True:
             ''' 0 stand for empty safe position;
@@ -40,16 +35,14 @@ class Reward:
         if mode == constants.Mode.Evade:
             # if self.checkSafety(obs) == False:
                 # return 0
-            return self.evadeScore(myPos, obs['bomb_blast_strength'], obs['bomb_life'])
+            return self.evadeScore(myPos, obs['bomb_blast_strength'], analysis.danger(obs))
         elif mode == constants.Mode.Attack:
             # if self.checkSafety(obs) == False:
             #     return 0
-            enemyPos = []
-            enemyList = [x.value for x in obs.get('enemies')]
-            for i in range(len(board)):
-                for j in range(len(board[0])):
-                    if board[i][j] in enemyList and self.calDistance(i, j, myPos[0], myPos[1]) <= 4:
-                        enemyPos.append(tuple((i,j)))
+            # the enemies within 4 steps, in row major order
+            enemies = pathing.item_table(obs.get('enemies'))[board]
+            near = enemies & (self._distances(myPos, board.shape) <= 4)
+            enemyPos = [(int(i), int(j)) for i, j in zip(*np.nonzero(near))]
             maxAttack = 0
             for pos in enemyPos:
                 maxAttack = max(maxAttack, self.attackScore(pos, obs))
@@ -58,7 +51,7 @@ class Reward:
     def evadeCondition(self, obs):
         bombLife = obs['bomb_life']
         pos = tuple(obs['position'])
-        bombs = self.convert_bombs(np.array(obs['bomb_blast_strength']))
+        bombs = analysis.bombs(obs)
         bombCnt = 0
         tickCnt = 0
         for bomb in bombs:
@@ -69,46 +62,27 @@ class Reward:
             return False
         return tickCnt < 5 + 2*bombCnt
 
-    def evadeScore(self, pos, bombStrength, bombLife):
-        score = 100
-        for i in range(len(bombStrength)):
-            for j in range(len(bombStrength[0])):
-                if bombStrength[i][j] > 0 and bombStrength[i][j] >= (abs(pos[0]-i) + abs(pos[1]-j)):
-                    score = score - (25 * (11 - bombLife[i][j])/10)
-        return score
+    def evadeScore(self, pos, bombStrength, danger):
+        '''danger is the danger map, of when the flames reach every cell, so
+        the bombs weigh by when they explode, set off by others or not.'''
+        bombStrength = np.asarray(bombStrength)
+        inRange = (bombStrength > 0) & (bombStrength >= self._distances(pos, bombStrength.shape))
+        return 100 - np.sum(25 * (11 - np.asarray(danger)[inRange]) / 10)
 
     def attackCondition(self, obs):
         myPos = tuple(obs['position'])
         board = np.array(obs['board'])
         ammo = int(obs['ammo'])
-        enemyList = [x.value for x in obs.get('enemies')]
         if ammo == 0: return False
-        queue = []
-        visited = {}
-        dirs = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        queue.append(myPos[0]*11+myPos[1])
-        for i in range(5):
-            size = len(queue)
-            for j in range(size):
-                cur = queue.pop(0)
-                # print("cur: ", cur)
-                visited[cur] = True
-                curRow = cur//11
-                curCol = cur%11
-                for dir in dirs:
-                    nextRow = curRow+dir[0]
-                    nextCol = curCol+dir[1]
-                    if nextRow >= 0 and nextRow < 11 and nextCol >= 0 and nextCol < 11 and (nextRow*11+nextCol) not in visited:
-                        if board[nextRow][nextCol] in enemyList:
-                            return True
-                        if board[nextRow][nextCol] == 0:
-                            queue.append(nextRow*11+nextCol)
-        # this can be improve using bfs
-        # for i in range(len(board)):
-        #     for j in range(len(board[0])):
-        #         if board[i][j] in enemyList and self.calDistance(i, j, myPos[0], myPos[1]) <= 4:
-        #             return True
-        return False
+        # Is an enemy within 5 steps through passages? Only we can be passed
+        # besides them, and the cells 6 steps away are out of range.
+        passable = pathing.item_table([constants.Item.Passage])
+        passable[board[myPos]] = True
+        paths = pathing.get_finder(len(board)).search(
+            board, myPos, 6, passable, exclude=(), random_ties=False)
+        distances = np.frombuffer(paths.distances, dtype=np.int16)
+        enemies = pathing.item_table(obs.get('enemies'))[board.ravel()]
+        return bool(np.any(enemies & (distances >= 0) & (distances <= 5)))
 
 
     def attackScore(self, pos, obs):
@@ -135,51 +109,18 @@ class Reward:
         return fillArea
 
     def calEmptySafeArea(self, pos, obs):
-        board = np.zeros((11,11), dtype=int)
-        agentList = []
-        for enemy in obs['enemies']:
-            agentList.append(enemy.value)
-        for i in range(11):
-            for j in range(11):
-                if obs['board'][i][j] == 1 or obs['board'][i][j] == 2 or obs['board'][i][j] in agentList:
-                    board[i][j] = 1
-        locations = np.where(obs['bomb_blast_strength'] > 0)
-        for r, c in zip(locations[0], locations[1]):
-            strength = obs['bomb_blast_strength'][r][c]
-            # down
-            for i in range(int(strength)):
-                if r+i < 11 and board[r+i][c] == 0:
-                    board[r+i][c] = 2
-                elif r+i < 11 and (board[r+i][c] == 1 or board[r+i][c] == 2):
-                    break
-            # up
-            for i in range(int(strength)):
-                if r-i >=0 and board[r-i][c] == 0:
-                    board[r-i][c] = 2
-                elif r-i >=0 and board[r-i][c] == 1:
-                    break
-            # right
-            for i in range(int(strength)):
-                if c+i < 11 and board[r][c+i] == 0:
-                    board[r][c+i] = 2
-                elif c+i < 11 and board[r][c+i] == 1:
-                    break
-            # left
-            for i in range(int(strength)):
-                if c-i >=0 and board[r][c-i] == 0:
-                    board[r][c-i] = 2
-                elif c-i >=0 and board[r][c-i] == 1:
-                    break
+        board = np.asarray(obs['board'])
+        blocked = pathing.item_table([constants.Item.Rigid, constants.Item.Wood] + list(obs['enemies']))[board]
+        # cells that no flames reach
+        safe = ~blocked & (analysis.danger(obs) == np.inf)
         # count emptySafeArea
-        emptySafeArea = 0
-        for i in range(5):
-            for j in range(5):
-                newR = pos[0]+i-2
-                newC = pos[1]+j-2
-                if newR >= 0 and newR < 11 and newC >= 0 and newC < 11 and self.calDistance(newR, newC, pos[0], pos[1]) <= 2:
-                    if board[newR][newC] == 0:
-                        emptySafeArea += 1
-        return emptySafeArea
+        return int(np.count_nonzero(safe & (self._distances(pos, board.shape) <= 2)))
+
+    @staticmethod
+    def _distances(pos, shape):
+        '''Manhattan distances of all the cells to pos'''
+        rows, cols = np.indices(shape)
+        return np.abs(rows - pos[0]) + np.abs(cols - pos[1])
 
     def calDistance(self, pos1R, pos1C, pos2R, pos2C):
         return abs(pos1R - pos2R) + abs(pos1C - pos2C)
@@ -1,6 +1,7 @@
 """Helpers"""
 from .. import constants
 from .. import utility
+from ..agents import analysis
 from ..characters import Bomber, Bomb, Flame
 from ..forward_model import ForwardModel
 from .. import constants
@@ -8,13 +9,23 @@ import numpy as np
 import itertools
 import random
 
+# How far the simulated observations see around the agent.
+AGENT_VIEW_SIZE = 4
+
+
 class Simulator:
     """Simulator for Monte-Carlo Tree"""
     def __init__(self, obs, blast_tracker):
         self._obs = obs
         self._myself_idx = self._get_myself_idx()
         self._blast_tracker = blast_tracker  # a tracker to track all the blast
+        self._danger = analysis.danger(obs)  # when the flames reach every cell
         self._args = self._get_args()
+        self._model = ForwardModel()
+        self._model.set_state(
+            self._args['curr_board'], self._args['curr_agents'],
+            self._args['curr_bombs'], self._args['curr_items'],
+            self._args['curr_flames'])
         self._observed_alive_agents = self._get_observed_alive_agents()
         self._random_actions = self._construct_random_actions()
 
@@ -58,28 +69,14 @@ class Simulator:
                 return utility.is_valid_direction(self._obs['board'], pos, action.value)
 
     def _isSafe(self, original_pos, action):
-        def calDistance(pos1R, pos1C, pos2R, pos2C):
-            return abs(pos1R - pos2R) + abs(pos1C - pos2C)
-
         if action == constants.Action.Bomb or not utility.is_valid_direction(self._obs['board'], original_pos, action.value):
             # if we are going to drop a bomb, the location not change
             action = constants.Action.Stop
 
         pos = utility.get_next_position(original_pos, action)
 
-
-        bomb_life = self._obs['bomb_life'].copy()
-        bomb_strength = self._obs['bomb_blast_strength'].copy()
-        for i in range(11):
-            for j in range(11):
-                # if the pos is on the flame
-                if self._obs['board'][pos] == constants.Item.Flames.value:
-                    return False
-
-                if bomb_life[i][j] == 1 and (i == pos[0] or j == pos[1]) and calDistance(pos[0], pos[1], i, j) <= bomb_strength[i][j]:
-                    return False
-
-        return True
+        # the pos is on the flame, or the flames reach it in the next step
+        return self._danger[pos] > 1
 
     def _action_combination_generator(self, own_action):
 
@@ -104,34 +101,68 @@ class Simulator:
             yield curr_actions
 
     def _filter_by_combination(self, total_action_list):
+        # whether every action of every agent is valid, looked up per tuple
+        num_agents = len(total_action_list[0]) if total_action_list else 0
+        is_valid = [[self.isActionValid(constants.Action(action), agent_id=agent_id)
+                     for action in range(6)] for agent_id in range(10, 10 + num_agents)]
         return [actions for actions in total_action_list if all(
-            self.isActionValid(constants.Action(action), agent_id=agent_id) for agent_id, action in
-            enumerate(actions, 10))]
+            is_valid[num][action] for num, action in enumerate(actions))]
 
     def _construct_random_actions(self):
+        others_action_pointer = [agent_id - 10 for agent_id in self._observed_alive_agents if
+                                 agent_id != self._myself_idx]
+
+        # the valid actions of the others are the same whatever we do
+        total_action_list = list(itertools.product(range(6), repeat=len(others_action_pointer)))
+        valid_action_list = self._filter_by_combination(total_action_list)
+
         random_actions = {}
         for action_idx in range(6):
             own_action = constants.Action(action_idx)
-            others_action_pointer = [agent_id - 10 for agent_id in self._observed_alive_agents if
-                                     agent_id != self._myself_idx]
-            actions_template = [0] * 4
-            actions_template[self._myself_idx - 10] = own_action.value
 
             # create the random order action arguments
-            total_action_list = list(itertools.product(range(6), repeat=len(others_action_pointer)))
-            random_action_list = self._filter_by_combination(total_action_list)
+            random_action_list = list(valid_action_list)
             random.shuffle(random_action_list)
 
             random_actions[own_action] = random_action_list
 
         return random_actions
 
+    def sampleActions(self, action):
+        """Returns the actions of all agents with a random valid combination
+        of the actions of the others, as for update(action)"""
+        actions = [0] * 4
+        actions[self._myself_idx - 10] = action.value
+        others_action_pointer = [agent_id - 10 for agent_id in self._observed_alive_agents if
+                                 agent_id != self._myself_idx]
+        random_action_list = self._random_actions[action]
+        if random_action_list:
+            for idx, other_action in zip(others_action_pointer, random.choice(random_action_list)):
+                actions[idx] = other_action
+        return actions
+
+    def observe(self):
+        """Returns our observation of the state of the model, e.g. after
+        stepping it with model.apply"""
+        board, agents, bombs, items, flames = self._model.get_state()
+        blast_strengths, life = self._model.get_bomb_maps()
+        simulate_obs = ForwardModel.get_observations(None, board, agents, bombs, True, AGENT_VIEW_SIZE, constants.GameType(self._obs['game_type']), self._obs['game_env'], blast_strengths, life)
+        return self._get_own_obs(simulate_obs)
+
+    @property
+    def model(self):
+        """The ForwardModel bound to the state of the observation"""
+        return self._model
+
+    def isAlive(self):
+        """Whether we are alive in the state of the model"""
+        return self._model.get_state()[1][self._myself_idx - 10].is_alive
+
     def _simulate(self, actions):
-        simulate_args = self._args.copy()
-        simulate_args['actions'] = actions
-        board, agents, bombs, items, flames = ForwardModel.step(**simulate_args)
-        simulate_obs = ForwardModel.get_observations(None, board, agents, bombs, True, 4, constants.GameType(self._obs['game_type']), self._obs['game_env'])
-        own_obs = self._get_own_obs(simulate_obs)
+        # step the shared world and take it back afterwards instead of copying it
+        record = self._model.apply(actions)
+        own_obs = self.observe()
+        self._model.undo(record)
         return own_obs
     
     def _get_args(self):
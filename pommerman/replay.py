@@ -0,0 +1,687 @@
+'''Append-only binary replays of games.
+
+A replay is a sequence of records. Each record is a one byte kind and a four
+byte length, followed by a payload of that many bytes:
+- HEADER: JSON of the config, the agents, the board size, the collapses
+  of v1 and the radio settings of v2.
+- KEYFRAME: A full state, i.e. the board, hidden items, flames, agents and
+  bombs, and the intended actions. The state after reset and then every
+  keyframe_interval-th state are keyframes.
+- DELTA: Any other state. It holds the cells of the board, items and flames
+  that changed since the previous state, the agents and bombs, and the
+  intended actions that led to the state.
+Both kinds of states also hold the last message of every agent with radio.
+- END: JSON of the result of the game and when it finished.
+
+A file may hold many games in a row, each starting with its HEADER. The
+records are encoded and written by a background thread as the game is
+played, so recording costs the game little more than a GameState per step.
+A game that was cut short still reads up to its last whole record.
+
+ReplayReader memory-maps a replay and indexes its records, so any state of
+any game is one keyframe and at most keyframe_interval - 1 deltas away.
+
+to_game_state_json converts a replay to the game_state.json of
+--record_json_dir on demand:
+python -m pommerman.cli.replay_to_json --replay=replay.pomr
+'''
+from collections import namedtuple
+from datetime import datetime
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+from . import characters
+from . import constants
+from . import game_state
+from . import utility
+from .forward_model import ForwardModel
+
+HEADER = 0
+KEYFRAME = 1
+DELTA = 2
+END = 3
+
+_RECORD = struct.Struct('<BI')
+_STEP = struct.Struct('<IBBB')
+_AGENT_DTYPE = np.dtype([('row', 'u1'), ('col', 'u1'), ('alive', 'u1'),
+                         ('ammo', 'u1'), ('blast_strength', 'u1'),
+                         ('can_kick', 'u1')])
+_BOMB_DTYPE = np.dtype([('row', 'u1'), ('col', 'u1'), ('life', 'u1'),
+                        ('blast_strength', 'u1'), ('moving_direction', 'u1'),
+                        ('bomber', 'i1')])
+_GRIDS = game_state.BOARD_FIELDS
+_INDEX_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4'), ('kind', 'u1'),
+                         ('game', '<i4'), ('frame', '<i4')])
+
+KEYFRAME_INTERVAL = 32
+
+# One recorded state: the GameState, the intended actions that led to it and,
+# with radio, the message of every agent by agent id.
+Frame = namedtuple('Frame', ['state', 'intended_actions', 'radio'])
+
+
+def _encode_actions(actions):
+    '''Returns the actions as an int16 array of [num_agents, action_size]'''
+    actions = [np.ravel(np.asarray(action, dtype=np.int64))
+               for action in actions]
+    if not actions:
+        return np.zeros((0, 0), dtype=np.int16)
+    return np.array(actions, dtype=np.int16)
+
+
+def _decode_actions(actions):
+    '''Inverse of _encode_actions, as the lists that the envs record'''
+    if actions.shape[1] == 1:
+        return [int(action) for action in actions[:, 0]]
+    return [[int(value) for value in action] for action in actions]
+
+
+def _encode_frame(frame, previous=None):
+    '''Encodes a frame in full, or as a delta against the previous state'''
+    state = frame.state
+    actions = _encode_actions(frame.intended_actions)
+    radio = np.zeros((0, 0), dtype=np.uint8) if frame.radio is None else \
+        np.array(frame.radio, dtype=np.uint8)
+    chunks = [
+        _STEP.pack(int(state.step_count), actions.shape[0], actions.shape[1],
+                   radio.shape[1] if radio.size else 0),
+        actions.tobytes(), radio.tobytes()
+    ]
+    for field in _GRIDS:
+        grid = getattr(state, field).ravel()
+        if previous is None:
+            chunks.append(grid.tobytes())
+            continue
+        cells = np.flatnonzero(grid != getattr(previous, field).ravel())
+        chunks.append(struct.pack('<H', len(cells)))
+        chunks.append(cells.astype(np.uint16).tobytes())
+        chunks.append(grid[cells].tobytes())
+
+    agents = np.zeros(state.num_agents, dtype=_AGENT_DTYPE)
+    agents['row'], agents['col'] = state.agent_position.T
+    agents['alive'] = state.agent_alive
+    agents['ammo'] = state.agent_ammo
+    agents['blast_strength'] = state.agent_blast_strength
+    agents['can_kick'] = state.agent_can_kick
+    chunks.append(agents.tobytes())
+
+    num_bombs = int(state.num_bombs)
+    bombs = np.zeros(num_bombs, dtype=_BOMB_DTYPE)
+    bombs['row'], bombs['col'] = state.bomb_position[:num_bombs].T
+    bombs['life'] = state.bomb_life[:num_bombs]
+    bombs['blast_strength'] = state.bomb_blast_strength[:num_bombs]
+    bombs['moving_direction'] = state.bomb_moving_direction[:num_bombs]
+    bombs['bomber'] = state.bomb_bomber[:num_bombs]
+    chunks.append(struct.pack('<H', num_bombs))
+    chunks.append(bombs.tobytes())
+    return b''.join(chunks)
+
+
+def _decode_frame(payload, header, previous=None):
+    '''Decodes a frame encoded by _encode_frame'''
+    board_size = header['board_size']
+    num_agents = header['num_agents']
+    step_count, num_actions, action_size, num_words = _STEP.unpack_from(
+        payload)
+    offset = _STEP.size
+
+    actions = np.frombuffer(payload, np.int16, num_actions * action_size,
+                            offset).reshape(num_actions, action_size)
+    offset += actions.nbytes
+    radio = None
+    if num_words:
+        radio = np.frombuffer(payload, np.uint8, num_agents * num_words,
+                              offset).reshape(num_agents, num_words)
+        offset += radio.nbytes
+
+    num_cells = board_size * board_size
+    grids = []
+    for field in _GRIDS:
+        if previous is None:
+            grid = np.frombuffer(payload, np.uint8, num_cells, offset)
+            offset += num_cells
+            grids.append(grid.reshape(board_size, board_size).copy())
+            continue
+        num_changed, = struct.unpack_from('<H', payload, offset)
+        offset += 2
+        cells = np.frombuffer(payload, np.uint16, num_changed, offset)
+        offset += cells.nbytes
+        values = np.frombuffer(payload, np.uint8, num_changed, offset)
+        offset += num_changed
+        grid = getattr(previous, field).copy()
+        grid.ravel()[cells] = values
+        grids.append(grid)
+
+    agents = np.frombuffer(payload, _AGENT_DTYPE, num_agents, offset)
+    offset += agents.nbytes
+    num_bombs, = struct.unpack_from('<H', payload, offset)
+    offset += 2
+    bombs = np.frombuffer(payload, _BOMB_DTYPE, num_bombs, offset)
+
+    state = game_state.GameState(
+        board_size, num_agents,
+        max(num_agents * game_state.MAX_AMMO, num_bombs))
+    state.board, state.items, state.flames = grids
+    state.agent_position[:, 0] = agents['row']
+    state.agent_position[:, 1] = agents['col']
+    state.agent_alive[:] = agents['alive']
+    state.agent_ammo[:] = agents['ammo']
+    state.agent_blast_strength[:] = agents['blast_strength']
+    state.agent_can_kick[:] = agents['can_kick']
+    state.num_bombs[...] = num_bombs
+    state.bomb_position[:num_bombs, 0] = bombs['row']
+    state.bomb_position[:num_bombs, 1] = bombs['col']
+    state.bomb_life[:num_bombs] = bombs['life']
+    state.bomb_blast_strength[:num_bombs] = bombs['blast_strength']
+    state.bomb_moving_direction[:num_bombs] = bombs['moving_direction']
+    state.bomb_bomber[:num_bombs] = bombs['bomber']
+    state.step_count[...] = step_count
+    return Frame(state, _decode_actions(actions),
+                 None if radio is None else radio.tolist())
+
+
+def _encode_record(kind, payload):
+    return _RECORD.pack(kind, len(payload)) + payload
+
+
+class ReplayWriter(object):
+    """Writes the frames of games to a replay file in a background thread.
+
+    The frames are queued as they are played. The thread encodes them and
+    appends them to the file, so the game does not wait for the disk.
+    """
+
+    def __init__(self, path, mode='wb',
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        """Opens the file and starts the writer thread.
+
+        Args:
+          path: The replay file.
+          mode: 'wb' to start a new file or 'ab' to append games to it.
+          keyframe_interval: Every how many frames to write a full state
+            instead of a delta, which bounds the cost of seeking.
+        """
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self._file = open(path, mode)
+        self._queue = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        '''Encodes and writes the queued records until close'''
+        previous = None
+        num_frames = 0
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                continue
+            kind, value = item
+            try:
+                if kind == HEADER:
+                    previous, num_frames = None, 0
+                    payload = json.dumps(value).encode()
+                elif kind == END:
+                    payload = json.dumps(value).encode()
+                else:
+                    if num_frames % self.keyframe_interval == 0:
+                        previous = None
+                    payload = _encode_frame(value, previous)
+                    kind = KEYFRAME if previous is None else DELTA
+                    previous = value.state
+                    num_frames += 1
+                self._file.write(_encode_record(kind, payload))
+            except Exception as error:  # pylint: disable=broad-except
+                self._error = error
+        self._file.close()
+
+    def begin_game(self, header):
+        """Starts a new game.
+
+        Args:
+          header: A JSON-able dict. It needs the board_size and num_agents of
+            the game.
+        """
+        self._queue.put((HEADER, header))
+
+    def write_frame(self, frame):
+        '''Queues a Frame. The first frame of a game is a keyframe'''
+        self._queue.put((KEYFRAME, frame))
+
+    def end_game(self, end):
+        '''Ends the current game with a JSON-able dict of its result'''
+        self._queue.put((END, end))
+
+    def close(self):
+        '''Writes everything that is queued and closes the file'''
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class ReplayRecorder(object):
+    """Records the games of an env to a replay file.
+
+    Call record after reset and after every step, i.e. wherever
+    Pomme.save_json would be called, and end after the game is done.
+    """
+
+    def __init__(self, path, env, config=None, agents=None, mode='wb',
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        """Opens the replay.
+
+        Args:
+          path: The replay file.
+          env: The env to record.
+          config: The id of the config of the env.
+          agents: The strings of the agents, as passed to run_battle.
+          mode: 'wb' to start a new file or 'ab' to append games to it.
+          keyframe_interval: Every how many frames to write a full state.
+        """
+        self._env = env
+        self._config = config
+        self._agents = agents
+        self._writer = ReplayWriter(path, mode, keyframe_interval)
+        self._in_game = False
+
+    def record(self):
+        '''Records the current state of the env'''
+        env = self._env
+        if not self._in_game:
+            header = {
+                'config': self._config,
+                'agents': self._agents,
+                'board_size': env._board_size,
+                'num_agents': len(env._agents),
+                'game_type': env._game_type.value,
+                'game_env': env._env,
+                'is_partially_observable': env._is_partially_observable,
+                'agent_view_size': env._agent_view_size,
+                'max_steps': env._max_steps,
+            }
+            if hasattr(env, 'collapses'):
+                header['collapses'] = list(env.collapses)
+            if hasattr(env, '_radio_from_agent'):
+                header['radio_vocab_size'] = env._radio_vocab_size
+                header['radio_num_words'] = env._radio_num_words
+            self._writer.begin_game(header)
+            self._in_game = True
+
+        radio = None
+        if hasattr(env, '_radio_from_agent'):
+            radio = [
+                env._radio_from_agent[getattr(constants.Item,
+                                              'Agent%d' % agent.agent_id)]
+                for agent in env._agents
+            ]
+        self._writer.write_frame(
+            Frame(env.get_game_state(), list(env._intended_actions), radio))
+
+    def end(self, info, finished_at=None):
+        """Ends the game.
+
+        Args:
+          info: The info of the last step, with the result and winners.
+          finished_at: When the game finished, as an ISO string. Now if None.
+        """
+        end = {
+            'finished_at': finished_at or datetime.now().isoformat(),
+            'result': {
+                'name': info['result'].name,
+                'id': info['result'].value
+            }
+        }
+        if 'winners' in info:
+            end['winners'] = [int(winner) for winner in info['winners']]
+        self._writer.end_game(end)
+        self._in_game = False
+
+    def close(self):
+        self._writer.close()
+
+
+def read_records(f):
+    '''Yields the (kind, payload) of the whole records of an open file'''
+    while True:
+        head = f.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            return
+        kind, length = _RECORD.unpack(head)
+        payload = f.read(length)
+        if len(payload) < length:
+            return
+        yield kind, payload
+
+
+def iter_games(path):
+    """Yields the games of a replay file in order.
+
+    Yields:
+      (header, frames, end) per game. frames is the list of Frames of the
+      game and end is None if the game was cut short.
+    """
+    with open(path, 'rb') as f:
+        header = frames = end = None
+        for kind, payload in read_records(f):
+            if kind == HEADER:
+                if header is not None:
+                    yield header, frames, end
+                header, frames, end = json.loads(payload.decode()), [], None
+            elif kind == END:
+                end = json.loads(payload.decode())
+            else:
+                previous = frames[-1].state if kind == DELTA else None
+                frames.append(_decode_frame(payload, header, previous))
+        if header is not None:
+            yield header, frames, end
+
+
+def frame_json_info(frame, header):
+    '''Returns a frame as the values of Pomme.get_json_info'''
+    ret = frame.state.to_json_info()
+    ret['intended_actions'] = frame.intended_actions
+    if 'collapses' in header:
+        ret['collapses'] = header['collapses']
+    if frame.radio is not None:
+        ret['radio_vocab_size'] = header['radio_vocab_size']
+        ret['radio_num_words'] = header['radio_num_words']
+        ret['_radio_from_agent'] = {
+            utility.agent_value(agent_id): message
+            for agent_id, message in enumerate(frame.radio)
+        }
+    for key, value in ret.items():
+        ret[key] = json.dumps(value, cls=utility.PommermanJSONEncoder)
+    return ret
+
+
+def to_game_state_json(header, frames, end):
+    """Returns a game as the dict of the game_state.json of run_battle.
+
+    Args:
+      header, frames, end: A game, as yielded by iter_games. The game must
+        have ended.
+    """
+    info = {'result': constants.Result(end['result']['id'])}
+    if 'winners' in end:
+        info['winners'] = end['winners']
+    return utility.game_state_json(
+        [frame_json_info(frame, header) for frame in frames],
+        header['agents'], end['finished_at'], header['config'], info)
+
+
+def index_path(path):
+    '''Returns the path of the index of a replay'''
+    return path + '.index.npy'
+
+
+def _scan(buf, index, start):
+    """Indexes the whole records of buf after those already in index.
+
+    Returns:
+      The index, with a row of (offset, length, kind, game, frame) per
+      record. offset is where the payload starts. frame is the number of the
+      state within its game, or -1 for HEADER and END records.
+    """
+    rows = []
+    game = int(index['game'][-1]) if len(index) else -1
+    frames = index['frame'][index['game'] == game] if len(index) else []
+    frame = int(max(frames)) + 1 if len(frames) else 0
+    offset = start
+    size = len(buf)
+    while offset + _RECORD.size <= size:
+        kind, length = _RECORD.unpack_from(buf, offset)
+        offset += _RECORD.size
+        if offset + length > size:
+            break
+        if kind == HEADER:
+            game += 1
+            frame = 0
+            rows.append((offset, length, kind, game, -1))
+        elif kind == END:
+            rows.append((offset, length, kind, game, -1))
+        else:
+            rows.append((offset, length, kind, game, frame))
+            frame += 1
+        offset += length
+    if not rows:
+        return index
+    return np.concatenate((index, np.array(rows, dtype=_INDEX_DTYPE)))
+
+
+def _matches(buf, index):
+    '''Returns whether the first and last records of index are in buf'''
+    for row in index[[0, -1]] if len(index) else []:
+        offset = int(row['offset'])
+        if offset + int(row['length']) > len(buf) or _RECORD.unpack_from(
+                buf, offset - _RECORD.size) != (row['kind'], row['length']):
+            return False
+    return True
+
+
+class ReplayReader(object):
+    """Reads the games of a replay in any order.
+
+    The replay is memory-mapped and only the records that are asked for are
+    decoded, so iterating over a replay of any size takes constant memory.
+    The index of the records is kept next to the replay in
+    index_path(path). As replays are append-only, an index only ever needs
+    to scan the records that were added since it was saved.
+    """
+
+    def __init__(self, path, save_index=True):
+        """Opens and indexes the replay.
+
+        Args:
+          path: The replay file.
+          save_index: Whether to save the index next to the replay. It is
+            only saved if the directory is writable.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._buffer = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ) if size else b''
+
+        index = np.zeros(0, dtype=_INDEX_DTYPE)
+        if os.path.exists(index_path(path)):
+            index = np.load(index_path(path))
+            if not _matches(self._buffer, index):
+                # The replay was rewritten since.
+                index = np.zeros(0, dtype=_INDEX_DTYPE)
+        start = int(index['offset'][-1] + index['length'][-1]) \
+            if len(index) else 0
+        num_indexed = len(index)
+        self._index = _scan(self._buffer, index, start)
+        if save_index and len(self._index) > num_indexed:
+            try:
+                np.save(index_path(path), self._index)
+            except OSError:
+                pass
+
+        self._headers = {}
+        self._first_steps = {}
+        self._model = ForwardModel()
+        kinds = self._index['kind']
+        self._game_records = np.flatnonzero(kinds == HEADER)
+        frames = (kinds == KEYFRAME) | (kinds == DELTA)
+        # The games of the records only ever go up, so the records of every
+        # game are one split away.
+        records = np.flatnonzero(frames)
+        self._frame_records = np.split(
+            records,
+            np.searchsorted(self._index['game'][records],
+                            np.arange(1, len(self._game_records))))
+        records = np.flatnonzero(kinds == END)
+        self._end_records = dict(
+            zip(self._index['game'][records].tolist(), records.tolist()))
+
+    def __len__(self):
+        return len(self._game_records)
+
+    def close(self):
+        if self._buffer:
+            self._buffer.close()
+        self._file.close()
+
+    def _payload(self, record):
+        offset = int(self._index['offset'][record])
+        return memoryview(self._buffer)[offset:offset +
+                                        int(self._index['length'][record])]
+
+    def header(self, game):
+        '''Returns the header of a game'''
+        if game not in self._headers:
+            self._headers[game] = json.loads(
+                bytes(self._payload(self._game_records[game])).decode())
+        return self._headers[game]
+
+    def end(self, game):
+        '''Returns the end of a game, or None if it was cut short'''
+        if game not in self._end_records:
+            return None
+        return json.loads(
+            bytes(self._payload(self._end_records[game])).decode())
+
+    def num_frames(self, game):
+        '''Returns the number of states of a game'''
+        return len(self._frame_records[game])
+
+    def frame(self, game, num):
+        """Returns a state of a game.
+
+        This decodes the last keyframe at or before the state, and the deltas
+        from there on.
+
+        Args:
+          game: The number of the game in the replay.
+          num: The number of the state in the game, from 0 after reset.
+            Negative numbers count from the end.
+
+        Returns:
+          A Frame.
+        """
+        records = self._frame_records[game]
+        record = records[num]
+        start = num % len(records)
+        kinds = self._index['kind'][records[:start + 1]]
+        keyframe = int(np.flatnonzero(kinds == KEYFRAME)[-1])
+        frame = None
+        for record in records[keyframe:start + 1]:
+            frame = self._decode(game, record, frame)
+        return frame
+
+    def _decode(self, game, record, previous):
+        '''Decodes the frame of a record, given the frame before it'''
+        payload = self._payload(record)
+        if self._index['kind'][record] == KEYFRAME:
+            return _decode_frame(payload, self.header(game))
+        return _decode_frame(payload, self.header(game), previous.state)
+
+    def iter_frames(self, game, start=0):
+        '''Yields the Frames of a game from start on, decoding each once'''
+        if start >= self.num_frames(game):
+            return
+        frame = self.frame(game, start)
+        yield frame
+        for record in self._frame_records[game][start + 1:]:
+            frame = self._decode(game, record, frame)
+            yield frame
+
+    def make_agents(self, game):
+        '''Returns a characters.Bomber for every agent of a game'''
+        header = self.header(game)
+        game_type = constants.GameType(header['game_type'])
+        return [
+            characters.Bomber(agent_id, game_type)
+            for agent_id in range(header['num_agents'])
+        ]
+
+    def observed_objects(self, game, frame, agents=None, previous=None):
+        """Returns the state of a frame of a game as the agents observed it.
+
+        The v1 env collapses the board after it made the observations of the
+        step, so the frames of the collapse steps hold the board after the
+        collapse. For these, the state before the collapse is rebuilt by
+        stepping the previous frame with the intended actions of the frame.
+
+        Args:
+          game: The number of the game in the replay.
+          frame: A Frame of the game, e.g. from frame or iter_frames.
+          agents: Optional agents from make_agents, which are reset to the
+            state. If None, new ones are made.
+          previous: Optionally, the frame before frame. It is read from the
+            replay if it is needed and not given.
+
+        Returns:
+          board, agents, bombs, items, flames as used by ForwardModel.step.
+        """
+        header = self.header(game)
+        agents = agents or self.make_agents(game)
+        step_count = int(frame.state.step_count)
+        num = step_count - self._first_step(game)
+        if num == 0 or step_count not in header.get('collapses', ()):
+            return frame.state.to_objects(agents)
+        if previous is None:
+            previous = self.frame(game, num - 1)
+        board, agents, bombs, items, flames = previous.state.to_objects(
+            agents)
+        # As Pomme.step caps the blast strength.
+        max_blast_strength = header['agent_view_size'] or 10
+        return self._model.step(frame.intended_actions, board, agents, bombs,
+                                items, flames, max_blast_strength)
+
+    def _first_step(self, game):
+        '''Returns the step count of the first frame of a game'''
+        if game not in self._first_steps:
+            self._first_steps[game] = int(
+                self.frame(game, 0).state.step_count)
+        return self._first_steps[game]
+
+    def observations(self, game, frame, agents=None, previous=None):
+        """Returns the observations of the agents in a frame of a game.
+
+        These are the observations that the agents had been given by the env
+        in that state, i.e. before the collapse on the collapse steps of v1,
+        see observed_objects.
+
+        Args:
+          game: The number of the game in the replay.
+          frame: A Frame of the game, e.g. from frame or iter_frames.
+          agents: Optional agents from make_agents, which are reset to the
+            observed state, e.g. to get its rewards too. If None, new ones
+            are made.
+          previous: Optionally, the frame before frame, as for
+            observed_objects.
+        """
+        header = self.header(game)
+        game_type = constants.GameType(header['game_type'])
+        board, agents, bombs, _, _ = self.observed_objects(
+            game, frame, agents, previous)
+        observations = self._model.get_observations(
+            board, agents, bombs, header['is_partially_observable'],
+            header['agent_view_size'], game_type, header['game_env'])
+        # Pomme.step makes the observations before it counts the step.
+        step_count = max(int(frame.state.step_count) - 1, 0)
+        for obs in observations:
+            obs['step_count'] = step_count
+            if frame.radio is not None:
+                teammate = obs['teammate'].value - constants.Item.Agent0.value
+                obs['message'] = tuple(frame.radio[teammate]) \
+                    if 0 <= teammate < len(frame.radio) else (0, 0)
+        return observations
+
+    def iter_games(self):
+        '''Yields the (header, frames, end) of every game, decoding lazily'''
+        for game in range(len(self)):
+            yield self.header(game), self.iter_frames(game), self.end(game)
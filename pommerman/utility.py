@@ -1,17 +1,18 @@
 '''This file contains a set of utility functions that
 help with positioning, building a game board, and
 encoding data to be used later'''
-import itertools
 import json
 import random
 import os
-from jsonmerge import Merger
 
 from gym import spaces
 import numpy as np
+from scipy import ndimage
 
 from . import constants
 
+_BOARD_TEMPLATES = {}
+
 
 class PommermanJSONEncoder(json.JSONEncoder):
     '''A helper class to encode state data into a json object'''
@@ -35,7 +36,55 @@ class PommermanJSONEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-def make_board(size, num_rigid=0, num_wood=0):
+def _board_template(size):
+    """Returns the board before random walls are laid on it.
+
+    This has the agents and the wooden walls that guarantee a passage between
+    them. Also returns the rows and cols of the cells above the diagonal that
+    can take random walls, and the number of wooden walls already laid.
+    """
+    if size in _BOARD_TEMPLATES:
+        return _BOARD_TEMPLATES[size]
+
+    # Initialize everything as a passage.
+    board = np.ones((size, size)).astype(np.uint8) * constants.Item.Passage.value
+    # Walls are laid symmetrically, so never on the diagonal.
+    free = ~np.eye(size, dtype=bool)
+
+    # Set the players down. Exclude them from the free cells.
+    # Agent0 is in top left. Agent1 is in bottom left.
+    # Agent2 is in bottom right. Agent 3 is in top right.
+    board[1, 1] = constants.Item.Agent0.value
+    board[size - 2, 1] = constants.Item.Agent1.value
+    board[size - 2, size - 2] = constants.Item.Agent2.value
+    board[1, size - 2] = constants.Item.Agent3.value
+    for position in [(1, 1), (size - 2, 1), (1, size - 2),
+                     (size - 2, size - 2)]:
+        free[position] = False
+
+    # Exclude breathing room on either side of the agents.
+    for i in range(2, 4):
+        for position in [(1, i), (i, 1), (1, size - i - 1),
+                         (size - i - 1, 1), (size - 2, size - i - 1),
+                         (size - i - 1, size - 2), (i, size - 2),
+                         (size - 2, i)]:
+            free[position] = False
+
+    # Lay down wooden walls providing guaranteed passage to other agents.
+    num_wood = 0
+    for i in range(4, size - 4):
+        for position in [(1, i), (size - i - 1, 1), (size - 2, size - i - 1),
+                         (size - i - 1, size - 2)]:
+            board[position] = constants.Item.Wood.value
+            free[position] = False
+        num_wood += 4
+
+    rows, cols = np.nonzero(np.triu(free, 1))
+    _BOARD_TEMPLATES[size] = board, rows, cols, num_wood
+    return _BOARD_TEMPLATES[size]
+
+
+def make_board(size, num_rigid=0, num_wood=0, random_state=None):
     """Make the random but symmetric board.
 
     The numbers refer to the Item enum in constants. This is:
@@ -51,113 +100,77 @@ def make_board(size, num_rigid=0, num_wood=0):
      9 - skull
      10 - 13: agents
 
+    The walls are sampled in pairs of mirrored cells all at once. The passages
+    that the rigid walls cut off from the agents are labelled with a flood
+    fill and get the wooden walls first, so that at most 4 passages are out of
+    reach. Only when the rigid walls cut off more cells than there are wooden
+    walls to fill them is the board sampled again.
+
     Args:
       size: The dimension of the board, i.e. it's sizeXsize.
       num_rigid: The number of rigid walls on the board. This should be even.
       num_wood: Similar to above but for wood walls.
+      random_state: The np.random.RandomState to sample with. If None, one is
+        seeded from the random module.
 
     Returns:
       board: The resulting random board.
     """
-
-    def lay_wall(value, num_left, coordinates, board):
-        '''Lays all of the walls on a board'''
-        x, y = random.sample(coordinates, 1)[0]
-        coordinates.remove((x, y))
-        coordinates.remove((y, x))
-        board[x, y] = value
-        board[y, x] = value
-        num_left -= 2
-        return num_left
-
-    def make(size, num_rigid, num_wood):
-        '''Constructs a game/board'''
-        # Initialize everything as a passage.
-        board = np.ones((size,
-                         size)).astype(np.uint8) * constants.Item.Passage.value
-
-        # Gather all the possible coordinates to use for walls.
-        coordinates = set([
-            (x, y) for x, y in \
-            itertools.product(range(size), range(size)) \
-            if x != y])
-
-        # Set the players down. Exclude them from coordinates.
-        # Agent0 is in top left. Agent1 is in bottom left.
-        # Agent2 is in bottom right. Agent 3 is in top right.
-        board[1, 1] = constants.Item.Agent0.value
-        board[size - 2, 1] = constants.Item.Agent1.value
-        board[size - 2, size - 2] = constants.Item.Agent2.value
-        board[1, size - 2] = constants.Item.Agent3.value
-        agents = [(1, 1), (size - 2, 1), (1, size - 2), (size - 2, size - 2)]
-        for position in agents:
-            if position in coordinates:
-                coordinates.remove(position)
-
-        # Exclude breathing room on either side of the agents.
-        for i in range(2, 4):
-            coordinates.remove((1, i))
-            coordinates.remove((i, 1))
-            coordinates.remove((1, size - i - 1))
-            coordinates.remove((size - i - 1, 1))
-            coordinates.remove((size - 2, size - i - 1))
-            coordinates.remove((size - i - 1, size - 2))
-            coordinates.remove((i, size - 2))
-            coordinates.remove((size - 2, i))
-
-        # Lay down wooden walls providing guaranteed passage to other agents.
-        wood = constants.Item.Wood.value
-        for i in range(4, size - 4):
-            board[1, i] = wood
-            board[size - i - 1, 1] = wood
-            board[size - 2, size - i - 1] = wood
-            board[size - i - 1, size - 2] = wood
-            coordinates.remove((1, i))
-            coordinates.remove((size - i - 1, 1))
-            coordinates.remove((size - 2, size - i - 1))
-            coordinates.remove((size - i - 1, size - 2))
-            num_wood -= 4
-
-        # Lay down the rigid walls.
-        while num_rigid > 0:
-            num_rigid = lay_wall(constants.Item.Rigid.value, num_rigid,
-                                 coordinates, board)
-
-        # Lay down the wooden walls.
-        while num_wood > 0:
-            num_wood = lay_wall(constants.Item.Wood.value, num_wood,
-                                coordinates, board)
-
-        return board, agents
-
     assert (num_rigid % 2 == 0)
     assert (num_wood % 2 == 0)
-    board, agents = make(size, num_rigid, num_wood)
+    if random_state is None:
+        random_state = np.random.RandomState(random.getrandbits(32))
+
+    template, rows, cols, num_laid = _board_template(size)
+    num_rigid_pairs = num_rigid // 2
+    num_wood_pairs = max(num_wood - num_laid, 0) // 2
+    passage = constants.Item.Passage.value
+    while True:
+        order = random_state.permutation(len(rows))
+        board = template.copy()
+        rigid = order[:num_rigid_pairs]
+        board[rows[rigid], cols[rigid]] = constants.Item.Rigid.value
+        board[cols[rigid], rows[rigid]] = constants.Item.Rigid.value
 
-    # Make sure it's possible to reach most of the passages.
-    while len(inaccessible_passages(board, agents)) > 4:
-        board, agents = make(size, num_rigid, num_wood)
+        # Label the cells that can be reached from each other.
+        labels, _ = ndimage.label(board != constants.Item.Rigid.value)
+        cut_off = labels != labels[size - 2, size - 2]
 
-    return board
+        rest = order[num_rigid_pairs:]
+        first = cut_off[rows[rest], cols[rest]]
+        wood = np.concatenate((rest[first], rest[~first]))[:num_wood_pairs]
+        board[rows[wood], cols[wood]] = constants.Item.Wood.value
+        board[cols[wood], rows[wood]] = constants.Item.Wood.value
 
+        # Make sure it's possible to reach most of the passages.
+        if np.count_nonzero(cut_off & (board == passage)) <= 4:
+            return board
 
-def make_items(board, num_items):
-    '''Lays all of the items on the board'''
-    item_positions = {}
-    while num_items > 0:
-        row = random.randint(0, len(board) - 1)
-        col = random.randint(0, len(board[0]) - 1)
-        if board[row, col] != constants.Item.Wood.value:
-            continue
-        if (row, col) in item_positions:
-            continue
 
-        item_positions[(row, col)] = random.choice([
-            constants.Item.ExtraBomb, constants.Item.IncrRange,
-            constants.Item.Kick
-        ]).value
-        num_items -= 1
-    return item_positions
+def make_items(board, num_items, random_state=None):
+    """Lays all of the items on the board.
+
+    Every item is hidden under a different wooden wall.
+
+    Args:
+      board: The board to hide the items in.
+      num_items: The number of items.
+      random_state: The np.random.RandomState to sample with. If None, one is
+        seeded from the random module.
+
+    Returns:
+      A dict of the item values by position.
+    """
+    if random_state is None:
+        random_state = np.random.RandomState(random.getrandbits(32))
+    rows, cols = np.nonzero(board == constants.Item.Wood.value)
+    chosen = random_state.choice(len(rows), num_items, replace=False)
+    values = random_state.choice([
+        constants.Item.ExtraBomb.value, constants.Item.IncrRange.value,
+        constants.Item.Kick.value
+    ], num_items)
+    return {(int(rows[num]), int(cols[num])): int(value)
+            for num, value in zip(chosen, values)}
 
 
 def inaccessible_passages(board, agent_positions):
@@ -179,14 +192,9 @@ def inaccessible_passages(board, agent_positions):
             if position_is_rigid(board, next_position):
                 continue
 
-            if next_position in positions:
-                positions.pop(positions.index(next_position))
-                if not len(positions):
-                    return []
-
             seen.add(next_position)
             Q.append(next_position)
-    return positions
+    return [position for position in positions if position not in seen]
 
 
 def is_valid_direction(board, position, direction, invalid_values=None):
@@ -357,41 +365,47 @@ def make_np_float(feature):
     return np.array(feature).astype(np.float32)
 
 
-def join_json_state(record_json_dir, agents, finished_at, config, info):
-    '''Combines all of the json state files into one'''
-    json_schema = {"properties": {"state": {"mergeStrategy": "append"}}}
-    
-    json_template = {
+def game_state_json(states, agents, finished_at, config, info):
+    """Returns the dict of a game_state.json.
+
+    Args:
+      states: The values of Pomme.get_json_info at every step, in order.
+      agents: The strings of the agents.
+      finished_at: When the game finished, as an ISO string.
+      config: The id of the config.
+      info: The info of the last step, with the result and winners.
+    """
+    ret = {
         "agents": agents,
         "finished_at": finished_at,
         "config": config,
         "result": {
             "name": info['result'].name,
             "id": info['result'].value
-        }
+        },
+        "state": states
     }
-
     if info['result'] is not constants.Result.Tie:
-        json_template['winners'] = info['winners']
-
-    json_template['state'] = []
+        ret['winners'] = info['winners']
+    return ret
 
-    merger = Merger(json_schema)
-    base = merger.merge({}, json_template)
-
-    for root, dirs, files in os.walk(record_json_dir):
-        for name in files:
-            path = os.path.join(record_json_dir, name)
-            if name.endswith('.json') and "game_state" not in name:
-                with open(path) as data_file:
-                    data = json.load(data_file)
-                    head = {"state": [data]}
-                    base = merger.merge(base, head)
 
+def join_json_state(record_json_dir, agents, finished_at, config, info):
+    '''Combines all of the json state files into one'''
+    # The files are named by their zero padded step count, so sorting them
+    # by name puts them in order.
+    names = sorted(
+        name for name in os.listdir(record_json_dir)
+        if name.endswith('.json') and "game_state" not in name)
+    states = []
+    for name in names:
+        with open(os.path.join(record_json_dir, name)) as data_file:
+            states.append(json.load(data_file))
+
+    base = game_state_json(states, agents, finished_at, config, info)
     with open(os.path.join(record_json_dir, 'game_state.json'), 'w') as f:
         f.write(json.dumps(base, sort_keys=True, indent=4))
 
-    for root, dirs, files in os.walk(record_json_dir):
-        for name in files:
-            if "game_state" not in name:
-                os.remove(os.path.join(record_json_dir, name))
+    for name in os.listdir(record_json_dir):
+        if "game_state" not in name:
+            os.remove(os.path.join(record_json_dir, name))
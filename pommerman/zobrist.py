@@ -0,0 +1,128 @@
+'''Zobrist hashing of game states.
+
+Every feature of a state, e.g. "cell 17 holds a wooden wall" or "agent 2 has
+3 ammo", gets a random 64 bit key. The hash of a state is the XOR of the keys
+of all of its features. Since XOR is its own inverse, a step only needs to XOR
+out the features that changed and XOR in their new values, which is how the
+ForwardModel keeps the hash of its bound state up to date.
+'''
+import numpy as np
+
+from . import constants
+
+# Attribute values are clipped to fit the key tables.
+MAX_VALUE = 32
+
+_ZOBRISTS = {}
+
+
+def get_zobrist(board_size=constants.BOARD_SIZE):
+    '''Returns the shared Zobrist keys for a board size'''
+    if board_size not in _ZOBRISTS:
+        _ZOBRISTS[board_size] = Zobrist(board_size)
+    return _ZOBRISTS[board_size]
+
+
+def _clip(value):
+    return min(max(int(value), 0), MAX_VALUE - 1)
+
+
+class Zobrist(object):
+    """Random keys for every feature of a game on one board size."""
+
+    def __init__(self, board_size, num_agents=4, seed=0):
+        self.board_size = board_size
+        num_cells = board_size * board_size
+        random_state = np.random.RandomState(seed)
+
+        def make_keys(*shape):
+            return random_state.randint(
+                1, np.iinfo(np.int64).max, size=shape, dtype=np.int64)
+
+        self.board = make_keys(num_cells, len(constants.Item))
+        self.bomb_life = make_keys(num_cells, MAX_VALUE).tolist()
+        self.bomb_blast_strength = make_keys(num_cells, MAX_VALUE).tolist()
+        self.bomb_moving_direction = make_keys(
+            num_cells, len(constants.Action)).tolist()
+        self.flame_life = make_keys(num_cells, MAX_VALUE).tolist()
+        # The extra row holds the keys of the observer in hash_obs.
+        self.agent_position = make_keys(num_agents + 1, num_cells).tolist()
+        self.agent_alive = make_keys(num_agents + 1, 2).tolist()
+        self.agent_ammo = make_keys(num_agents + 1, MAX_VALUE).tolist()
+        self.agent_blast_strength = make_keys(num_agents + 1,
+                                              MAX_VALUE).tolist()
+        self.agent_can_kick = make_keys(num_agents + 1, 2).tolist()
+        self._observer = num_agents
+        self._cells = np.arange(num_cells)
+
+    def _cell(self, position):
+        return int(position[0]) * self.board_size + int(position[1])
+
+    def hash_board(self, board):
+        '''Hash of every cell of the board'''
+        keys = self.board[self._cells, board.reshape(-1)]
+        return int(np.bitwise_xor.reduce(keys))
+
+    def hash_cells(self, cells, values):
+        '''Hash of the given (rows, cols) cells holding the given values'''
+        rows, cols = cells
+        keys = self.board[rows * self.board_size + cols, values]
+        return int(np.bitwise_xor.reduce(keys)) if len(keys) else 0
+
+    def hash_agent(self, agent_id, position, is_alive, ammo, blast_strength,
+                   can_kick):
+        '''Hash of the attributes of an agent'''
+        return self.agent_position[agent_id][self._cell(position)] ^ \
+            self.agent_alive[agent_id][int(bool(is_alive))] ^ \
+            self.agent_ammo[agent_id][_clip(ammo)] ^ \
+            self.agent_blast_strength[agent_id][_clip(blast_strength)] ^ \
+            self.agent_can_kick[agent_id][int(bool(can_kick))]
+
+    def hash_bomb(self, position, life, blast_strength, moving_direction):
+        '''Hash of the attributes of a bomb'''
+        cell = self._cell(position)
+        direction = 0 if moving_direction is None \
+            else constants.Action(moving_direction).value
+        return self.bomb_life[cell][_clip(life)] ^ \
+            self.bomb_blast_strength[cell][_clip(blast_strength)] ^ \
+            self.bomb_moving_direction[cell][direction]
+
+    def hash_flame(self, position, life):
+        '''Hash of the attributes of a flame'''
+        return self.flame_life[self._cell(position)][_clip(life)]
+
+    def hash_state(self, board, agents, bombs, flames):
+        '''Hash of a state in the ForwardModel representation'''
+        ret = self.hash_board(board)
+        for agent in agents:
+            ret ^= self.hash_agent(agent.agent_id, agent.position,
+                                   agent.is_alive, agent.ammo,
+                                   agent.blast_strength, agent.can_kick)
+        for bomb in bombs:
+            ret ^= self.hash_bomb(bomb.position, bomb.life,
+                                  bomb.blast_strength, bomb.moving_direction)
+        for flame in flames:
+            ret ^= self.hash_flame(flame.position, flame._life)
+        return ret
+
+    def hash_obs(self, obs):
+        """Hash of what an agent observes.
+
+        This covers the board, the bomb maps, the alive agents and the
+        agent's own position, ammo, blast strength and ability to kick.
+        """
+        ret = self.hash_board(obs['board'])
+        bomb_cells = np.nonzero(obs['bomb_life'])
+        for row, col in zip(*bomb_cells):
+            cell = row * self.board_size + col
+            ret ^= self.bomb_life[cell][_clip(obs['bomb_life'][row, col])]
+            ret ^= self.bomb_blast_strength[cell][_clip(
+                obs['bomb_blast_strength'][row, col])]
+        for agent in obs['alive']:
+            agent_id = constants.Item(agent).value - \
+                constants.Item.Agent0.value
+            ret ^= self.agent_alive[agent_id][1]
+        ret ^= self.hash_agent(self._observer, obs['position'], True,
+                               obs['ammo'], obs['blast_strength'],
+                               obs['can_kick'])
+        return ret
@@ -23,7 +23,7 @@ with open('requirements_extra.txt', 'r') as f:
 with open('VERSION') as f:
     VERSION = f.read().strip()
 
-files = ["resources/*"]
+files = ["resources/*", "benchmarks/*.json"]
 
 setup(name='pommerman',
       version=VERSION,
@@ -44,6 +44,10 @@ setup(name='pommerman',
       entry_points={
         'console_scripts': [
             'pom_battle=pommerman.cli.run_battle:main',
+            'pom_board_library=pommerman.cli.make_board_library:main',
+            'pom_bench=pommerman.benchmarks.suite:main',
+            'pom_export_dataset=pommerman.cli.export_dataset:main',
+            'pom_replay_to_json=pommerman.cli.replay_to_json:main',
             'pom_tf_battle=pommerman.cli.train_with_tensorforce:main',
             'ion_client=pommerman.network.client:init',
             'ion_server=pommerman.network.server:init'